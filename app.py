@@ -6,17 +6,11 @@ Interface Streamlit para o RAG com Ollama para o Regulamento Pedagógico da ESTG
 """
 
 import streamlit as st
-import os
 import time
 import sys
-import shutil
-from langchain_community.vectorstores import Chroma
-from langchain_ollama import OllamaEmbeddings
-from langchain_ollama import OllamaLLM
-from langchain.chains import RetrievalQA
-from langchain_community.document_loaders import PyPDFLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.prompts import PromptTemplate
+
+from src.models.registry import get_pipeline
+from src.models.rag import lookup_response, store_response, process_query
 
 # Configuração da página Streamlit
 st.set_page_config(
@@ -75,90 +69,50 @@ if 'retriever' not in st.session_state:
 if 'chat_history' not in st.session_state:
     st.session_state.chat_history = []
 
-# Função para carregar o PDF e criar o vectorstore
-@st.cache_resource(ttl=3600)  # Cache por 1 hora para melhor performance
-def load_documents_and_create_vectorstore(recreate=False):
-    with st.spinner("Carregando o Regulamento Pedagógico..."):
-        # Obter o caminho absoluto para o diretório raiz do projeto
-        root_dir = os.path.dirname(os.path.abspath(__file__))
-        
-        # Construir o caminho completo para o arquivo PDF
-        pdf_path = os.path.join(root_dir, "resources", "ESTG_Regulamento-Frequencia-Avaliacao2023.pdf")
-        st.info(f"Carregando PDF de: {pdf_path}")
+# Função para obter o pipeline RAG partilhado com as outras entradas do processo
+def load_rag_pipeline(recreate=False):
+    """
+    Obtém o pipeline RAG do processo (vectorstore, retriever e cadeia de QA), o mesmo
+    da aplicação refatorada, do serviço HTTP e da CLI
+    
+    Args:
+        recreate: Se True, recria o vectorstore mesmo se já existir
         
+    Returns:
+        Dicionário com o vectorstore, o retriever, a cadeia de QA e a versão do índice,
+        ou None em caso de erro
+    """
+    with st.spinner("Carregando o Regulamento Pedagógico..."):
         try:
-            # Carregar o PDF
-            loader = PyPDFLoader(pdf_path)
-            documents = loader.load()
-            st.success(f"PDF carregado com {len(documents)} páginas")
-            
-            # Dividir o documento em chunks otimizados
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=800,  # Chunks um pouco maiores para reduzir o número total de chunks
-                chunk_overlap=80,  # Overlap menor para processamento mais rápido
-                length_function=len
-            )
-            chunks = text_splitter.split_documents(documents)
-            st.info(f"Documento dividido em {len(chunks)} chunks")
-            
-            # Configurar embeddings
-            embeddings = OllamaEmbeddings(model="nomic-embed-text")
-            
-            # Usar o caminho absoluto para o diretório de persistência
-            vector_store_path = os.path.join(root_dir, "vector_store")
-            
-            # Verificar se já existe um vectorstore persistido
-            if recreate and os.path.exists(vector_store_path) and os.listdir(vector_store_path):
-                st.warning("Removendo vectorstore existente...")
-                shutil.rmtree(vector_store_path)
-            
-            # Criar ou carregar o vectorstore
-            if not os.path.exists(vector_store_path) or not os.listdir(vector_store_path) or recreate:
-                st.info("Criando novo vectorstore (pode demorar alguns minutos)...")
-                vectorstore = Chroma.from_documents(
-                    documents=chunks,  # Usar chunks em vez de documentos completos
-                    embedding=embeddings,
-                    persist_directory=vector_store_path
-                )
-                vectorstore.persist()
-                st.success("Vectorstore criado e persistido com sucesso!")
-            else:
-                st.info("Usando vectorstore existente...")
-                vectorstore = Chroma(persist_directory=vector_store_path, embedding_function=embeddings)
-            
-            return vectorstore
-            
+            return get_pipeline(recreate=recreate, status_callback=st.info)
         except Exception as e:
-            st.error(f"❌ Erro ao processar o documento: {str(e)}")
+            st.error(f"❌ Erro ao configurar o pipeline RAG: {str(e)}")
             st.exception(e)
             return None
 
 # Cache para respostas anteriores para evitar reprocessamento
 @st.cache_data(ttl=1800)  # Cache por 30 minutos
-def get_cached_response(query, _retriever, _qa_chain):
+def get_cached_response(query, _retriever, _qa_chain, index_version="", _embeddings=None):
     """Busca respostas no cache ou executa a consulta se não estiver em cache"""
     try:
-        # Recuperar documentos relevantes
-        start_time = time.time()
-        docs = _retriever.get_relevant_documents(query)
+        # Verificar o armazém de respostas partilhado entre sessões e reinícios e,
+        # depois, as perguntas semelhantes no cache semântico do processo
+        response_key, resultado, query_vector = lookup_response(query, _qa_chain, index_version, _embeddings)
+        if resultado:
+            return resultado
         
-        # Executar a pergunta com paralelização
-        resposta = _qa_chain.invoke({"query": query})
+        # Recuperar os documentos uma única vez e gerar a resposta a partir deles
+        start_time = time.time()
+        resultado_pipeline = process_query(query, _qa_chain)
         tempo = time.time() - start_time
         
-        # Extrair a resposta e os documentos fonte
-        if isinstance(resposta, dict) and "result" in resposta:
-            resposta_texto = resposta["result"]
-            documentos_fonte = resposta.get("source_documents", [])
-        else:
-            resposta_texto = str(resposta)
-            documentos_fonte = docs
-        
-        return {
-            "resposta": resposta_texto,
-            "documentos": documentos_fonte,
+        resultado = {
+            "resposta": resultado_pipeline["resposta"],
+            "documentos": resultado_pipeline["documentos"],
             "tempo": tempo
         }
+        store_response(response_key, query, resultado, _qa_chain, index_version, query_vector)
+        return resultado
     except Exception as e:
         st.error(f"Erro ao processar pergunta: {str(e)}")
         return {
@@ -167,64 +121,6 @@ def get_cached_response(query, _retriever, _qa_chain):
             "tempo": 0
         }
 
-# Função para configurar o modelo e o pipeline RAG
-def setup_rag_pipeline(vectorstore):
-    with st.spinner("Configurando o pipeline de RAG..."):
-        try:
-            # Configurar o retriever otimizado para velocidade
-            retriever = vectorstore.as_retriever(
-                search_type="similarity",
-                search_kwargs={
-                    "k": 2  # Reduzir para 2 chunks mais relevantes para maior velocidade
-                }
-            )
-            
-            # Configurar o modelo Ollama com parâmetros otimizados para velocidade
-            llm = OllamaLLM(
-                model="llama3",
-                temperature=0.1,
-                stop=["\n\n"],
-                top_p=0.9,
-                num_ctx=2048,  # Contexto menor para respostas mais rápidas
-                num_thread=4,  # Usar múltiplas threads
-                num_gpu=1      # Usar GPU se disponível
-            )
-            
-            # Criar um template de prompt personalizado para instruir o modelo a responder em português
-            prompt_template = """
-            Você é um assistente especializado no Regulamento Pedagógico da ESTG (Escola Superior de Tecnologia e Gestão).
-            Responda à pergunta em PORTUGUÊS com base nas informações fornecidas abaixo.
-            Se a informação não estiver presente nos documentos fornecidos, diga que não tem informações suficientes para responder.
-            
-            Contexto:
-            {context}
-            
-            Pergunta: {question}
-            
-            Resposta em português:
-            """
-            
-            PROMPT = PromptTemplate(
-                template=prompt_template,
-                input_variables=["context", "question"]
-            )
-            
-            # Criar a cadeia de QA
-            qa_chain = RetrievalQA.from_chain_type(
-                llm=llm,
-                chain_type="stuff",
-                retriever=retriever,
-                return_source_documents=True,
-                chain_type_kwargs={"prompt": PROMPT}
-            )
-            
-            return retriever, qa_chain
-            
-        except Exception as e:
-            st.error(f"❌ Erro ao configurar o pipeline RAG: {str(e)}")
-            st.exception(e)
-            return None, None
-
 # Sidebar para configurações
 with st.sidebar:
     st.markdown('<h2 class="sub-header">Configurações</h2>', unsafe_allow_html=True)
@@ -234,11 +130,13 @@ with st.sidebar:
     
     # Botão para carregar o modelo e configurar o pipeline
     if st.button("Iniciar Sistema RAG", help="Carrega o modelo e configura o pipeline RAG"):
-        vectorstore = load_documents_and_create_vectorstore(recreate=recreate_vectorstore)
-        if vectorstore:
-            st.session_state.retriever, st.session_state.qa_chain = setup_rag_pipeline(vectorstore)
-            if st.session_state.qa_chain:
-                st.success("Sistema RAG inicializado com sucesso!")
+        pipeline = load_rag_pipeline(recreate=recreate_vectorstore)
+        if pipeline:
+            st.session_state.retriever = pipeline["retriever"]
+            st.session_state.qa_chain = pipeline["qa_chain"]
+            st.session_state.index_version = pipeline["index_version"]
+            st.session_state.embeddings = pipeline["vectorstore"].embeddings
+            st.success("Sistema RAG inicializado com sucesso!")
     
     # Informações sobre o projeto
     st.markdown("---")
@@ -279,7 +177,9 @@ if st.button("Enviar Pergunta") or query:
                 st.session_state.chat_history.append({"role": "user", "content": query})
                 
                 # Usar a função de cache para obter a resposta
-                resultado = get_cached_response(query, st.session_state.retriever, st.session_state.qa_chain)
+                resultado = get_cached_response(query, st.session_state.retriever, st.session_state.qa_chain,
+                                                st.session_state.get("index_version", ""),
+                                                st.session_state.get("embeddings"))
                 
                 resposta_texto = resultado["resposta"]
                 documentos_fonte = resultado["documentos"]
@@ -7,21 +7,28 @@ Versão refatorada com arquitetura modular
 """
 
 import streamlit as st
-import os
 import time
 import logging
-from typing import Dict, Any
 
 # Importar módulos do projeto
-from src.data.document_loader import load_pdf, split_documents
-from src.models.embeddings import create_vectorstore, get_retriever
-from src.models.rag import create_qa_chain, process_query
-from src.utils.cache import SimpleCache, normalize_query, timed_execution
+from src.models.registry import get_pipeline
+from src.models.warmup import warm_up_and_keep_alive, get_first_query
+from src.models.rag import (
+    process_query_shared,
+    process_query_stream_shared,
+    get_response_cache_key,
+    lookup_response,
+    store_response
+)
+from src.utils.cache import SimpleCache
+from src.utils.metrics import registry, start_log_summary, start_metrics_server
 from src.config.settings import (
-    PDF_PATH, 
-    VECTOR_STORE_DIR,
-    CACHE_TTL_VECTORSTORE,
-    CACHE_TTL_RESPONSES
+    CACHE_TTL_RESPONSES,
+    CACHE_MAX_ENTRIES,
+    CACHE_MAX_BYTES,
+    METRICS_PORT,
+    METRICS_LOG_INTERVAL,
+    EXAMPLE_QUESTIONS
 )
 
 # Configurar logging
@@ -76,73 +83,86 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# Métricas do processo (partilhadas por todas as sessões)
+@st.cache_resource
+def start_metrics():
+    """
+    Arranca o resumo periódico das métricas no log e, se configurado, o endpoint /metrics
+    """
+    start_log_summary(METRICS_LOG_INTERVAL)
+    if METRICS_PORT:
+        start_metrics_server(METRICS_PORT)
+    return True
+
+start_metrics()
+
+# Aquecimento dos modelos do Ollama (uma vez por processo)
+@st.cache_resource
+def warm_up_models_once():
+    """
+    Carrega o llama3 e o nomic-embed-text no Ollama e inicia o keep-alive periódico
+    
+    Returns:
+        Relatório do aquecimento, ou None se desativado
+    """
+    return warm_up_and_keep_alive()
+
 # Inicializar o estado da sessão
 if "chat_history" not in st.session_state:
     st.session_state.chat_history = []
 
 if "query_cache" not in st.session_state:
-    st.session_state.query_cache = SimpleCache(ttl=CACHE_TTL_RESPONSES)
+    st.session_state.query_cache = SimpleCache(
+        ttl=CACHE_TTL_RESPONSES,
+        max_entries=CACHE_MAX_ENTRIES,
+        max_bytes=CACHE_MAX_BYTES
+    )
+    registry.register_cache("sessao", st.session_state.query_cache)
 
 # Título principal
 st.markdown('<h1 class="main-header">UROBOT - Assistente do Regulamento Pedagógico ESTG</h1>', unsafe_allow_html=True)
 
-# Função para carregar o PDF e criar o vectorstore
-@st.cache_resource(ttl=CACHE_TTL_VECTORSTORE)
-def load_documents_and_create_vectorstore(recreate=False):
+# Função para obter o pipeline RAG partilhado por todas as sessões
+def load_rag_pipeline(recreate=False, reindex=False):
     """
-    Carrega o PDF e cria o vectorstore com cache
+    Obtém o pipeline RAG do processo (vectorstore, retriever e cadeia de QA), criando-o
+    apenas na primeira sessão ou quando o vectorstore é recriado/atualizado
     
     Args:
         recreate: Se True, recria o vectorstore mesmo se já existir
+        reindex: Se True, atualiza o vectorstore existente apenas com os chunks novos ou alterados
         
     Returns:
-        Vectorstore configurado ou None em caso de erro
+        Dicionário com o vectorstore, o retriever, a cadeia de QA e a versão do índice,
+        ou None em caso de erro
     """
     with st.spinner("Carregando o Regulamento Pedagógico..."):
         try:
-            # Carregar o PDF
-            documents = load_pdf(PDF_PATH)
-            st.success(f"PDF carregado com {len(documents)} páginas")
+            # Os PDFs de resources/ só são lidos se o manifesto do índice não coincidir;
+            # o progresso da geração de embeddings é mostrado numa barra
+            barra_progresso = st.empty()
+            def atualizar_progresso(processados, total):
+                barra_progresso.progress(processados / total, text=f"A gerar embeddings ({processados}/{total} chunks)")
             
-            # Dividir em chunks
-            chunks = split_documents(documents)
-            st.success(f"Documento dividido em {len(chunks)} chunks")
+            pipeline = get_pipeline(recreate=recreate, reindex=reindex,
+                                    progress_callback=atualizar_progresso,
+                                    status_callback=st.success)
+            barra_progresso.empty()
             
-            # Criar vectorstore
-            vectorstore = create_vectorstore(chunks, recreate)
-            st.success("Vectorstore criado/carregado com sucesso")
-            
-            return vectorstore
-        except Exception as e:
-            st.error(f"❌ Erro ao processar o documento: {str(e)}")
-            st.exception(e)
-            return None
-
-# Função para configurar o modelo e o pipeline RAG
-def setup_rag_pipeline(vectorstore):
-    """
-    Configura o pipeline RAG com o vectorstore
-    
-    Args:
-        vectorstore: Vectorstore configurado
-        
-    Returns:
-        Tupla (retriever, qa_chain) ou None em caso de erro
-    """
-    with st.spinner("Configurando o pipeline de RAG..."):
-        try:
-            # Configurar o retriever
-            retriever = get_retriever(vectorstore)
-            
-            # Criar a cadeia de QA
-            qa_chain = create_qa_chain(retriever)
+            # Carregar os modelos antes da primeira pergunta
+            with st.spinner("Carregando os modelos no Ollama..."):
+                relatorio = warm_up_models_once()
+            for modelo, tempos in (relatorio or {}).items():
+                if "erro" not in tempos:
+                    st.caption(f"{modelo}: primeiro pedido {tempos['primeiro_pedido']:.2f}s "
+                               f"({'frio' if tempos['frio'] else 'já carregado'})")
             
             st.success("Pipeline RAG configurado com sucesso")
-            return retriever, qa_chain
+            return pipeline
         except Exception as e:
             st.error(f"❌ Erro ao configurar o pipeline RAG: {str(e)}")
             st.exception(e)
-            return None, None
+            return None
 
 # Função para processar a consulta e retornar a resposta com tempo de execução
 @st.cache_data(ttl=CACHE_TTL_RESPONSES)
@@ -163,7 +183,7 @@ def get_cached_response(_query, _retriever, _qa_chain):
         start_time = time.time()
         
         # Processar a consulta
-        result = process_query(_query, _qa_chain)
+        result = process_query_shared(_query, _qa_chain)
         
         # Calcular o tempo de execução
         execution_time = time.time() - start_time
@@ -171,16 +191,50 @@ def get_cached_response(_query, _retriever, _qa_chain):
         return {
             "resposta": result["resposta"],
             "documentos": result["documentos"],
-            "tempo": execution_time
+            "tempo": execution_time,
+            "tempos": result["tempos"]
         }
     except Exception as e:
         logger.error(f"Erro ao processar consulta: {str(e)}")
         return {
             "resposta": f"Erro ao processar pergunta: {str(e)}",
             "documentos": [],
-            "tempo": 0
+            "tempo": 0,
+            "erro": True
         }
 
+# Função para processar a consulta em streaming, mostrando a resposta à medida que é gerada
+def render_streaming_response(query, qa_chain):
+    """
+    Processa uma consulta em streaming e apresenta a resposta incrementalmente
+    
+    Args:
+        query: Consulta do usuário
+        qa_chain: Cadeia de QA configurada
+        
+    Returns:
+        Dicionário com resposta, documentos, tempo até ao primeiro token e tempo total
+    """
+    placeholder = st.empty()
+    resposta_parcial = ""
+    resultado = None
+    
+    for evento in process_query_stream_shared(query, qa_chain):
+        if evento["tipo"] == "token":
+            resposta_parcial += evento["token"]
+            placeholder.markdown(f'<div class="response-box">{resposta_parcial}▌</div>', unsafe_allow_html=True)
+        elif evento["tipo"] == "fim":
+            resultado = {
+                "resposta": evento["resposta"],
+                "documentos": evento["documentos"],
+                "tempo": evento["tempo_total"],
+                "tempo_primeiro_token": evento["tempo_primeiro_token"],
+                "tempos": evento["tempos"]
+            }
+    
+    placeholder.markdown(f'<div class="response-box">{resultado["resposta"]}</div>', unsafe_allow_html=True)
+    return resultado
+
 # Barra lateral
 with st.sidebar:
     st.markdown('<h2 class="sub-header">Configurações</h2>', unsafe_allow_html=True)
@@ -189,19 +243,31 @@ with st.sidebar:
     recriar_vectorstore = st.checkbox("Recriar Vectorstore", value=False, 
                                      help="Marque esta opção se quiser recriar o vectorstore do zero")
     
+    # Opção para atualizar o vectorstore apenas com o que mudou
+    atualizar_vectorstore = st.checkbox("Atualizar Vectorstore (incremental)", value=False,
+                                        help="Gera embeddings apenas para os chunks novos ou alterados e remove os que deixaram de existir")
+    
+    # Opção para mostrar a resposta à medida que é gerada
+    usar_streaming = st.checkbox("Resposta em streaming", value=True,
+                                 help="Mostra a resposta token a token enquanto o modelo a gera")
+    
     # Botão para iniciar o sistema RAG
     if st.button("Iniciar Sistema RAG", use_container_width=True):
-        # Carregar o PDF e criar o vectorstore
-        vectorstore = load_documents_and_create_vectorstore(recreate=recriar_vectorstore)
+        # Obter o pipeline partilhado (criado apenas na primeira sessão)
+        pipeline = load_rag_pipeline(recreate=recriar_vectorstore, reindex=atualizar_vectorstore)
         
-        if vectorstore:
-            # Configurar o pipeline RAG
-            retriever, qa_chain = setup_rag_pipeline(vectorstore)
-            
-            if retriever and qa_chain:
-                st.session_state.retriever = retriever
-                st.session_state.qa_chain = qa_chain
-                st.success("✅ Sistema RAG inicializado com sucesso!")
+        if pipeline:
+            st.session_state.retriever = pipeline["retriever"]
+            st.session_state.qa_chain = pipeline["qa_chain"]
+            st.session_state.embeddings = pipeline["vectorstore"].embeddings
+            st.session_state.index_version = pipeline["index_version"]
+            st.success("✅ Sistema RAG inicializado com sucesso!")
+    
+    # Latência da primeira consulta real do processo (depois do aquecimento)
+    primeira_consulta = get_first_query()
+    if primeira_consulta:
+        st.caption(f"Primeira consulta: {primeira_consulta['tempo']:.2f}s "
+                   f"({'modelo frio' if primeira_consulta['frio'] else 'modelo já carregado'})")
     
     # Informações sobre o sistema
     st.markdown("### Sobre o Sistema")
@@ -219,14 +285,8 @@ with st.sidebar:
     
     # Exemplos de perguntas
     st.markdown("### Exemplos de Perguntas")
-    perguntas_exemplo = [
-        "Quais são os tipos de avaliação previstos no regulamento?",
-        "Como funciona a época especial de exames?",
-        "Quais são as condições para obter o estatuto de estudante-atleta?",
-        "Qual o prazo para revisão de provas?"
-    ]
-    
-    for pergunta in perguntas_exemplo:
+    # Respostas pré-geradas offline (python -m src.models.precompute) são servidas de imediato
+    for pergunta in EXAMPLE_QUESTIONS:
         if st.button(pergunta, key=f"btn_{pergunta}", use_container_width=True):
             st.session_state.exemplo_pergunta = pergunta
 
@@ -253,43 +313,74 @@ if st.button("Enviar Pergunta") or query:
     elif not query or len(query.strip()) < 3:
         st.warning("⚠️ Por favor, digite uma pergunta mais específica.")
     else:
-        with st.spinner("Buscando resposta..."):
-            try:
-                # Registrar a pergunta no histórico
-                st.session_state.chat_history.append({"role": "user", "content": query})
-                
-                # Verificar cache local primeiro
-                query_norm = normalize_query(query)
-                cached_result = st.session_state.query_cache.get(query_norm)
-                
+        try:
+            # Registrar a pergunta no histórico
+            st.session_state.chat_history.append({"role": "user", "content": query})
+            
+            # Verificar cache local primeiro, pela mesma chave do armazém persistente
+            # (pergunta normalizada, modelo, prompt e versão do índice)
+            index_version = st.session_state.get("index_version", "")
+            response_key = get_response_cache_key(query, st.session_state.qa_chain, index_version)
+            cached_result = st.session_state.query_cache.get(response_key)
+            query_vector = None
+            resposta_exibida = False
+            
+            # Depois, o armazém persistente e o cache semântico, partilhados por todas as sessões
+            # (o embedding da pergunta fica em cache para a recuperação)
+            if not cached_result:
+                _, cached_result, query_vector = lookup_response(
+                    query, st.session_state.qa_chain, index_version, st.session_state.get("embeddings"))
                 if cached_result:
-                    logger.info("Usando resposta em cache")
-                    resultado = cached_result
-                else:
+                    st.session_state.query_cache.set(response_key, cached_result)
+            
+            if cached_result:
+                logger.info("Usando resposta em cache")
+                resultado = cached_result
+            elif usar_streaming:
+                # Mostrar a resposta à medida que é gerada
+                resultado = render_streaming_response(query, st.session_state.qa_chain)
+                resposta_exibida = True
+                # Armazenar no cache local
+                st.session_state.query_cache.set(response_key, resultado)
+            else:
+                with st.spinner("Buscando resposta..."):
                     # Usar a função de cache para obter a resposta
                     resultado = get_cached_response(query, st.session_state.retriever, st.session_state.qa_chain)
-                    # Armazenar no cache local
-                    st.session_state.query_cache.set(query_norm, resultado)
-                
-                resposta_texto = resultado["resposta"]
-                documentos_fonte = resultado["documentos"]
-                tempo = resultado["tempo"]
-                
-                # Registrar a resposta no histórico
-                st.session_state.chat_history.append({"role": "assistant", "content": resposta_texto})
-                
-                # Exibir a resposta
+                # Armazenar no cache local
+                st.session_state.query_cache.set(response_key, resultado)
+            
+            if not cached_result and not resultado.get("erro"):
+                store_response(response_key, query, resultado, st.session_state.qa_chain,
+                               index_version, query_vector)
+            
+            resposta_texto = resultado["resposta"]
+            documentos_fonte = resultado["documentos"]
+            tempo = resultado["tempo"]
+            
+            # Registrar a resposta no histórico
+            st.session_state.chat_history.append({"role": "assistant", "content": resposta_texto})
+            
+            # Exibir a resposta
+            if not resposta_exibida:
                 st.markdown(f'<div class="response-box">{resposta_texto}</div>', unsafe_allow_html=True)
+            if resultado.get("tempo_primeiro_token") is not None:
+                st.info(f"⏱️ Tempo de resposta: {tempo:.2f} segundos "
+                        f"(primeiro token em {resultado['tempo_primeiro_token']:.2f} segundos)")
+            else:
                 st.info(f"⏱️ Tempo de resposta: {tempo:.2f} segundos")
+            if resultado.get("tempos"):
+                tempos = resultado["tempos"]
+                st.caption(f"Recuperação: {tempos['recuperacao']:.2f}s · Prompt: {tempos['prompt']:.3f}s · "
+                           f"Geração: {tempos['geracao']:.2f}s")
                 
-                # Exibir os documentos fonte
-                with st.expander("📄 Ver documentos fonte", expanded=False):
-                    for i, doc in enumerate(documentos_fonte, 1):
-                        st.markdown(f'<div class="document-box"><strong>Documento {i}:</strong> {doc.page_content}</div>', unsafe_allow_html=True)
-                
-            except Exception as e:
-                st.error(f"❌ Erro ao processar pergunta: {str(e)}")
-                st.exception(e)
+            # Exibir os documentos fonte
+            with st.expander("📄 Ver documentos fonte", expanded=False):
+                for i, doc in enumerate(documentos_fonte, 1):
+                    st.markdown(f'<div class="document-box"><strong>Documento {i}:</strong> {doc.page_content}</div>', unsafe_allow_html=True)
+            
+        except Exception as e:
+            st.error(f"❌ Erro ao processar pergunta: {str(e)}")
+            st.exception(e)
 
 # Exibir histórico de chat
 if st.session_state.chat_history:
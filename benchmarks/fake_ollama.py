@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Servidor HTTP local que imita a API do Ollama, para benchmarks reproduzíveis
+
+Implementa os endpoints usados pelo projeto (/api/embed, /api/embeddings, /api/generate,
+/api/tags, /api/version) com respostas deterministas:
+
+- Embeddings: saco de palavras com hashing (cada token soma ±1 numa posição derivada
+  do seu SHA-256), normalizado. Textos iguais dão vetores iguais e textos com palavras
+  em comum ficam próximos, pelo que a recuperação continua a fazer sentido.
+- Geração: uma resposta fixa emitida token a token, com latência fixa por token e
+  um custo fixo de avaliação do prompt, como um modelo real com carga constante.
+
+Uso:
+    python benchmarks/fake_ollama.py --port 11435 --latencia-token 0.01
+    OLLAMA_BASE_URL=http://127.0.0.1:11435 streamlit run app_refactored.py
+"""
+
+import json
+import time
+import asyncio
+import hashlib
+import argparse
+import threading
+from datetime import datetime, timezone
+
+import numpy as np
+from aiohttp import web
+
+DEFAULT_DIM = 768
+DEFAULT_TOKEN_LATENCY = 0.01   # Segundos por token gerado
+DEFAULT_PROMPT_LATENCY = 0.05  # Segundos de avaliação do prompt (antes do primeiro token)
+DEFAULT_RESPONSE = (
+    "De acordo com o regulamento, o estudante deve apresentar o pedido nos serviços "
+    "académicos dentro do prazo previsto, acompanhado dos documentos comprovativos."
+)
+
+def fake_embedding(text, dim=DEFAULT_DIM):
+    """
+    Calcula um embedding determinista de um texto
+    
+    Args:
+        text: Texto a converter
+        dim: Dimensão do embedding
+    
+    Returns:
+        Lista de floats normalizada
+    """
+    vector = np.zeros(dim, dtype=np.float32)
+    for token in text.lower().split():
+        digest = hashlib.sha256(token.encode("utf-8")).digest()
+        position = int.from_bytes(digest[:4], "little") % dim
+        vector[position] += 1.0 if digest[4] & 1 else -1.0
+    norm = np.linalg.norm(vector)
+    if norm == 0:
+        vector[0] = 1.0
+        norm = 1.0
+    return (vector / norm).tolist()
+
+def _timestamp():
+    return datetime.now(timezone.utc).isoformat()
+
+def create_app(dim=DEFAULT_DIM, token_latency=DEFAULT_TOKEN_LATENCY,
+               prompt_latency=DEFAULT_PROMPT_LATENCY, response_text=DEFAULT_RESPONSE):
+    """
+    Cria a aplicação aiohttp do servidor falso
+    
+    Args:
+        dim: Dimensão dos embeddings
+        token_latency: Latência fixa por token gerado, em segundos
+        prompt_latency: Latência fixa de avaliação do prompt, em segundos
+        response_text: Resposta devolvida a todos os pedidos de geração
+    
+    Returns:
+        Aplicação configurada
+    """
+    tokens = [token + " " for token in response_text.split()]
+    
+    async def embed(request):
+        payload = await request.json()
+        inputs = payload.get("input", [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        return web.json_response({
+            "model": payload.get("model"),
+            "embeddings": [fake_embedding(text, dim) for text in inputs]
+        })
+    
+    async def embeddings(request):
+        payload = await request.json()
+        return web.json_response({"embedding": fake_embedding(payload.get("prompt", ""), dim)})
+    
+    async def generate(request):
+        payload = await request.json()
+        start = time.perf_counter_ns()
+        prompt_tokens = len(payload.get("prompt", "").split())
+        await asyncio.sleep(prompt_latency)
+        prompt_eval_duration = time.perf_counter_ns() - start
+        
+        def chunk(**fields):
+            return dict({"model": payload.get("model"), "created_at": _timestamp()}, **fields)
+        
+        def final(eval_duration):
+            return chunk(response="", done=True, done_reason="stop",
+                         total_duration=time.perf_counter_ns() - start, load_duration=0,
+                         prompt_eval_count=prompt_tokens, prompt_eval_duration=prompt_eval_duration,
+                         eval_count=len(tokens), eval_duration=eval_duration)
+        
+        if not payload.get("stream", True):
+            await asyncio.sleep(token_latency * len(tokens))
+            body = final(time.perf_counter_ns() - start - prompt_eval_duration)
+            body["response"] = "".join(tokens)
+            return web.json_response(body)
+        
+        response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+        await response.prepare(request)
+        eval_start = time.perf_counter_ns()
+        for token in tokens:
+            await asyncio.sleep(token_latency)
+            await response.write((json.dumps(chunk(response=token, done=False)) + "\n").encode("utf-8"))
+        await response.write((json.dumps(final(time.perf_counter_ns() - eval_start)) + "\n").encode("utf-8"))
+        await response.write_eof()
+        return response
+    
+    async def tags(request):
+        return web.json_response({"models": [{"name": "llama3:latest", "model": "llama3:latest"},
+                                             {"name": "nomic-embed-text:latest",
+                                              "model": "nomic-embed-text:latest"}]})
+    
+    async def version(request):
+        return web.json_response({"version": "0.0.0-fake"})
+    
+    app = web.Application()
+    app.router.add_post("/api/embed", embed)
+    app.router.add_post("/api/embeddings", embeddings)
+    app.router.add_post("/api/generate", generate)
+    app.router.add_get("/api/tags", tags)
+    app.router.add_get("/api/version", version)
+    return app
+
+class FakeOllamaServer:
+    """
+    Servidor falso a correr numa thread própria, para usar dentro de um benchmark
+    
+    Exemplo:
+        with FakeOllamaServer(token_latency=0.01) as server:
+            os.environ["OLLAMA_BASE_URL"] = server.base_url
+    """
+    
+    def __init__(self, host="127.0.0.1", port=0, **app_kwargs):
+        """
+        Inicializa o servidor (sem o arrancar)
+        
+        Args:
+            host: Endereço de escuta
+            port: Porta de escuta (0 escolhe uma porta livre)
+            **app_kwargs: Argumentos de create_app
+        """
+        self.host = host
+        self.port = port
+        self.app_kwargs = app_kwargs
+        self._loop = None
+        self._runner = None
+        self._thread = None
+    
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}"
+    
+    def start(self):
+        """
+        Arranca o servidor e espera até estar a aceitar ligações
+        """
+        ready = threading.Event()
+        
+        def run():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._runner = web.AppRunner(create_app(**self.app_kwargs), access_log=None)
+            self._loop.run_until_complete(self._runner.setup())
+            site = web.TCPSite(self._runner, self.host, self.port)
+            self._loop.run_until_complete(site.start())
+            self.port = site._server.sockets[0].getsockname()[1]
+            ready.set()
+            self._loop.run_forever()
+        
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+        ready.wait()
+        return self
+    
+    def stop(self):
+        """
+        Para o servidor e a thread
+        """
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop = None
+    
+    def __enter__(self):
+        return self.start()
+    
+    def __exit__(self, *exc):
+        self.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor local que imita a API do Ollama")
+    parser.add_argument("--host", default="127.0.0.1", help="Endereço de escuta")
+    parser.add_argument("--port", type=int, default=11435, help="Porta de escuta")
+    parser.add_argument("--dim", type=int, default=DEFAULT_DIM, help="Dimensão dos embeddings")
+    parser.add_argument("--latencia-token", type=float, default=DEFAULT_TOKEN_LATENCY,
+                        help="Latência por token gerado, em segundos")
+    parser.add_argument("--latencia-prompt", type=float, default=DEFAULT_PROMPT_LATENCY,
+                        help="Latência de avaliação do prompt, em segundos")
+    args = parser.parse_args()
+    
+    web.run_app(create_app(args.dim, args.latencia_token, args.latencia_prompt),
+                host=args.host, port=args.port)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark por etapas do pipeline RAG contra um Ollama falso e determinista
+
+Mede separadamente load_pdf, split_documents, embeddings, construção do índice,
+recuperação, montagem do prompt e geração (incluindo o tempo até ao primeiro token),
+usando as configurações atuais (CHUNK_SIZE, RETRIEVER_K, VECTOR_BACKEND, ...). O Ollama
+é substituído por benchmarks/fake_ollama.py, com embeddings deterministas e latência
+fixa por token, pelo que as diferenças entre execuções vêm do código e não do modelo.
+
+O resultado (p50/p95/p99 e débito por etapa) é escrito em JSON. Com --baseline, o
+script termina com código 1 se o tempo mínimo de alguma etapa ficar acima do da baseline
+guardada. Os tempos das etapas limitadas pelo CPU são normalizados por uma carga de
+calibração medida na mesma execução, pelo que a baseline pode ser comparada noutra
+máquina; diferenças que a calibração não capta (disco, outra versão do Python ou das
+dependências) exigem regenerar a baseline nessa máquina.
+
+Uso:
+    python benchmarks/pipeline_stages.py --baseline benchmarks/baseline.json
+    python benchmarks/pipeline_stages.py --atualizar-baseline benchmarks/baseline.json
+"""
+
+import gc
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+
+import numpy as np
+
+# Permitir importar os módulos do projeto (src/) ao executar este script diretamente
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from benchmarks.fake_ollama import FakeOllamaServer
+
+PERGUNTAS = [
+    "Como posso justificar as faltas?",
+    "O que é a avaliação contínua?",
+    "Quais são os tipos de avaliação previstos no regulamento?",
+    "Como funciona a época especial de exames?",
+    "Quais são as condições para obter o estatuto de estudante-atleta?",
+    "Qual o prazo para revisão de provas?",
+    "Quem pode requerer a melhoria de nota?",
+    "Qual a escala de classificação utilizada?",
+    "O que acontece em caso de fraude numa prova?",
+    "Como se calcula a classificação final de uma unidade curricular?"
+]
+
+# Etapas limitadas pelo CPU, cuja baseline é normalizada pela calibração; o tempo até ao
+# primeiro token e a geração são dominados pela latência fixa do Ollama falso
+ETAPAS_CPU = {"load_pdf", "split_documents", "embeddings", "construcao_indice", "recuperacao", "prompt"}
+
+def summarize(samples, items=None, unit="operações"):
+    """
+    Resume uma lista de tempos com percentis e débito
+    
+    Args:
+        samples: Tempos de cada repetição, em segundos
+        items: Itens processados em cada repetição (None conta uma operação por amostra)
+        unit: Unidade do débito
+    
+    Returns:
+        Dicionário com o mínimo e os percentis em milissegundos e o débito por segundo
+    """
+    values = np.asarray(samples, dtype=np.float64)
+    total_items = len(samples) if items is None else items * len(samples)
+    return {
+        "amostras": len(samples),
+        "min_ms": float(values.min() * 1000),
+        "p50_ms": float(np.percentile(values, 50) * 1000),
+        "p95_ms": float(np.percentile(values, 95) * 1000),
+        "p99_ms": float(np.percentile(values, 99) * 1000),
+        "media_ms": float(values.mean() * 1000),
+        "debito": float(total_items / values.sum()) if values.sum() > 0 else None,
+        "unidade_debito": f"{unit}/s"
+    }
+
+def timed(function, repeats):
+    """
+    Executa uma função várias vezes, medindo cada execução
+    
+    Args:
+        function: Função sem argumentos
+        repeats: Número de repetições
+    
+    Returns:
+        Tupla (lista de tempos em segundos, resultado da última execução)
+    """
+    samples = []
+    result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function()
+        samples.append(time.perf_counter() - start)
+    return samples, result
+
+def calibrate(repeats=15):
+    """
+    Mede uma carga fixa em Python puro (expressões regulares, dicionários, ordenação e
+    JSON, as operações que dominam as etapas de indexação), usada para comparar a
+    velocidade da máquina com a da baseline
+    
+    O coletor de lixo fica desligado durante a medição, para que o tempo não dependa do
+    número de objetos já carregados no processo.
+    
+    Args:
+        repeats: Número de repetições
+    
+    Returns:
+        Lista de tempos em segundos
+    """
+    text = " ".join(PERGUNTAS) * 300
+    pattern = re.compile(r"\w+")
+    
+    def workload():
+        words = pattern.findall(text)
+        counts = {}
+        for word in words:
+            counts[word] = counts.get(word, 0) + 1
+        return json.loads(json.dumps(sorted(words)))
+    
+    gc.collect()
+    gc.disable()
+    try:
+        samples, _ = timed(workload, repeats)
+    finally:
+        gc.enable()
+    return samples
+
+def build_index(backend, directory, chunks, vectors, embedding):
+    """
+    Constrói um índice vetorial a partir de embeddings já calculados
+    
+    Args:
+        backend: "chroma" ou "numpy"
+        directory: Diretório onde persistir o índice
+        chunks: Chunks a indexar
+        vectors: Embeddings dos chunks
+        embedding: Objeto de embeddings usado nas consultas
+    
+    Returns:
+        Vectorstore construído
+    """
+    from langchain_community.vectorstores import Chroma
+    from src.models.embeddings import _upsert_embedded_documents
+    from src.models.vector_index import NumpyVectorStore
+    
+    ids = [doc.metadata["chunk_id"] for doc in chunks]
+    if backend == "chroma":
+        store = Chroma(persist_directory=directory, embedding_function=embedding,
+                       collection_metadata={"hnsw:space": "cosine"})
+        _upsert_embedded_documents(store, ids, vectors, chunks)
+    else:
+        store = NumpyVectorStore(embedding, directory)
+        store.add_embeddings(ids, vectors, chunks)
+        store.persist()
+    return store
+
+def run_benchmark(args):
+    """
+    Executa todas as etapas e devolve o relatório
+    
+    Args:
+        args: Argumentos da linha de comandos
+    
+    Returns:
+        Dicionário com a configuração e as estatísticas de cada etapa
+    """
+    # Importados depois de OLLAMA_BASE_URL apontar para o servidor falso
+    from src.config import settings
+    from src.data.document_loader import load_pdf, split_documents
+    from src.models.embeddings import create_embeddings, embed_documents_in_batches, get_retriever
+    from src.models.rag import create_llm, build_prompt, stream_answer
+    
+    etapas = {}
+    calibracao = calibrate()
+    directory = tempfile.mkdtemp(prefix="bench_etapas_")
+    try:
+        samples, documents = timed(lambda: load_pdf(args.pdf), args.repeticoes)
+        etapas["load_pdf"] = summarize(samples, len(documents), "páginas")
+        
+        samples, chunks = timed(lambda: split_documents(documents), args.repeticoes)
+        etapas["split_documents"] = summarize(samples, len(chunks), "chunks")
+        
+        embeddings = create_embeddings()
+        texts = [doc.page_content for doc in chunks]
+        samples, vectors = timed(lambda: embed_documents_in_batches(texts, embeddings), args.repeticoes)
+        etapas["embeddings"] = summarize(samples, len(chunks), "chunks")
+        
+        # Um diretório novo por repetição (o Chroma mantém os clientes abertos por caminho);
+        # as consultas usam o modelo sem cache, para que cada pesquisa inclua o embedding da pergunta
+        store_dirs = iter(os.path.join(directory, f"indice_{i}") for i in range(args.repeticoes))
+        samples, store = timed(lambda: build_index(args.motor, next(store_dirs), chunks, vectors,
+                                                   embeddings.embeddings), args.repeticoes)
+        etapas["construcao_indice"] = summarize(samples, len(chunks), "chunks")
+        calibracao += calibrate()
+        
+        retriever = get_retriever(store, mode="similarity")
+        perguntas = [PERGUNTAS[i % len(PERGUNTAS)] for i in range(args.consultas)]
+        recuperacao, montagem, documentos_por_pergunta, prompts = [], [], [], []
+        for pergunta in perguntas:
+            start = time.perf_counter()
+            documentos = retriever.invoke(pergunta)
+            recuperacao.append(time.perf_counter() - start)
+            documentos_por_pergunta.append(documentos)
+        
+        for pergunta, documentos in zip(perguntas, documentos_por_pergunta):
+            start = time.perf_counter()
+            prompts.append(build_prompt(pergunta, documentos)["prompt"])
+            montagem.append(time.perf_counter() - start)
+        etapas["recuperacao"] = summarize(recuperacao, unit="consultas")
+        etapas["prompt"] = summarize(montagem, unit="consultas")
+        
+        llm = create_llm()
+        primeiro_token, geracao = [], []
+        for prompt_text in prompts[:args.geracoes]:
+            start = time.perf_counter()
+            first = None
+            for _ in stream_answer(prompt_text, llm):
+                if first is None:
+                    first = time.perf_counter() - start
+            geracao.append(time.perf_counter() - start)
+            primeiro_token.append(first if first is not None else geracao[-1])
+        etapas["primeiro_token"] = summarize(primeiro_token, unit="consultas")
+        etapas["geracao"] = summarize(geracao, unit="consultas")
+        
+        # Calibração no início, a meio e no fim das etapas: o menor tempo ignora uma quebra
+        # momentânea da velocidade da máquina durante uma das medições
+        calibracao += calibrate()
+        return {
+            "calibracao_ms": float(min(calibracao) * 1000),
+            "configuracao": {
+                "chunk_size": settings.CHUNK_SIZE,
+                "chunk_overlap": settings.CHUNK_OVERLAP,
+                "divisao": settings.CHUNKING_MODE,
+                "packing": settings.CONTEXT_PACKING,
+                "retriever_k": settings.RETRIEVER_K,
+                "embedding_batch_size": settings.EMBEDDING_BATCH_SIZE,
+                "embedding_max_workers": settings.EMBEDDING_MAX_WORKERS,
+                "motor": args.motor,
+                "paginas": len(documents),
+                "chunks": len(chunks),
+                "latencia_token": args.latencia_token,
+                "latencia_prompt": args.latencia_prompt
+            },
+            "etapas": etapas
+        }
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+def compare_with_baseline(report, baseline, tolerance, margin_ms):
+    """
+    Compara o tempo mínimo de cada etapa com a baseline
+    
+    O mínimo das repetições, ao contrário do p50, não é afetado por quebras momentâneas
+    da velocidade da máquina. Uma etapa regride quando
+    mínimo > mínimo_baseline * escala * (1 + tolerância) + margem; a margem absoluta evita
+    falsos alarmes em etapas que demoram frações de milissegundo. Nas etapas limitadas
+    pelo CPU (ETAPAS_CPU), a escala é a razão entre a calibração atual e a da baseline;
+    nas restantes é 1.
+    
+    Args:
+        report: Relatório atual
+        baseline: Relatório guardado
+        tolerance: Aumento relativo tolerado (0.25 = 25%)
+        margin_ms: Aumento absoluto tolerado, em milissegundos
+    
+    Returns:
+        Lista de regressões (etapa, mínimo da baseline, escala, mínimo atual e limite)
+    """
+    speed = report["calibracao_ms"] / baseline["calibracao_ms"]
+    regressions = []
+    for stage, stats in baseline.get("etapas", {}).items():
+        current = report["etapas"].get(stage)
+        if current is None:
+            continue
+        scale = speed if stage in ETAPAS_CPU else 1.0
+        limit = stats["min_ms"] * scale * (1 + tolerance) + margin_ms
+        if current["min_ms"] > limit:
+            regressions.append({"etapa": stage, "baseline_min_ms": stats["min_ms"], "escala": scale,
+                                "atual_min_ms": current["min_ms"], "limite_ms": limit})
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark por etapas do pipeline RAG")
+    parser.add_argument("--pdf", default=os.path.join(ROOT_DIR, "resources",
+                                                      "ESTG_Regulamento-Frequencia-Avaliacao2023.pdf"),
+                        help="PDF a usar")
+    parser.add_argument("--motor", choices=["chroma", "numpy"], default=None,
+                        help="Motor vetorial (por omissão VECTOR_BACKEND)")
+    parser.add_argument("--repeticoes", type=int, default=5,
+                        help="Repetições das etapas de indexação (load_pdf, split, embeddings, índice)")
+    parser.add_argument("--consultas", type=int, default=50, help="Consultas nas etapas de recuperação e prompt")
+    parser.add_argument("--geracoes", type=int, default=10, help="Consultas na etapa de geração")
+    parser.add_argument("--latencia-token", type=float, default=0.005,
+                        help="Latência do Ollama falso por token gerado, em segundos")
+    parser.add_argument("--latencia-prompt", type=float, default=0.02,
+                        help="Latência do Ollama falso na avaliação do prompt, em segundos")
+    parser.add_argument("--saida", help="Ficheiro onde escrever o relatório JSON (por omissão o stdout)")
+    parser.add_argument("--baseline", help="Baseline com que comparar; termina com código 1 se houver regressões")
+    parser.add_argument("--atualizar-baseline", metavar="FICHEIRO", help="Guardar o relatório como nova baseline")
+    parser.add_argument("--tolerancia", type=float, default=0.25, help="Aumento relativo tolerado do tempo mínimo")
+    parser.add_argument("--margem-ms", type=float, default=1.0, help="Aumento absoluto tolerado do tempo mínimo, em ms")
+    args = parser.parse_args()
+    
+    with FakeOllamaServer(token_latency=args.latencia_token, prompt_latency=args.latencia_prompt) as server:
+        os.environ["OLLAMA_BASE_URL"] = server.base_url
+        if args.motor is None:
+            from src.config.settings import VECTOR_BACKEND
+            args.motor = VECTOR_BACKEND
+        report = run_benchmark(args)
+    
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        anterior, atual = baseline.get("configuracao", {}), report["configuracao"]
+        diferencas = {key: (anterior.get(key), atual.get(key)) for key in sorted(set(anterior) | set(atual))
+                      if anterior.get(key) != atual.get(key)}
+        for key, (antes, agora) in diferencas.items():
+            print(f"AVISO: configuração diferente da baseline em {key}: {antes} -> {agora}", file=sys.stderr)
+        if "calibracao_ms" not in baseline:
+            sys.exit(f"A baseline {args.baseline} não tem calibração; regenere-a com --atualizar-baseline")
+        print(f"Calibração: {report['calibracao_ms']:.2f} ms (baseline {baseline['calibracao_ms']:.2f} ms, "
+              f"escala {report['calibracao_ms'] / baseline['calibracao_ms']:.2f})", file=sys.stderr)
+        report["regressoes"] = compare_with_baseline(report, baseline, args.tolerancia, args.margem_ms)
+    
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    
+    if args.atualizar_baseline:
+        with open(args.atualizar_baseline, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+        print(f"Baseline guardada em {args.atualizar_baseline}", file=sys.stderr)
+    
+    if report.get("regressoes"):
+        for r in report["regressoes"]:
+            print(f"REGRESSÃO em {r['etapa']}: mínimo {r['atual_min_ms']:.2f} ms "
+                  f"(baseline {r['baseline_min_ms']:.2f} ms x {r['escala']:.2f}, "
+                  f"limite {r['limite_ms']:.2f} ms)", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Relatório da quantização do índice NumPy: recall@k e latência face ao float32
+
+Compara float32, float16 e int8 (com e sem repontuação em float32) sobre os mesmos
+embeddings: os do índice NumPy persistido (--indice) ou embeddings sintéticos
+agrupados por tema. As consultas são embeddings de chunks com ruído, como perguntas
+próximas do texto indexado. Não precisa do Ollama.
+
+Uso:
+    python benchmarks/quantization.py --chunks 5000 --dim 768 --queries 200 --k 4
+    python benchmarks/quantization.py --indice vector_index
+"""
+
+import os
+import sys
+import json
+import argparse
+
+import numpy as np
+
+# Permitir importar os módulos do projeto (src/) ao executar este script diretamente
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.models.vector_index import NumpyVectorStore, quantization_report
+
+def synthetic_vectors(chunks, dim, topics=50, seed=0):
+    """
+    Gera embeddings sintéticos agrupados por tema (centro do tema + ruído)
+    
+    Args:
+        chunks: Número de chunks
+        dim: Dimensão dos embeddings
+        topics: Número de temas
+        seed: Semente do gerador aleatório
+    
+    Returns:
+        Matriz de embeddings (chunks x dim)
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((topics, dim)).astype(np.float32)
+    assignment = rng.integers(0, topics, size=chunks)
+    return centers[assignment] + 0.6 * rng.standard_normal((chunks, dim)).astype(np.float32)
+
+def sample_queries(vectors, count, noise=0.5, seed=1):
+    """
+    Gera consultas a partir de chunks escolhidos ao acaso, com ruído
+    
+    Args:
+        vectors: Embeddings indexados
+        count: Número de consultas
+        noise: Desvio do ruído, relativo à norma média dos embeddings
+        seed: Semente do gerador aleatório
+    
+    Returns:
+        Matriz de consultas (count x dim)
+    """
+    rng = np.random.default_rng(seed)
+    base = np.asarray(vectors[rng.integers(0, len(vectors), size=count)], dtype=np.float32)
+    scale = noise * float(np.mean(np.linalg.norm(base, axis=1))) / np.sqrt(base.shape[1])
+    return base + scale * rng.standard_normal(base.shape).astype(np.float32)
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall@k e latência do índice quantizado")
+    parser.add_argument("--indice", help="Diretório de um índice NumPy persistido (por omissão, embeddings sintéticos)")
+    parser.add_argument("--chunks", type=int, default=5000, help="Número de chunks sintéticos")
+    parser.add_argument("--dim", type=int, default=768, help="Dimensão dos embeddings sintéticos")
+    parser.add_argument("--queries", type=int, default=200, help="Número de consultas")
+    parser.add_argument("--k", type=int, default=4, help="Número de resultados por consulta")
+    parser.add_argument("--fator-repontuacao", type=int, default=4, help="Candidatos repontuados por resultado")
+    parser.add_argument("--json", action="store_true", help="Escrever o resultado em JSON")
+    args = parser.parse_args()
+    
+    if args.indice:
+        store = NumpyVectorStore(None, args.indice)
+        vectors = store._full_matrix()
+    else:
+        vectors = synthetic_vectors(args.chunks, args.dim)
+    queries = sample_queries(vectors, args.queries)
+    report = quantization_report(vectors, queries, args.k, rescore_factor=args.fator_repontuacao)
+    
+    if args.json:
+        print(json.dumps({"chunks": len(vectors), "dim": vectors.shape[1], "k": args.k, "resultados": report}, indent=2))
+        return
+    
+    baseline = report["float32"]
+    print(f"\n{len(vectors)} chunks, dimensão {vectors.shape[1]}, {args.queries} consultas, k={args.k}\n")
+    print(f"{'Forma':<22} {'Recall@k':>9} {'p50 (ms)':>10} {'p95 (ms)':>10} {'Memória (MB)':>13} {'vs float32':>11}")
+    for name, r in report.items():
+        print(f"{name:<22} {r['recall']:>9.4f} {r['p50_ms']:>10.3f} {r['p95_ms']:>10.3f} "
+              f"{r['bytes'] / 1e6:>13.2f} {r['bytes'] / baseline['bytes']:>10.0%}")
+
+if __name__ == "__main__":
+    main()
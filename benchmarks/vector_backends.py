@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark dos motores vetoriais: Chroma vs. índice NumPy em memory-map
+
+Constrói os dois índices com os mesmos embeddings sintéticos e compara o tempo
+de carregamento (num processo novo, como num arranque a frio) e a latência das
+pesquisas top-k, individuais e em lote. Não precisa do Ollama.
+
+Uso:
+    python benchmarks/vector_backends.py --chunks 2000 --dim 768 --queries 200 --k 4
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+import numpy as np
+
+# Permitir importar os módulos do projeto (src/) ao executar este script diretamente
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain.schema import Document
+from langchain_community.vectorstores import Chroma
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from src.models.embeddings import _upsert_embedded_documents
+from src.models.vector_index import NumpyVectorStore
+
+def percentile_ms(samples, q):
+    """
+    Calcula um percentil de uma lista de tempos, em milissegundos
+    
+    Args:
+        samples: Tempos em segundos
+        q: Percentil (0-100)
+    
+    Returns:
+        Percentil em milissegundos
+    """
+    return float(np.percentile(np.asarray(samples) * 1000, q))
+
+def build_indexes(directory, chunks, dim, seed=0):
+    """
+    Constrói os índices Chroma e NumPy com os mesmos embeddings sintéticos
+    
+    Args:
+        directory: Diretório de trabalho
+        chunks: Número de chunks
+        dim: Dimensão dos embeddings
+        seed: Semente do gerador aleatório
+    
+    Returns:
+        Matriz de embeddings usada
+    """
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((chunks, dim)).astype(np.float32)
+    ids = [f"chunk-{i}" for i in range(chunks)]
+    documents = [Document(page_content=f"Texto do chunk {i}", metadata={"chunk_id": ids[i], "page": i // 5})
+                 for i in range(chunks)]
+    embedding = DeterministicFakeEmbedding(size=dim)
+    
+    chroma = Chroma(persist_directory=os.path.join(directory, "chroma"), embedding_function=embedding,
+                    collection_metadata={"hnsw:space": "cosine"})
+    _upsert_embedded_documents(chroma, ids, vectors.tolist(), documents)
+    
+    numpy_store = NumpyVectorStore(embedding, os.path.join(directory, "numpy"))
+    numpy_store.add_embeddings(ids, vectors, documents)
+    numpy_store.persist()
+    return vectors
+
+def open_index(backend, directory, dim):
+    """
+    Abre um índice persistido e executa uma primeira pesquisa
+    
+    Args:
+        backend: "chroma" ou "numpy"
+        directory: Diretório de trabalho
+        dim: Dimensão dos embeddings
+    
+    Returns:
+        Vectorstore aberto
+    """
+    embedding = DeterministicFakeEmbedding(size=dim)
+    if backend == "chroma":
+        store = Chroma(persist_directory=os.path.join(directory, "chroma"), embedding_function=embedding,
+                       collection_metadata={"hnsw:space": "cosine"})
+    else:
+        store = NumpyVectorStore(embedding, os.path.join(directory, "numpy"))
+    store.similarity_search_by_vector(np.ones(dim, dtype=np.float32).tolist(), k=1)
+    return store
+
+def measure_load(backend, directory, dim, repeats):
+    """
+    Mede o tempo de abertura de um índice num processo novo
+    
+    Args:
+        backend: "chroma" ou "numpy"
+        directory: Diretório de trabalho
+        dim: Dimensão dos embeddings
+        repeats: Número de repetições
+    
+    Returns:
+        Lista de tempos em segundos
+    """
+    samples = []
+    for _ in range(repeats):
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--medir-carga", backend, directory, "--dim", str(dim)],
+            capture_output=True, text=True, check=True
+        ).stdout
+        samples.append(float(output.strip().splitlines()[-1]))
+    return samples
+
+def measure_queries(store, queries, k):
+    """
+    Mede a latência de pesquisas individuais
+    
+    Args:
+        store: Vectorstore aberto
+        queries: Matriz de embeddings das consultas
+        k: Número de resultados por consulta
+    
+    Returns:
+        Lista de tempos em segundos
+    """
+    samples = []
+    for query in queries:
+        start = time.perf_counter()
+        store.similarity_search_by_vector(query.tolist(), k=k)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def measure_batch(backend, store, queries, k):
+    """
+    Mede o tempo de uma pesquisa em lote com todas as consultas
+    
+    Args:
+        backend: "chroma" ou "numpy"
+        store: Vectorstore aberto
+        queries: Matriz de embeddings das consultas
+        k: Número de resultados por consulta
+    
+    Returns:
+        Tempo em segundos
+    """
+    start = time.perf_counter()
+    if backend == "chroma":
+        store._collection.query(query_embeddings=queries.tolist(), n_results=k)
+    else:
+        store.search_vectors(queries, k)
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Chroma vs. índice NumPy")
+    parser.add_argument("--chunks", type=int, default=2000, help="Número de chunks indexados")
+    parser.add_argument("--dim", type=int, default=768, help="Dimensão dos embeddings")
+    parser.add_argument("--queries", type=int, default=200, help="Número de consultas")
+    parser.add_argument("--k", type=int, default=4, help="Número de resultados por consulta")
+    parser.add_argument("--repeticoes-carga", type=int, default=3, help="Repetições da medição de carregamento")
+    parser.add_argument("--json", action="store_true", help="Escrever o resultado em JSON")
+    parser.add_argument("--medir-carga", nargs=2, metavar=("MOTOR", "DIRETORIO"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.medir_carga:
+        backend, directory = args.medir_carga
+        start = time.perf_counter()
+        open_index(backend, directory, args.dim)
+        print(time.perf_counter() - start)
+        return
+    
+    directory = tempfile.mkdtemp(prefix="bench_vetorial_")
+    try:
+        build_indexes(directory, args.chunks, args.dim)
+        queries = np.random.default_rng(1).standard_normal((args.queries, args.dim)).astype(np.float32)
+        
+        results = {}
+        for backend in ("chroma", "numpy"):
+            load = measure_load(backend, directory, args.dim, args.repeticoes_carga)
+            store = open_index(backend, directory, args.dim)
+            latencies = measure_queries(store, queries, args.k)
+            batch = measure_batch(backend, store, queries, args.k)
+            results[backend] = {
+                "carga_ms": percentile_ms(load, 50),
+                "consulta_p50_ms": percentile_ms(latencies, 50),
+                "consulta_p95_ms": percentile_ms(latencies, 95),
+                "lote_total_ms": batch * 1000,
+                "lote_por_consulta_ms": batch * 1000 / len(queries)
+            }
+        
+        if args.json:
+            print(json.dumps({"chunks": args.chunks, "dim": args.dim, "k": args.k, "resultados": results}, indent=2))
+            return
+        
+        print(f"\n{args.chunks} chunks, dimensão {args.dim}, {args.queries} consultas, k={args.k}\n")
+        print(f"{'Motor':<8} {'Carga (ms)':>11} {'p50 (ms)':>10} {'p95 (ms)':>10} {'Lote/consulta (ms)':>20}")
+        for backend, r in results.items():
+            print(f"{backend:<8} {r['carga_ms']:>11.1f} {r['consulta_p50_ms']:>10.3f} "
+                  f"{r['consulta_p95_ms']:>10.3f} {r['lote_por_consulta_ms']:>20.4f}")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Serviço HTTP assíncrono (aiohttp) para o pipeline RAG
+
+O pipeline é carregado uma única vez no arranque e partilhado por todos os pedidos.
+A recuperação e a geração usam as variantes assíncronas (ainvoke/astream), pelo que
+várias consultas ficam em curso em simultâneo sem bloquear o event loop.
+
+Uso:
+    python -m src.api.server --host 127.0.0.1 --port 8000
+
+Endpoints:
+    GET  /health        Estado do serviço
+    POST /query         {"pergunta": "..."} -> resposta completa em JSON
+    POST /query/stream  {"pergunta": "..."} -> eventos NDJSON (documentos, token, fim)
+    GET  /metrics       Métricas no formato de texto do Prometheus
+"""
+
+import json
+import time
+import asyncio
+import logging
+import argparse
+from typing import Dict, Any, List
+
+from aiohttp import web
+from langchain.schema import Document
+
+from src.models.registry import get_pipeline
+from src.models.rag import aprocess_query_shared, aprocess_query_stream_shared, lookup_response, store_response
+from src.models.warmup import warm_up_and_keep_alive, get_first_query
+from src.utils.metrics import registry, start_log_summary
+from src.config.settings import SERVER_HOST, SERVER_PORT, SERVER_MAX_CONCURRENCY, METRICS_LOG_INTERVAL
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+def load_pipeline() -> Dict[str, Any]:
+    """
+    Obtém o pipeline RAG do processo, abrindo o vectorstore (e lendo os PDFs apenas
+    se o índice estiver desatualizado) na primeira chamada (operação bloqueante)
+    
+    Returns:
+        Dicionário com a cadeia de QA, a versão do índice e os embeddings das consultas
+    """
+    try:
+        pipeline = get_pipeline()
+        logger.info(f"Pipeline carregado (índice {pipeline['index_version']})")
+        return {"qa_chain": pipeline["qa_chain"], "index_version": pipeline["index_version"],
+                "embeddings": pipeline["vectorstore"].embeddings}
+    except Exception as e:
+        logger.error(f"Erro ao carregar o pipeline: {str(e)}")
+        raise
+
+def serialize_documents(documents: List[Document]) -> List[Dict[str, Any]]:
+    """
+    Converte documentos para uma estrutura serializável em JSON
+    
+    Args:
+        documents: Documentos recuperados
+    
+    Returns:
+        Lista de dicionários com o conteúdo e os metadados
+    """
+    return [{"conteudo": doc.page_content, "metadados": doc.metadata} for doc in documents]
+
+async def _read_query(request: web.Request) -> str:
+    """
+    Lê e valida a pergunta do corpo JSON do pedido
+    
+    Args:
+        request: Pedido HTTP
+    
+    Returns:
+        Pergunta do usuário
+    """
+    try:
+        payload = await request.json()
+    except json.JSONDecodeError:
+        raise web.HTTPBadRequest(text="Corpo do pedido não é JSON válido")
+    
+    query = payload.get("pergunta", "") if isinstance(payload, dict) else ""
+    if not isinstance(query, str) or len(query.strip()) < 3:
+        raise web.HTTPBadRequest(text="Campo 'pergunta' em falta ou demasiado curto")
+    return query
+
+async def _lookup_stored_response(app: web.Application, query: str):
+    """
+    Procura a resposta no armazém persistente e uma pergunta semelhante no cache
+    semântico do processo, fora do event loop
+    
+    Args:
+        app: Aplicação aiohttp
+        query: Pergunta do usuário
+    
+    Returns:
+        Tupla (chave, resultado ou None, embedding da pergunta ou None)
+    """
+    return await asyncio.to_thread(lookup_response, query, app["qa_chain"], app["index_version"],
+                                   app["embeddings"])
+
+async def _store_response(app: web.Application, key: str, query: str, resultado: Dict[str, Any],
+                          vector) -> None:
+    """
+    Guarda uma resposta gerada no armazém persistente e no cache semântico, fora do event loop
+    """
+    await asyncio.to_thread(store_response, key, query, resultado, app["qa_chain"],
+                            app["index_version"], vector)
+
+async def handle_health(request: web.Request) -> web.Response:
+    """
+    Indica se o serviço está pronto, quantas consultas estão em curso e o resultado
+    do aquecimento dos modelos (carregamento no arranque e latência da primeira consulta)
+    """
+    app = request.app
+    return web.json_response({
+        "estado": "ok",
+        "versao_indice": app["index_version"],
+        "consultas_em_curso": app["em_curso"],
+        "aquecimento": app.get("aquecimento"),
+        "primeira_consulta": get_first_query()
+    })
+
+async def handle_metrics(request: web.Request) -> web.Response:
+    """
+    Exporta as métricas do processo no formato de texto do Prometheus
+    """
+    return web.Response(text=registry.render(), content_type="text/plain", charset="utf-8",
+                        headers={"X-Prometheus-Format": "0.0.4"})
+
+async def handle_query(request: web.Request) -> web.Response:
+    """
+    Responde a uma consulta com a resposta completa em JSON
+    """
+    app = request.app
+    query = await _read_query(request)
+    start_time = time.time()
+    
+    key, resultado, vector = await _lookup_stored_response(app, query)
+    em_cache = resultado is not None
+    if em_cache:
+        logger.info("Usando resposta em cache")
+    else:
+        app["em_curso"] += 1
+        try:
+            # Pedidos idênticos em curso partilham a mesma execução (e a mesma vaga do semáforo)
+            resultado = await aprocess_query_shared(query, app["qa_chain"], app["semaforo"])
+        except Exception as e:
+            raise web.HTTPInternalServerError(text=f"Erro ao processar consulta: {str(e)}")
+        finally:
+            app["em_curso"] -= 1
+        resultado["tempo"] = time.time() - start_time
+        await _store_response(app, key, query, resultado, vector)
+    
+    return web.json_response({
+        "resposta": resultado["resposta"],
+        "documentos": serialize_documents(resultado["documentos"]),
+        "tempo": time.time() - start_time,
+        "tempos": resultado.get("tempos", {}),
+        "cache": em_cache,
+        "partilhado": resultado.get("partilhado", False)
+    })
+
+async def handle_query_stream(request: web.Request) -> web.StreamResponse:
+    """
+    Responde a uma consulta em streaming, com um evento JSON por linha
+    """
+    app = request.app
+    query = await _read_query(request)
+    start_time = time.time()
+    
+    response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson; charset=utf-8"})
+    await response.prepare(request)
+    
+    async def send(evento: Dict[str, Any]) -> None:
+        await response.write((json.dumps(evento, ensure_ascii=False) + "\n").encode("utf-8"))
+    
+    key, resultado, vector = await _lookup_stored_response(app, query)
+    if resultado:
+        logger.info("Usando resposta em cache")
+        await send({"tipo": "documentos", "documentos": serialize_documents(resultado["documentos"])})
+        await send({"tipo": "token", "token": resultado["resposta"]})
+        await send({"tipo": "fim", "resposta": resultado["resposta"], "tempo_total": time.time() - start_time})
+        await response.write_eof()
+        return response
+    
+    app["em_curso"] += 1
+    try:
+        # Pedidos idênticos em curso recebem os eventos do mesmo streaming
+        async for evento in aprocess_query_stream_shared(query, app["qa_chain"], app["semaforo"]):
+            if evento["tipo"] == "fim":
+                resultado = {"resposta": evento["resposta"], "documentos": evento["documentos"],
+                             "tempo": evento["tempo_total"]}
+                evento = dict(evento)
+                evento.pop("documentos")
+            elif evento["tipo"] == "documentos":
+                evento = {"tipo": "documentos", "documentos": serialize_documents(evento["documentos"])}
+            await send(evento)
+    except (ConnectionResetError, asyncio.CancelledError):
+        logger.info("Cliente desligou-se durante o streaming")
+        raise
+    except Exception as e:
+        logger.error(f"Erro ao processar consulta em streaming: {str(e)}")
+        await send({"tipo": "erro", "mensagem": str(e)})
+    finally:
+        app["em_curso"] -= 1
+    
+    if resultado:
+        await _store_response(app, key, query, resultado, vector)
+    await response.write_eof()
+    return response
+
+async def _on_startup(app: web.Application) -> None:
+    """
+    Carrega o pipeline e aquece os modelos numa thread, sem bloquear o event loop
+    """
+    pipeline = await asyncio.to_thread(load_pipeline)
+    app["qa_chain"] = pipeline["qa_chain"]
+    app["index_version"] = pipeline["index_version"]
+    app["embeddings"] = pipeline["embeddings"]
+    app["aquecimento"] = await asyncio.to_thread(warm_up_and_keep_alive)
+    start_log_summary(METRICS_LOG_INTERVAL)
+
+def create_app(max_concurrency: int = SERVER_MAX_CONCURRENCY) -> web.Application:
+    """
+    Cria a aplicação aiohttp com as rotas do serviço
+    
+    Args:
+        max_concurrency: Número máximo de consultas processadas em simultâneo
+    
+    Returns:
+        Aplicação configurada
+    """
+    app = web.Application()
+    app["semaforo"] = asyncio.Semaphore(max_concurrency)
+    app["em_curso"] = 0
+    app.on_startup.append(_on_startup)
+    app.router.add_get("/health", handle_health)
+    app.router.add_get("/metrics", handle_metrics)
+    app.router.add_post("/query", handle_query)
+    app.router.add_post("/query/stream", handle_query_stream)
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description="Serviço HTTP assíncrono do UROBOT")
+    parser.add_argument("--host", default=SERVER_HOST, help="Endereço de escuta")
+    parser.add_argument("--port", type=int, default=SERVER_PORT, help="Porta de escuta")
+    parser.add_argument("--max-concorrencia", type=int, default=SERVER_MAX_CONCURRENCY,
+                        help="Número máximo de consultas processadas em simultâneo")
+    args = parser.parse_args()
+    
+    web.run_app(create_app(args.max_concorrencia), host=args.host, port=args.port)
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,9 @@ import os
 ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 RESOURCES_DIR = os.path.join(ROOT_DIR, "resources")
 VECTOR_STORE_DIR = os.path.join(ROOT_DIR, "vector_store")
+CACHE_DIR = os.path.join(ROOT_DIR, ".cache")
+NUMPY_INDEX_DIR = os.path.join(ROOT_DIR, "vector_index")
+LEXICAL_INDEX_PATH = os.path.join(ROOT_DIR, "lexical_index", "bm25.json.gz")
 
 # Configurações do PDF
 PDF_PATH = os.path.join(RESOURCES_DIR, "ESTG_Regulamento-Frequencia-Avaliacao2023.pdf")
@@ -18,8 +21,17 @@ PDF_PATH = os.path.join(RESOURCES_DIR, "ESTG_Regulamento-Frequencia-Avaliacao202
 # Configurações de processamento de documentos
 CHUNK_SIZE = 800
 CHUNK_OVERLAP = 80
+CHUNKING_MODE = "structure"      # "structure" (chunks alinhados com as cláusulas numeradas) ou "recursive" (CHUNK_SIZE caracteres)
+STRUCTURE_MAX_CHUNK_SIZE = 1200  # Tamanho máximo de um chunk no modo "structure"
+INGESTION_MAX_WORKERS = None  # Processos usados na leitura e divisão dos PDFs (None usa todos os núcleos)
+PDF_PAGES_PER_TASK = 16       # Páginas por tarefa; PDFs maiores são lidos por vários processos
+
+# Configurações da geração de embeddings na indexação
+EMBEDDING_BATCH_SIZE = 32   # Número de chunks por pedido ao endpoint de embeddings
+EMBEDDING_MAX_WORKERS = 4   # Número máximo de pedidos de embeddings em simultâneo
 
 # Configurações do modelo Ollama
+OLLAMA_BASE_URL = os.environ.get("OLLAMA_BASE_URL", "http://localhost:11434")  # Endereço do servidor Ollama
 OLLAMA_MODEL = "llama3"
 OLLAMA_EMBEDDINGS_MODEL = "nomic-embed-text"
 OLLAMA_TEMPERATURE = 0.1
@@ -27,10 +39,86 @@ OLLAMA_TOP_P = 0.9
 OLLAMA_NUM_CTX = 2048
 OLLAMA_NUM_THREAD = 4
 OLLAMA_NUM_GPU = 1
+OLLAMA_KEEP_ALIVE = 1800  # Segundos que o Ollama mantém os modelos em memória após o último pedido (-1 = sempre)
+
+# Configurações das ligações HTTP ao Ollama (partilhadas por todas as sessões do processo)
+OLLAMA_POOL_MAX_CONNECTIONS = 32    # Ligações simultâneas máximas por cliente (LLM, embeddings)
+OLLAMA_POOL_MAX_KEEPALIVE = 16      # Ligações mantidas abertas entre pedidos
+OLLAMA_POOL_KEEPALIVE_EXPIRY = 120  # Segundos que uma ligação inativa se mantém aberta
+
+# Configurações do aquecimento dos modelos
+MODEL_WARMUP = True               # Carregar o llama3 e o nomic-embed-text no arranque
+KEEP_ALIVE_REFRESH_INTERVAL = 300 # Segundos sem uso após os quais um modelo é refrescado (None desativa; < OLLAMA_KEEP_ALIVE / 2)
+COLD_LOAD_THRESHOLD = 0.5         # Segundos de load_duration a partir dos quais um pedido conta como arranque a frio
+
+# Configurações do motor vetorial
+VECTOR_BACKEND = "chroma"  # "chroma" ou "numpy" (índice NumPy em memory-map, ver NUMPY_INDEX_DIR)
+VECTOR_QUANTIZATION = "float32"  # Embeddings do índice NumPy: "float32", "float16" (metade do disco; pesquisa sobre cópia float32 em memória) ou "int8" (um quarto do disco e da memória)
+QUANTIZATION_RESCORE = True      # Guardar também os embeddings em float32 (em disco) e repontuar com eles os melhores candidatos
+QUANTIZATION_RESCORE_FACTOR = 4  # Candidatos repontuados por resultado pedido (k x fator)
+
+# Configurações da divisão do índice por documento
+VECTOR_SHARDING = False  # Uma partição (coleção Chroma ou índice NumPy) por PDF, pesquisadas em paralelo
+SHARD_MAX_WORKERS = 4    # Threads da pesquisa em paralelo nas partições
+SHARD_FILTER = None      # Pré-filtro pelos metadados das partições, ex.: {"file_name": ["Regulamento.pdf"]} (None = todas)
 
 # Configurações do retriever
 RETRIEVER_K = 2  # Número de documentos a recuperar
+RETRIEVER_MODE = "similarity"  # "similarity" (só vetorial), "hybrid" (BM25 + vetorial) ou "mmr" (vetorial com diversidade)
+
+# Configurações da montagem do contexto
+CONTEXT_PACKING = True         # Montar o contexto por orçamento de tokens (False junta os RETRIEVER_K documentos)
+CONTEXT_MAX_CHUNKS = 6         # Candidatos recuperados; o número usado depende das pontuações e do orçamento
+CONTEXT_TOKEN_BUDGET = 1024    # Tokens máximos do contexto (limitado também por OLLAMA_NUM_CTX)
+CONTEXT_ANSWER_RESERVE = 256   # Tokens de OLLAMA_NUM_CTX reservados para a resposta
+CONTEXT_SCORE_GAP = 0.15       # Descarta candidatos com pontuação abaixo de (1 - gap) x a melhor
+CONTEXT_MIN_CHUNKS = 1         # Candidatos mantidos mesmo abaixo do corte de pontuação
+
+# Configurações da pesquisa com diversidade (RETRIEVER_MODE = "mmr")
+MMR_FETCH_K = 20    # Candidatos obtidos antes da seleção por Maximal Marginal Relevance
+MMR_LAMBDA = 0.5    # Peso da relevância face à diversidade (1 = só relevância, 0 = só diversidade)
+
+# Configurações da pesquisa híbrida
+HYBRID_FETCH_K = 10          # Candidatos obtidos de cada pesquisa antes da fusão
+HYBRID_FUSION = "rrf"        # "rrf" (Reciprocal Rank Fusion) ou "weighted"
+HYBRID_VECTOR_WEIGHT = 0.5   # Peso da pesquisa vetorial no modo "weighted"
+RRF_K = 60                   # Constante do Reciprocal Rank Fusion
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Coalescência de consultas
+QUERY_COALESCING = True  # Consultas idênticas (normalizadas) em curso partilham uma única execução
+
+# Configurações do serviço HTTP
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 8000
+SERVER_MAX_CONCURRENCY = 16  # Consultas em processamento em simultâneo (as restantes aguardam)
+
+# Configurações das métricas
+METRICS_PORT = None          # Porta do endpoint /metrics na interface Streamlit e no CLI (None desativa)
+METRICS_HOST = SERVER_HOST   # Endereço de escuta desse endpoint (por omissão, apenas local)
+METRICS_LOG_INTERVAL = 300   # Intervalo, em segundos, entre resumos das métricas no log
+
+# Perguntas de exemplo (barra lateral da aplicação) e lista por omissão das respostas pré-geradas
+EXAMPLE_QUESTIONS = [
+    "Quais são os tipos de avaliação previstos no regulamento?",
+    "Como funciona a época especial de exames?",
+    "Quais são as condições para obter o estatuto de estudante-atleta?",
+    "Qual o prazo para revisão de provas?"
+]
+
+# Configurações do modo em lote do CLI
+BATCH_CONCURRENCY = 4  # Perguntas processadas em simultâneo
 
 # Cache
 CACHE_TTL_VECTORSTORE = 3600  # 1 hora
 CACHE_TTL_RESPONSES = 1800    # 30 minutos
+CACHE_MAX_ENTRIES = 256       # Número máximo de respostas no cache de sessão
+CACHE_MAX_BYTES = 32 * 1024 * 1024  # Memória máxima (estimada) do cache de respostas
+RESPONSE_STORE_PATH = os.path.join(CACHE_DIR, "responses.sqlite")  # Respostas partilhadas entre sessões
+RESPONSE_STORE_TTL = 7 * 24 * 3600  # 7 dias (None para não expirar)
+PRECOMPUTED_ANSWERS_PATH = os.path.join(CACHE_DIR, "precomputed_answers.json")  # Respostas pré-geradas (None desativa)
+SEMANTIC_CACHE_THRESHOLD = 0.92   # Similaridade de cosseno mínima para reutilizar uma resposta
+SEMANTIC_CACHE_MAX_ENTRIES = 512  # Número máximo de respostas no cache semântico
+QUERY_EMBEDDING_CACHE_SIZE = 1024  # Número de embeddings de consultas mantidos em memória
+QUERY_EMBEDDING_CACHE_PATH = os.path.join(CACHE_DIR, "query_embeddings.sqlite")  # None desativa o cache em disco
@@ -6,14 +6,28 @@ Módulo para carregamento e processamento de documentos
 """
 
 import os
+import time
+import hashlib
 import logging
-from typing import List, Optional
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Dict, Any, Tuple
 
+import pypdf
 from langchain_community.document_loaders import PyPDFLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.schema import Document
 
-from src.config.settings import PDF_PATH, CHUNK_SIZE, CHUNK_OVERLAP
+from src.config.settings import (
+    PDF_PATH,
+    RESOURCES_DIR,
+    CHUNK_SIZE,
+    CHUNK_OVERLAP,
+    CHUNKING_MODE,
+    INGESTION_MAX_WORKERS,
+    PDF_PAGES_PER_TASK
+)
+from src.data.structure_splitter import split_by_structure
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -41,32 +55,72 @@ def load_pdf(pdf_path: str = PDF_PATH) -> List[Document]:
 
 def split_documents(documents: List[Document], 
                    chunk_size: int = CHUNK_SIZE, 
-                   chunk_overlap: int = CHUNK_OVERLAP) -> List[Document]:
+                   chunk_overlap: int = CHUNK_OVERLAP,
+                   mode: str = CHUNKING_MODE) -> List[Document]:
     """
     Divide documentos em chunks menores
     
+    No modo "structure" os chunks seguem as cláusulas numeradas do regulamento (ver
+    src/data/structure_splitter.py), até STRUCTURE_MAX_CHUNK_SIZE caracteres; no modo
+    "recursive" têm chunk_size caracteres com chunk_overlap de sobreposição.
+    
     Args:
         documents: Lista de documentos a serem divididos
-        chunk_size: Tamanho de cada chunk
-        chunk_overlap: Sobreposição entre chunks
+        chunk_size: Tamanho de cada chunk (modo "recursive")
+        chunk_overlap: Sobreposição entre chunks (modo "recursive")
+        mode: Modo de divisão ("structure" ou "recursive")
         
     Returns:
         Lista de documentos divididos em chunks
     """
+    if mode == "structure":
+        logger.info("Dividindo documentos em chunks pelas cláusulas numeradas")
+        try:
+            chunks = assign_chunk_ids(split_by_structure(documents))
+            logger.info(f"Documento dividido em {len(chunks)} chunks")
+            return chunks
+        except Exception as e:
+            logger.error(f"Erro ao dividir documentos: {str(e)}")
+            raise
+    
     logger.info(f"Dividindo documentos em chunks (tamanho={chunk_size}, overlap={chunk_overlap})")
     try:
         text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=chunk_size,
             chunk_overlap=chunk_overlap,
-            length_function=len
+            length_function=len,
+            add_start_index=True
         )
-        chunks = text_splitter.split_documents(documents)
+        chunks = assign_chunk_ids(text_splitter.split_documents(documents))
         logger.info(f"Documento dividido em {len(chunks)} chunks")
         return chunks
     except Exception as e:
         logger.error(f"Erro ao dividir documentos: {str(e)}")
         raise
 
+def assign_chunk_ids(chunks: List[Document]) -> List[Document]:
+    """
+    Atribui a cada chunk um identificador determinístico e o hash do seu conteúdo
+    
+    O identificador combina o ficheiro de origem, a página, a posição do chunk na
+    página e o hash do conteúdo, pelo que se mantém estável entre execuções enquanto
+    o texto não mudar. Os valores são guardados nos metadados "chunk_id" e "content_hash".
+    
+    Args:
+        chunks: Lista de chunks a identificar
+        
+    Returns:
+        A mesma lista de chunks, com os metadados preenchidos
+    """
+    for chunk in chunks:
+        content_hash = hashlib.sha256(chunk.page_content.encode("utf-8")).hexdigest()[:16]
+        source = os.path.basename(str(chunk.metadata.get("source", "")))
+        page = chunk.metadata.get("page", 0)
+        offset = chunk.metadata.get("start_index", 0)
+        chunk.metadata["content_hash"] = content_hash
+        chunk.metadata["chunk_id"] = f"{source}:{page}:{offset}:{content_hash}"
+    return chunks
+
 def load_and_split_documents(pdf_path: str = PDF_PATH) -> List[Document]:
     """
     Carrega um PDF e divide em chunks em uma única função
@@ -79,3 +133,181 @@ def load_and_split_documents(pdf_path: str = PDF_PATH) -> List[Document]:
     """
     documents = load_pdf(pdf_path)
     return split_documents(documents)
+
+def discover_pdfs(directory: str = RESOURCES_DIR) -> List[str]:
+    """
+    Encontra todos os PDFs num diretório (incluindo subdiretórios)
+    
+    Args:
+        directory: Diretório a percorrer
+        
+    Returns:
+        Caminhos dos PDFs, por ordem alfabética
+    """
+    pdfs = []
+    for root, _, files in os.walk(directory):
+        pdfs.extend(os.path.join(root, name) for name in files if name.lower().endswith(".pdf"))
+    return sorted(pdfs)
+
+def _pdf_metadata(reader: pypdf.PdfReader, pdf_path: str) -> Dict[str, Any]:
+    """
+    Metadados comuns a todas as páginas de um PDF, com as mesmas chaves do PyPDFLoader
+    
+    Args:
+        reader: Leitor pypdf do ficheiro
+        pdf_path: Caminho do ficheiro
+        
+    Returns:
+        Dicionário de metadados
+    """
+    metadata = {"producer": "PyPDF", "creator": "PyPDF", "creationdate": ""}
+    for key, value in (reader.metadata or {}).items():
+        key = key.lstrip("/").lower()
+        value = value if isinstance(value, (str, int)) else str(value)
+        if key in ("creationdate", "moddate"):
+            try:
+                value = datetime.strptime(value.replace("'", ""), "D:%Y%m%d%H%M%S%z").isoformat("T")
+            except ValueError:
+                pass
+        metadata[key] = value.strip() if isinstance(value, str) else value
+    metadata.update({
+        "source": pdf_path,
+        "file_name": os.path.basename(pdf_path),
+        "total_pages": len(reader.pages)
+    })
+    return metadata
+
+def _load_pdf_pages(pdf_path: str, first_page: int, last_page: int) -> List[Document]:
+    """
+    Extrai o texto de um intervalo de páginas de um PDF (executado num processo do pool)
+    
+    A extração é a mesma do PyPDFLoader (pypdf, modo "plain"), pelo que o texto e os
+    identificadores dos chunks não mudam em relação a load_pdf.
+    
+    Args:
+        pdf_path: Caminho do ficheiro
+        first_page: Primeira página (inclusive, a começar em 0)
+        last_page: Última página (exclusive)
+        
+    Returns:
+        Um documento por página
+    """
+    reader = pypdf.PdfReader(pdf_path)
+    metadata = _pdf_metadata(reader, pdf_path)
+    documents = []
+    for page_number in range(first_page, last_page):
+        text = reader.pages[page_number].extract_text(extraction_mode="plain").strip()
+        documents.append(Document(
+            page_content=text,
+            metadata=dict(metadata, page=page_number, page_label=reader.page_labels[page_number])
+        ))
+    return documents
+
+def _plan_page_ranges(pdf_paths: List[str], pages_per_task: int) -> List[Tuple[str, int, int]]:
+    """
+    Divide os PDFs em tarefas de até pages_per_task páginas
+    
+    Args:
+        pdf_paths: Caminhos dos PDFs
+        pages_per_task: Número máximo de páginas por tarefa
+        
+    Returns:
+        Lista de tarefas (caminho, primeira página, última página exclusive)
+    """
+    tasks = []
+    for pdf_path in pdf_paths:
+        total_pages = len(pypdf.PdfReader(pdf_path).pages)
+        for first_page in range(0, total_pages, pages_per_task):
+            tasks.append((pdf_path, first_page, min(first_page + pages_per_task, total_pages)))
+    return tasks
+
+def load_pdfs(pdf_paths: Optional[List[str]] = None,
+              max_workers: Optional[int] = INGESTION_MAX_WORKERS,
+              pages_per_task: int = PDF_PAGES_PER_TASK) -> List[Document]:
+    """
+    Carrega vários PDFs em paralelo, num pool de processos
+    
+    Cada ficheiro é dividido em intervalos de páginas, pelo que um PDF grande também é
+    processado por vários núcleos. As páginas são devolvidas por ordem de ficheiro e de
+    página, cada uma com os metadados do seu ficheiro ("source", "file_name", "total_pages").
+    
+    Args:
+        pdf_paths: Caminhos dos PDFs (por omissão, todos os PDFs em RESOURCES_DIR)
+        max_workers: Número de processos (None usa todos os núcleos)
+        pages_per_task: Número máximo de páginas por tarefa
+        
+    Returns:
+        Lista de documentos, um por página
+    """
+    pdf_paths = discover_pdfs() if pdf_paths is None else pdf_paths
+    logger.info(f"Carregando {len(pdf_paths)} PDFs")
+    try:
+        start_time = time.time()
+        tasks = _plan_page_ranges(pdf_paths, pages_per_task)
+        if len(tasks) <= 1 or max_workers == 1:
+            results = [_load_pdf_pages(*task) for task in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                results = list(executor.map(_load_pdf_pages, *zip(*tasks)))
+        documents = [document for result in results for document in result]
+        tempo = time.time() - start_time
+        logger.info(f"{len(pdf_paths)} PDFs carregados com {len(documents)} páginas em {tempo:.2f}s "
+                    f"({len(tasks)} tarefas, {len(documents) / tempo if tempo else 0:.1f} páginas/s)")
+        return documents
+    except Exception as e:
+        logger.error(f"Erro ao carregar PDFs: {str(e)}")
+        raise
+
+def split_documents_parallel(documents: List[Document],
+                             chunk_size: int = CHUNK_SIZE,
+                             chunk_overlap: int = CHUNK_OVERLAP,
+                             max_workers: Optional[int] = INGESTION_MAX_WORKERS,
+                             mode: str = CHUNKING_MODE) -> List[Document]:
+    """
+    Divide os documentos em chunks em paralelo, um ficheiro de origem por tarefa
+    
+    O resultado é o mesmo de split_documents (os chunks nunca atravessam ficheiros), juntado
+    num único fluxo de chunks pela ordem dos ficheiros.
+    
+    Args:
+        documents: Páginas a dividir, possivelmente de vários ficheiros
+        chunk_size: Tamanho de cada chunk
+        chunk_overlap: Sobreposição entre chunks
+        max_workers: Número de processos (None usa todos os núcleos)
+        mode: Modo de divisão ("structure" ou "recursive")
+        
+    Returns:
+        Lista de chunks
+    """
+    groups: Dict[str, List[Document]] = {}
+    for document in documents:
+        groups.setdefault(str(document.metadata.get("source", "")), []).append(document)
+    
+    if len(groups) <= 1 or max_workers == 1:
+        return split_documents(documents, chunk_size, chunk_overlap, mode)
+    
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        results = executor.map(split_documents, groups.values(), [chunk_size] * len(groups),
+                               [chunk_overlap] * len(groups), [mode] * len(groups))
+        chunks = [chunk for result in results for chunk in result]
+    logger.info(f"{len(groups)} ficheiros divididos em {len(chunks)} chunks")
+    return chunks
+
+def load_and_split_resources(directory: str = RESOURCES_DIR,
+                             chunk_size: int = CHUNK_SIZE,
+                             chunk_overlap: int = CHUNK_OVERLAP,
+                             max_workers: Optional[int] = INGESTION_MAX_WORKERS) -> List[Document]:
+    """
+    Carrega e divide em chunks todos os PDFs de um diretório, em paralelo
+    
+    Args:
+        directory: Diretório com os PDFs
+        chunk_size: Tamanho de cada chunk
+        chunk_overlap: Sobreposição entre chunks
+        max_workers: Número de processos (None usa todos os núcleos)
+        
+    Returns:
+        Lista de chunks de todos os ficheiros
+    """
+    documents = load_pdfs(discover_pdfs(directory), max_workers)
+    return split_documents_parallel(documents, chunk_size, chunk_overlap, max_workers)
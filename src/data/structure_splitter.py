@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Divisão dos documentos alinhada com a estrutura numerada do regulamento
+
+O texto extraído pelo pypdf é percorrido linha a linha. As linhas que começam por uma
+numeração de secção ("2.6.2.") abrem uma nova cláusula, as alíneas ("a)") marcam os
+pontos onde uma cláusula demasiado longa pode ser cortada (depois delas, as linhas e,
+numa linha mais longa do que o tamanho máximo, os espaços) e os cabeçalhos e rodapés
+repetidos em todas as páginas são ignorados, pelo que uma cláusula que continua na
+página seguinte fica num só chunk. Cláusulas curtas da mesma secção são juntadas até
+ao tamanho máximo. Cada chunk guarda nos metadados a secção ("section") e o caminho
+de secções ("section_path", por exemplo "2. FREQUÊNCIA > 2.6. Faltas > 2.6.2").
+"""
+
+import re
+import logging
+from typing import List, Dict, Optional, Tuple
+
+from langchain.schema import Document
+
+from src.config.settings import STRUCTURE_MAX_CHUNK_SIZE
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Numeração de secção no início da linha: "3. TÍTULO", "2.6. Faltas", "2.6.2. Texto", "2.9 Texto"
+SECTION_PATTERN = re.compile(r"^(\d{1,3}(?:\.\d{1,3})*)(\.?)(?:\s+(\S.*))?$")
+# Alínea no início da linha: "a) ..."
+ITEM_PATTERN = re.compile(r"^[a-z]\)\s")
+# Linha de índice com pontos de preenchimento: "5. DISPOSIÇÕES FINAIS ........ 22"
+TOC_PATTERN = re.compile(r"\.{4,}\s*\d+$")
+# Linhas numeradas até este comprimento são títulos de secção
+TITLE_MAX_LENGTH = 60
+# Linhas não vazias no início e no fim de cada página onde se procuram cabeçalhos e rodapés
+EDGE_LINES = 3
+
+DIGITS_PATTERN = re.compile(r"\d+")
+SPACES_PATTERN = re.compile(r"\s+")
+
+# Linha de uma página: (índice da página, índice da linha, início, fim, texto)
+Line = Tuple[int, int, int, int, str]
+
+class _Unit:
+    """
+    Cláusula numerada (ou texto antes da primeira numeração) com as suas linhas
+    """
+    
+    def __init__(self, number: Tuple[int, ...] = (), path: str = ""):
+        self.number = number
+        self.path = path
+        self.lines: List[Line] = []
+        self.item_starts: List[int] = []
+    
+    @property
+    def label(self) -> str:
+        return ".".join(str(part) for part in self.number)
+
+class _Segment:
+    """
+    Linhas de um chunk, com as cláusulas que contém
+    """
+    
+    def __init__(self, unit: _Unit, lines: List[Line], starts_unit: bool, ends_unit: bool):
+        self.units = [unit]
+        self.lines = list(lines)
+        self.starts_unit = starts_unit
+        self.ends_unit = ends_unit
+    
+    def size(self) -> int:
+        return _size(self.lines)
+
+def _size(lines: List[Line]) -> int:
+    """
+    Número de caracteres das linhas, incluindo as quebras de linha
+    """
+    return sum(end - start + 1 for _, _, start, end, _ in lines)
+
+def _normalize_line(text: str) -> str:
+    """
+    Forma de comparação de uma linha: sem números, espaços colapsados e em minúsculas
+    """
+    return SPACES_PATTERN.sub(" ", DIGITS_PATTERN.sub("#", text)).strip().lower()
+
+def _page_lines(document: Document) -> List[Tuple[int, int, str]]:
+    """
+    Divide o texto de uma página em linhas, com as suas posições
+    
+    Args:
+        document: Página
+    
+    Returns:
+        Lista de (início, fim, texto) de cada linha no texto da página
+    """
+    lines = []
+    offset = 0
+    for text in document.page_content.split("\n"):
+        lines.append((offset, offset + len(text), text))
+        offset += len(text) + 1
+    return lines
+
+def _edge_indices(lines: List[Tuple[int, int, str]], edge_lines: int = EDGE_LINES) -> List[int]:
+    """
+    Índices das primeiras e das últimas linhas não vazias de uma página
+    """
+    filled = [index for index, (_, _, text) in enumerate(lines) if text.strip()]
+    return sorted(set(filled[:edge_lines] + filled[-edge_lines:]))
+
+def find_running_lines(pages: List[Document], edge_lines: int = EDGE_LINES) -> set:
+    """
+    Encontra os cabeçalhos e rodapés repetidos nas páginas de um documento
+    
+    São as linhas, entre as primeiras e as últimas de cada página, que se repetem (a
+    menos dos números, como "página 3 de 22") em pelo menos metade das páginas.
+    
+    Args:
+        pages: Páginas do documento, por ordem
+        edge_lines: Linhas não vazias consideradas no início e no fim de cada página
+    
+    Returns:
+        Conjunto das linhas repetidas, na forma de _normalize_line
+    """
+    if len(pages) < 3:
+        return set()
+    
+    counts: Dict[str, int] = {}
+    for page in pages:
+        lines = _page_lines(page)
+        for text in {_normalize_line(lines[index][2]) for index in _edge_indices(lines, edge_lines)}:
+            counts[text] = counts.get(text, 0) + 1
+    threshold = max(3, (len(pages) + 1) // 2)
+    return {text for text, count in counts.items() if count >= threshold}
+
+def parse_section_number(text: str) -> Optional[Tuple[Tuple[int, ...], Optional[str]]]:
+    """
+    Reconhece uma numeração de secção no início de uma linha
+    
+    Args:
+        text: Linha sem espaços nas pontas
+    
+    Returns:
+        Tupla (numeração, título ou None), ou None se a linha não começar por uma numeração
+    """
+    if TOC_PATTERN.search(text):
+        return None
+    match = SECTION_PATTERN.match(text)
+    if match is None:
+        return None
+    number, dot, rest = match.groups()
+    # Um número sem ponto ("8 (oito) dias") não é uma secção
+    if "." not in number and not dot:
+        return None
+    title = rest.strip() if rest and len(text) <= TITLE_MAX_LENGTH else None
+    return tuple(int(part) for part in number.split(".")), title
+
+def _follows(current: Tuple[int, ...], candidate: Tuple[int, ...]) -> bool:
+    """
+    Indica se a numeração candidata pode seguir-se à atual (primeira subsecção, secção
+    seguinte ao mesmo nível ou seguinte a um nível acima)
+    
+    Evita tomar por secção um número que começa uma linha a meio de um parágrafo.
+    """
+    if not current or candidate == current + (1,):
+        return True
+    return any(candidate == current[:depth] + (current[depth] + 1,) for depth in range(len(current)))
+
+def _parse_units(pages: List[Document]) -> List[_Unit]:
+    """
+    Divide as páginas de um documento em cláusulas numeradas
+    
+    Args:
+        pages: Páginas do documento, por ordem
+    
+    Returns:
+        Lista de cláusulas, pela ordem do documento
+    """
+    running = find_running_lines(pages)
+    titles: Dict[Tuple[int, ...], Optional[str]] = {}
+    units = [_Unit()]
+    for page_index, page in enumerate(pages):
+        lines = _page_lines(page)
+        skipped = {index for index in _edge_indices(lines) if _normalize_line(lines[index][2]) in running}
+        for line_index, (start, end, text) in enumerate(lines):
+            if line_index in skipped:
+                continue
+            stripped = text.strip()
+            
+            section = parse_section_number(stripped) if stripped else None
+            if section is not None and _follows(units[-1].number, section[0]):
+                number, title = section
+                titles[number] = f"{'.'.join(str(part) for part in number)}. {title}" if title else None
+                path = " > ".join(titles.get(number[:depth]) or ".".join(str(part) for part in number[:depth])
+                                  for depth in range(1, len(number) + 1))
+                units.append(_Unit(number, path))
+            elif ITEM_PATTERN.match(stripped):
+                units[-1].item_starts.append(len(units[-1].lines))
+            units[-1].lines.append((page_index, line_index, start, end, text))
+    return [unit for unit in units if any(line[4].strip() for line in unit.lines)]
+
+def _pack(groups: List[List[Line]], max_size: int) -> List[List[Line]]:
+    """
+    Junta grupos de linhas consecutivos enquanto couberem no tamanho máximo
+    """
+    packed: List[List[Line]] = []
+    for group in groups:
+        if packed and _size(packed[-1]) + _size(group) <= max_size:
+            packed[-1].extend(group)
+        else:
+            packed.append(list(group))
+    return packed
+
+def _split_line(line: Line, max_size: int) -> List[Line]:
+    """
+    Corta uma linha mais longa do que o tamanho máximo em partes, de preferência no
+    último espaço da segunda metade de cada parte (para não separar, por exemplo, "a)"
+    do seu texto); cada parte mantém a página e o índice da linha, com as suas posições
+    """
+    page_index, line_index, start, end, text = line
+    # _size conta também a quebra de linha de cada parte
+    limit = max(1, max_size - 1)
+    pieces: List[Line] = []
+    offset = 0
+    while len(text) - offset > limit:
+        cut = text.rfind(" ", offset + limit // 2 + 1, offset + limit + 1)
+        if cut <= offset:
+            cut = offset + limit
+        pieces.append((page_index, line_index, start + offset, start + cut, text[offset:cut]))
+        offset = cut
+    pieces.append((page_index, line_index, start + offset, end, text[offset:]))
+    return pieces
+
+def _split_unit(unit: _Unit, max_size: int) -> List[List[Line]]:
+    """
+    Divide uma cláusula pelas alíneas (e, se ainda for longa, pelas linhas e pelos
+    espaços das linhas longas) até ao tamanho máximo
+    """
+    if _size(unit.lines) <= max_size:
+        return [unit.lines]
+    
+    bounds = [0] + [index for index in unit.item_starts if index > 0] + [len(unit.lines)]
+    groups: List[List[Line]] = []
+    for first, last in zip(bounds, bounds[1:]):
+        group = unit.lines[first:last]
+        if _size(group) <= max_size:
+            groups.append(group)
+        else:
+            groups.extend(_pack([[piece] for line in group for piece in _split_line(line, max_size)], max_size))
+    return _pack(groups, max_size)
+
+def _related(previous: Tuple[int, ...], following: Tuple[int, ...]) -> bool:
+    """
+    Indica se duas cláusulas consecutivas podem partilhar um chunk (secções irmãs, ou a
+    primeira contém a segunda)
+    """
+    if not previous or not following:
+        return False
+    return previous[:-1] == following[:-1] or following[:len(previous)] == previous
+
+def _segments(units: List[_Unit], max_size: int) -> List[_Segment]:
+    """
+    Divide as cláusulas em segmentos e junta as cláusulas vizinhas que caibam no mesmo chunk
+    """
+    segments: List[_Segment] = []
+    for unit in units:
+        pieces = _split_unit(unit, max_size)
+        for position, lines in enumerate(pieces):
+            segment = _Segment(unit, lines, position == 0, position == len(pieces) - 1)
+            previous = segments[-1] if segments else None
+            if (previous is not None and previous.ends_unit and segment.starts_unit
+                    and _related(previous.units[-1].number, unit.number)
+                    and previous.size() + segment.size() <= max_size):
+                previous.units.append(unit)
+                previous.lines.extend(lines)
+                previous.ends_unit = segment.ends_unit
+            else:
+                segments.append(segment)
+    return segments
+
+def _segment_document(segment: _Segment, pages: List[Document]) -> Optional[Document]:
+    """
+    Cria o chunk de um segmento, com o texto tal como aparece nas páginas
+    
+    As linhas contíguas da mesma página (e as partes seguidas de uma linha cortada por
+    _split_line) são copiadas de uma só vez; os cabeçalhos e
+    rodapés saltados e as mudanças de página dão lugar a uma quebra de linha. O metadado
+    "start_index" é a posição do início do chunk na sua primeira página.
+    """
+    lines = list(segment.lines)
+    while lines and not lines[0][4].strip():
+        lines.pop(0)
+    while lines and not lines[-1][4].strip():
+        lines.pop()
+    if not lines:
+        return None
+    
+    pieces: List[str] = []
+    run_start = 0
+    for index in range(1, len(lines) + 1):
+        if (index == len(lines) or lines[index][0] != lines[index - 1][0]
+                or lines[index][1] - lines[index - 1][1] not in (0, 1)):
+            page_index, _, start, _, _ = lines[run_start]
+            end = lines[index - 1][3]
+            pieces.append(pages[page_index].page_content[start:end])
+            run_start = index
+    
+    first_page, _, start, _, text = lines[0]
+    unit = segment.units[0]
+    metadata = dict(pages[first_page].metadata)
+    metadata.update({
+        "start_index": start + len(text) - len(text.lstrip()),
+        "page_end": pages[lines[-1][0]].metadata.get("page"),
+        "section": unit.label,
+        "section_path": unit.path
+    })
+    return Document(page_content="\n".join(pieces).strip(), metadata=metadata)
+
+def split_by_structure(documents: List[Document], max_size: int = STRUCTURE_MAX_CHUNK_SIZE) -> List[Document]:
+    """
+    Divide as páginas em chunks alinhados com as cláusulas numeradas
+    
+    As páginas são agrupadas por ficheiro de origem ("source"), pela ordem em que aparecem.
+    
+    Args:
+        documents: Páginas carregadas do PDF (PyPDFLoader ou load_pdfs)
+        max_size: Tamanho máximo de um chunk, em caracteres
+    
+    Returns:
+        Lista de chunks, com os metadados "start_index", "page_end", "section" e "section_path"
+    """
+    groups: Dict[str, List[Document]] = {}
+    for document in documents:
+        groups.setdefault(str(document.metadata.get("source", "")), []).append(document)
+    
+    chunks: List[Document] = []
+    for pages in groups.values():
+        for segment in _segments(_parse_units(pages), max_size):
+            chunk = _segment_document(segment, pages)
+            if chunk is not None:
+                chunks.append(chunk)
+    return chunks
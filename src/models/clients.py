@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Configuração das ligações HTTP ao Ollama
+
+Todos os clientes do Ollama do processo (LLM, embeddings, aquecimento) usam um pool de
+ligações keep-alive com os mesmos limites, para que os pedidos reutilizem ligações TCP
+abertas em vez de abrir uma nova por pedido.
+"""
+
+from typing import Dict, Any
+
+import httpx
+from ollama import Client
+
+from src.config.settings import (
+    OLLAMA_BASE_URL,
+    OLLAMA_POOL_MAX_CONNECTIONS,
+    OLLAMA_POOL_MAX_KEEPALIVE,
+    OLLAMA_POOL_KEEPALIVE_EXPIRY
+)
+
+def ollama_client_kwargs() -> Dict[str, Any]:
+    """
+    Argumentos dos clientes HTTP do Ollama (client_kwargs do langchain_ollama)
+    
+    Returns:
+        Dicionário com os limites do pool de ligações
+    """
+    return {
+        "limits": httpx.Limits(
+            max_connections=OLLAMA_POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=OLLAMA_POOL_MAX_KEEPALIVE,
+            keepalive_expiry=OLLAMA_POOL_KEEPALIVE_EXPIRY
+        )
+    }
+
+def create_ollama_client(base_url: str = OLLAMA_BASE_URL) -> Client:
+    """
+    Cria um cliente síncrono do Ollama com o pool de ligações configurado
+    
+    Args:
+        base_url: Endereço do servidor Ollama
+    
+    Returns:
+        Cliente do Ollama
+    """
+    return Client(host=base_url, **ollama_client_kwargs())
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Montagem do contexto do prompt com orçamento de tokens
+
+Em vez de juntar sempre os RETRIEVER_K documentos recuperados, os candidatos são:
+
+1. cortados pela pontuação: candidatos muito abaixo do melhor (CONTEXT_SCORE_GAP) são
+   descartados, pelo que perguntas com um resultado claro usam menos contexto;
+2. escolhidos por ordem de relevância enquanto couberem no orçamento de tokens;
+3. costurados: chunks vizinhos da mesma página são fundidos num só bloco, sem repetir
+   o texto de sobreposição (CHUNK_OVERLAP) entre eles.
+
+Os tokens são estimados localmente, sem pedidos ao Ollama, de forma conservadora
+(ligeiramente acima da contagem real do tokenizador do llama3), para que o prompt
+nunca seja truncado em silêncio por OLLAMA_NUM_CTX.
+"""
+
+import re
+import math
+import logging
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Tuple
+
+from langchain.schema import Document
+
+from src.config.settings import (
+    OLLAMA_NUM_CTX,
+    CONTEXT_TOKEN_BUDGET,
+    CONTEXT_ANSWER_RESERVE,
+    CONTEXT_SCORE_GAP,
+    CONTEXT_MIN_CHUNKS,
+    CONTEXT_MAX_CHUNKS
+)
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Palavras, números, sequências de pontuação e quebras de linha, como na pré-tokenização do llama3
+_TOKEN_PATTERN = re.compile(r"[^\W\d_]+|\d+|[^\w\s]+|\n+")
+CHARS_PER_WORD_TOKEN = 4    # Palavras longas são divididas em vários tokens
+DIGITS_PER_TOKEN = 3        # O llama3 agrupa os números em blocos de até 3 dígitos
+CHARS_PER_SYMBOL_TOKEN = 4  # Sequências de pontuação (ex.: "....." dos índices) partilham tokens
+
+@lru_cache(maxsize=4096)
+def count_tokens(text: str) -> int:
+    """
+    Estima o número de tokens de um texto sem chamar o modelo
+    
+    O resultado fica em cache, porque os mesmos chunks voltam a ser contados em
+    consultas diferentes.
+    
+    Args:
+        text: Texto a contar
+    
+    Returns:
+        Número estimado de tokens
+    """
+    total = 0
+    for match in _TOKEN_PATTERN.finditer(text):
+        piece = match.group()
+        if piece[0].isdigit():
+            total += math.ceil(len(piece) / DIGITS_PER_TOKEN)
+        elif piece[0].isalpha():
+            total += math.ceil(len(piece) / CHARS_PER_WORD_TOKEN)
+        elif piece[0] == "\n":
+            total += 1
+        else:
+            total += math.ceil(len(piece) / CHARS_PER_SYMBOL_TOKEN)
+    return total
+
+def context_budget(prompt_overhead: int, budget: int = CONTEXT_TOKEN_BUDGET,
+                   num_ctx: int = OLLAMA_NUM_CTX, answer_reserve: int = CONTEXT_ANSWER_RESERVE) -> int:
+    """
+    Calcula os tokens disponíveis para o contexto
+    
+    Args:
+        prompt_overhead: Tokens do prompt sem o contexto (instruções e pergunta)
+        budget: Orçamento configurado para o contexto
+        num_ctx: Janela de contexto do modelo
+        answer_reserve: Tokens reservados para a resposta
+    
+    Returns:
+        Orçamento efetivo (nunca negativo)
+    """
+    return max(0, min(budget, num_ctx - answer_reserve - prompt_overhead))
+
+def _position(doc: Document) -> Optional[Tuple[str, Any, int]]:
+    """
+    Posição de um chunk no documento original (ficheiro, página, início), se conhecida
+    """
+    start = doc.metadata.get("start_index")
+    if start is None:
+        return None
+    return str(doc.metadata.get("source", "")), doc.metadata.get("page"), int(start)
+
+def _overlap(previous: Document, following: Document) -> int:
+    """
+    Número de caracteres do início de `following` que repetem o fim de `previous`
+    
+    Args:
+        previous: Chunk anterior
+        following: Chunk seguinte
+    
+    Returns:
+        Caracteres sobrepostos (0 se os chunks não forem vizinhos)
+    """
+    a, b = _position(previous), _position(following)
+    if a is None or b is None or a[:2] != b[:2]:
+        return 0
+    end = a[2] + len(previous.page_content)
+    if b[2] > end or b[2] < a[2]:
+        return 0
+    overlap = min(end - b[2], len(following.page_content))
+    # Confirmar pelo texto: as posições podem não corresponder se o chunk foi alterado
+    if overlap and previous.page_content.endswith(following.page_content[:overlap]):
+        return overlap
+    return 0
+
+def _adjacent(previous: Document, following: Document) -> bool:
+    """
+    Indica se dois chunks da mesma página se tocam ou sobrepõem
+    """
+    a, b = _position(previous), _position(following)
+    if a is None or b is None or a[:2] != b[:2]:
+        return False
+    return a[2] <= b[2] <= a[2] + len(previous.page_content)
+
+def filter_by_score(documents: List[Document], score_gap: float = CONTEXT_SCORE_GAP,
+                    min_chunks: int = CONTEXT_MIN_CHUNKS) -> List[Document]:
+    """
+    Descarta os candidatos cuja pontuação fica demasiado abaixo da melhor
+    
+    A pontuação é lida do metadado "score", que só os retrievers com pontuações de
+    similaridade preenchem; sem pontuações, a lista é devolvida intacta. As pontuações
+    da pesquisa híbrida ("fused_score") dependem da posição nas listas e não são
+    comparáveis com o corte relativo: com RRF, um resultado encontrado por uma só
+    pesquisa vale metade de um encontrado por ambas, pelo que o corte não se aplica.
+    
+    Args:
+        documents: Candidatos por ordem de relevância
+        score_gap: Diferença relativa máxima para a melhor pontuação
+        min_chunks: Candidatos mantidos independentemente da pontuação
+    
+    Returns:
+        Candidatos mantidos, pela mesma ordem
+    """
+    scores = [doc.metadata.get("score") for doc in documents]
+    if not documents or any(score is None for score in scores):
+        return documents
+    best = max(scores)
+    if best <= 0:
+        return documents
+    threshold = best * (1 - score_gap)
+    return [doc for rank, (doc, score) in enumerate(zip(documents, scores))
+            if rank < min_chunks or score >= threshold]
+
+def select_within_budget(documents: List[Document], budget: int,
+                         max_chunks: int = CONTEXT_MAX_CHUNKS,
+                         separator_tokens: int = 1) -> List[Document]:
+    """
+    Escolhe os candidatos, por ordem de relevância, enquanto couberem no orçamento
+    
+    O custo de um chunk vizinho de outro já escolhido exclui o texto sobreposto, que
+    será removido na costura. Um candidato que não caiba é saltado, mas os seguintes
+    (possivelmente mais curtos) ainda são considerados.
+    
+    Args:
+        documents: Candidatos por ordem de relevância
+        budget: Tokens disponíveis
+        max_chunks: Número máximo de chunks escolhidos
+        separator_tokens: Tokens do separador entre blocos
+    
+    Returns:
+        Chunks escolhidos, por ordem de relevância
+    """
+    selected: List[Document] = []
+    seen = set()
+    used = 0
+    for doc in documents:
+        if len(selected) >= max_chunks:
+            break
+        key = doc.metadata.get("chunk_id") or doc.page_content
+        if key in seen:
+            continue
+        text = doc.page_content
+        start = max((_overlap(other, doc) for other in selected), default=0)
+        end = max((_overlap(doc, other) for other in selected), default=0)
+        novel = text[start:len(text) - end] if start + end < len(text) else ""
+        cost = count_tokens(novel) + separator_tokens
+        if used + cost > budget:
+            continue
+        selected.append(doc)
+        seen.add(key)
+        used += cost
+    return selected
+
+def stitch_documents(documents: List[Document]) -> List[Document]:
+    """
+    Funde os chunks vizinhos da mesma página num só bloco, sem repetir a sobreposição
+    
+    Args:
+        documents: Chunks escolhidos, por ordem de relevância
+    
+    Returns:
+        Blocos de texto (um Document por bloco), ordenados pelo chunk mais relevante de cada um
+    """
+    rank = {id(doc): i for i, doc in enumerate(documents)}
+    positioned = sorted((doc for doc in documents if _position(doc) is not None), key=_position)
+    blocks: List[Tuple[int, Document]] = []
+    current: Optional[Document] = None
+    current_rank = 0
+    for doc in positioned:
+        if current is not None and _adjacent(current, doc):
+            overlap = _overlap(current, doc)
+            joiner = "" if overlap else " "
+            current = Document(page_content=current.page_content + joiner + doc.page_content[overlap:],
+                               metadata=current.metadata)
+            current_rank = min(current_rank, rank[id(doc)])
+            continue
+        if current is not None:
+            blocks.append((current_rank, current))
+        current, current_rank = doc, rank[id(doc)]
+    if current is not None:
+        blocks.append((current_rank, current))
+    blocks.extend((rank[id(doc)], doc) for doc in documents if _position(doc) is None)
+    return [doc for _, doc in sorted(blocks, key=lambda block: block[0])]
+
+def pack_context(documents: List[Document], prompt_overhead: int = 0,
+                 budget: int = CONTEXT_TOKEN_BUDGET,
+                 score_gap: float = CONTEXT_SCORE_GAP,
+                 max_chunks: int = CONTEXT_MAX_CHUNKS) -> Dict[str, Any]:
+    """
+    Monta o contexto: corte por pontuação, seleção por orçamento e costura dos vizinhos
+    
+    Args:
+        documents: Candidatos recuperados, por ordem de relevância
+        prompt_overhead: Tokens do prompt sem o contexto
+        budget: Orçamento configurado para o contexto
+        score_gap: Diferença relativa máxima para a melhor pontuação
+        max_chunks: Número máximo de chunks usados
+    
+    Returns:
+        Dicionário com os chunks usados (por ordem de relevância), os blocos a colocar
+        no contexto e o orçamento efetivo
+    """
+    orcamento = context_budget(prompt_overhead, budget)
+    candidatos = filter_by_score(documents, score_gap)
+    usados = select_within_budget(candidatos, orcamento, max_chunks)
+    if len(usados) < len(documents):
+        logger.debug(f"Contexto: {len(usados)} de {len(documents)} candidatos "
+                     f"({len(candidatos)} após o corte por pontuação, orçamento {orcamento} tokens)")
+    return {"documentos": usados, "blocos": stitch_documents(usados), "orcamento": orcamento}
@@ -6,82 +6,907 @@ Módulo para gerenciamento de embeddings e vectorstore
 """
 
 import os
+import time
+import uuid
+import shutil
+import hashlib
 import logging
-from typing import List, Optional
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Optional, Callable, Dict, Any
 
+import numpy as np
+from tqdm import tqdm
 from langchain_ollama import OllamaEmbeddings
 from langchain_community.vectorstores import Chroma
 from langchain.schema import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
 
 from src.config.settings import (
     VECTOR_STORE_DIR, 
+    OLLAMA_BASE_URL,
     OLLAMA_EMBEDDINGS_MODEL,
-    RETRIEVER_K
+    OLLAMA_KEEP_ALIVE,
+    RETRIEVER_K,
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_MAX_WORKERS,
+    QUERY_EMBEDDING_CACHE_SIZE,
+    QUERY_EMBEDDING_CACHE_PATH,
+    VECTOR_BACKEND,
+    VECTOR_QUANTIZATION,
+    QUANTIZATION_RESCORE,
+    QUANTIZATION_RESCORE_FACTOR,
+    VECTOR_SHARDING,
+    SHARD_FILTER,
+    NUMPY_INDEX_DIR,
+    RETRIEVER_MODE,
+    LEXICAL_INDEX_PATH,
+    CHUNK_SIZE,
+    CHUNK_OVERLAP,
+    CHUNKING_MODE,
+    STRUCTURE_MAX_CHUNK_SIZE,
+    CONTEXT_PACKING,
+    CONTEXT_MAX_CHUNKS,
+    MMR_FETCH_K,
+    MMR_LAMBDA
 )
+from src.models.vector_index import NumpyVectorStore, maximal_marginal_relevance
+from src.models.sharding import (
+    ShardedVectorStore,
+    search_with_vectors,
+    group_by_shard,
+    shard_metadata,
+    read_shards,
+    write_shards
+)
+from src.models.lexical_index import HybridRetriever, build_lexical_index
+from src.models.index_manifest import read_manifest, write_manifest, remove_manifest, check_manifest, build_manifest
+from src.data.document_loader import discover_pdfs, load_pdfs, split_documents_parallel
+from src.models.warmup import record_model_use
+from src.models.clients import ollama_client_kwargs
+from src.utils.cache import EmbeddingCache
+from src.utils.metrics import registry, QUERY_EMBEDDING_SECONDS, DOCUMENT_EMBEDDING_SECONDS
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def create_embeddings() -> OllamaEmbeddings:
+# Cache de embeddings de consultas partilhado por todo o processo
+_query_embedding_cache: Optional[EmbeddingCache] = None
+_query_embedding_cache_lock = threading.Lock()
+
+def get_query_embedding_cache() -> EmbeddingCache:
+    """
+    Devolve o cache de embeddings de consultas do processo, criando-o na primeira chamada
+    
+    Returns:
+        Cache de embeddings de consultas
+    """
+    global _query_embedding_cache
+    with _query_embedding_cache_lock:
+        if _query_embedding_cache is None:
+            _query_embedding_cache = EmbeddingCache(
+                max_entries=QUERY_EMBEDDING_CACHE_SIZE,
+                path=QUERY_EMBEDDING_CACHE_PATH
+            )
+            registry.register_cache("embeddings_consultas", _query_embedding_cache)
+        return _query_embedding_cache
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings com cache das consultas à frente de um modelo de embeddings
+    
+    Os embeddings de consultas (embed_query) são guardados por (modelo, texto normalizado);
+    os embeddings de documentos são sempre delegados no modelo.
+    """
+    
+    def __init__(self, embeddings: OllamaEmbeddings, cache: EmbeddingCache):
+        """
+        Inicializa o wrapper
+        
+        Args:
+            embeddings: Modelo de embeddings subjacente
+            cache: Cache de embeddings de consultas
+        """
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model = embeddings.model
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Gera embeddings para documentos (sem cache)
+        
+        Args:
+            texts: Textos dos documentos
+            
+        Returns:
+            Lista de embeddings
+        """
+        record_model_use(self.model)
+        with DOCUMENT_EMBEDDING_SECONDS.time():
+            return self.embeddings.embed_documents(texts)
+    
+    def embed_query(self, text: str) -> List[float]:
+        """
+        Gera o embedding de uma consulta, reutilizando-o do cache quando possível
+        
+        Args:
+            text: Texto da consulta
+            
+        Returns:
+            Embedding da consulta
+        """
+        key = self.cache.make_key(self.model, text)
+        vector = self.cache.get(key)
+        if vector is None:
+            record_model_use(self.model)
+            with QUERY_EMBEDDING_SECONDS.time():
+                vector = self.embeddings.embed_query(text)
+            self.cache.set(key, vector)
+        return vector
+    
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """
+        Gera os embeddings de várias consultas numa única chamada ao modelo
+        
+        Apenas as consultas que não estão no cache são enviadas ao modelo, e os
+        resultados ficam em cache, pelo que as pesquisas seguintes (embed_query)
+        já não voltam a chamar o modelo.
+        
+        Args:
+            texts: Textos das consultas
+        
+        Returns:
+            Lista de embeddings, pela mesma ordem das consultas
+        """
+        keys = [self.cache.make_key(self.model, text) for text in texts]
+        vectors = [self.cache.get(key) for key in keys]
+        
+        missing = {}
+        for position, vector in enumerate(vectors):
+            if vector is None:
+                missing.setdefault(keys[position], []).append(position)
+        
+        if missing:
+            texts_missing = [texts[positions[0]] for positions in missing.values()]
+            record_model_use(self.model)
+            with QUERY_EMBEDDING_SECONDS.time():
+                vectors_missing = self.embeddings.embed_documents(texts_missing)
+            for (key, positions), vector in zip(missing.items(), vectors_missing):
+                self.cache.set(key, vector)
+                for position in positions:
+                    vectors[position] = vector
+        
+        logger.debug(f"Embeddings de {len(texts)} consultas ({len(missing)} geradas, "
+                    f"{len(texts) - sum(len(p) for p in missing.values())} do cache)")
+        return vectors
+    
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Versão assíncrona de embed_documents
+        """
+        record_model_use(self.model)
+        with DOCUMENT_EMBEDDING_SECONDS.time():
+            return await self.embeddings.aembed_documents(texts)
+    
+    async def aembed_query(self, text: str) -> List[float]:
+        """
+        Versão assíncrona de embed_query
+        """
+        key = self.cache.make_key(self.model, text)
+        vector = self.cache.get(key)
+        if vector is None:
+            record_model_use(self.model)
+            with QUERY_EMBEDDING_SECONDS.time():
+                vector = await self.embeddings.aembed_query(text)
+            self.cache.set(key, vector)
+        return vector
+
+def create_embeddings() -> CachedEmbeddings:
     """
-    Cria um objeto de embeddings usando o modelo Ollama
+    Cria um objeto de embeddings usando o modelo Ollama, com cache dos embeddings de consultas
     
     Returns:
-        Objeto OllamaEmbeddings configurado
+        Objeto de embeddings configurado
     """
     logger.info(f"Criando embeddings com o modelo {OLLAMA_EMBEDDINGS_MODEL}")
     try:
-        return OllamaEmbeddings(model=OLLAMA_EMBEDDINGS_MODEL)
+        return CachedEmbeddings(
+            OllamaEmbeddings(model=OLLAMA_EMBEDDINGS_MODEL, base_url=OLLAMA_BASE_URL,
+                             keep_alive=OLLAMA_KEEP_ALIVE, client_kwargs=ollama_client_kwargs()),
+            get_query_embedding_cache()
+        )
     except Exception as e:
         logger.error(f"Erro ao criar embeddings: {str(e)}")
         raise
 
-def create_vectorstore(documents: List[Document], recreate: bool = False) -> Chroma:
+# Embeddings partilhados por todo o processo (e pelo seu pool de ligações ao Ollama)
+_embeddings: Optional[CachedEmbeddings] = None
+_embeddings_lock = threading.Lock()
+
+def get_embeddings() -> CachedEmbeddings:
     """
-    Cria ou carrega um vectorstore a partir de documentos
+    Devolve o objeto de embeddings do processo, criando-o na primeira chamada
+    
+    Returns:
+        Objeto de embeddings partilhado
+    """
+    global _embeddings
+    with _embeddings_lock:
+        if _embeddings is None:
+            _embeddings = create_embeddings()
+        return _embeddings
+
+def embed_documents_in_batches(texts: List[str],
+                               embeddings: Embeddings,
+                               batch_size: int = EMBEDDING_BATCH_SIZE,
+                               max_workers: int = EMBEDDING_MAX_WORKERS,
+                               progress_callback: Optional[Callable[[int, int], None]] = None) -> List[List[float]]:
+    """
+    Gera embeddings para uma lista de textos em lotes, com vários pedidos em paralelo
+    
+    Args:
+        texts: Textos a converter em embeddings
+        embeddings: Objeto de embeddings a utilizar
+        batch_size: Número de textos por pedido ao endpoint de embeddings
+        max_workers: Número máximo de pedidos em simultâneo
+        progress_callback: Função opcional chamada com (textos processados, total)
+        
+    Returns:
+        Lista de embeddings, pela mesma ordem dos textos
+    """
+    if not texts:
+        return []
+    
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+    logger.info(f"Gerando embeddings para {len(texts)} chunks "
+                f"({len(batches)} lotes de até {batch_size}, {max_workers} pedidos em paralelo)")
+    
+    start_time = time.time()
+    results: List[Optional[List[List[float]]]] = [None] * len(batches)
+    processed = 0
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as executor, \
+            tqdm(total=len(texts), desc="Embeddings", unit="chunk") as progress:
+        futures = {
+            executor.submit(embeddings.embed_documents, batch): index
+            for index, batch in enumerate(batches)
+        }
+        for future in as_completed(futures):
+            index = futures[future]
+            results[index] = future.result()
+            processed += len(batches[index])
+            progress.update(len(batches[index]))
+            if progress_callback:
+                progress_callback(processed, len(texts))
+    
+    elapsed = time.time() - start_time
+    logger.info(f"Embeddings gerados em {elapsed:.2f}s ({len(texts) / max(elapsed, 1e-9):.1f} chunks/s)")
+    return [vector for batch_vectors in results for vector in batch_vectors]
+
+def _upsert_embedded_documents(vectorstore: Chroma,
+                               ids: List[str],
+                               vectors: List[List[float]],
+                               documents: List[Document]) -> None:
+    """
+    Insere ou atualiza no Chroma documentos cujos embeddings já foram calculados
+    
+    Args:
+        vectorstore: Vectorstore Chroma de destino
+        ids: Identificadores dos documentos
+        vectors: Embeddings dos documentos
+        documents: Documentos a guardar
+    """
+    # O Chroma limita o número de registos por operação
+    collection = vectorstore._collection
+    max_batch = collection._client.get_max_batch_size()
+    for start in range(0, len(documents), max_batch):
+        end = start + max_batch
+        collection.upsert(
+            ids=ids[start:end],
+            embeddings=vectors[start:end],
+            metadatas=[doc.metadata for doc in documents[start:end]],
+            documents=[doc.page_content for doc in documents[start:end]]
+        )
+
+def _document_ids(documents: List[Document]) -> List[str]:
+    """
+    Obtém os identificadores dos documentos a partir do metadado "chunk_id"
+    
+    Args:
+        documents: Documentos a identificar
+        
+    Returns:
+        Lista de identificadores (UUIDs aleatórios para documentos sem chunk_id)
+    """
+    return [doc.metadata.get("chunk_id") or str(uuid.uuid4()) for doc in documents]
+
+def _unique_documents(documents: List[Document]) -> Dict[str, Document]:
+    """
+    Indexa os documentos pelo seu identificador, descartando duplicados
+    
+    Args:
+        documents: Documentos a indexar
+        
+    Returns:
+        Dicionário ordenado identificador -> documento
+    """
+    unique: Dict[str, Document] = {}
+    for doc_id, doc in zip(_document_ids(documents), documents):
+        unique.setdefault(doc_id, doc)
+    return unique
+
+def add_documents_in_batches(vectorstore: Chroma,
+                             documents: List[Document],
+                             embeddings: Embeddings,
+                             ids: Optional[List[str]] = None,
+                             progress_callback: Optional[Callable[[int, int], None]] = None) -> List[str]:
+    """
+    Gera os embeddings dos documentos em lotes paralelos e adiciona-os ao vectorstore
+    
+    Args:
+        vectorstore: Vectorstore Chroma de destino
+        documents: Documentos a adicionar
+        embeddings: Objeto de embeddings a utilizar
+        ids: Identificadores dos documentos (por omissão, o metadado "chunk_id")
+        progress_callback: Função opcional chamada com (chunks processados, total)
+        
+    Returns:
+        Lista de identificadores dos documentos adicionados
+    """
+    if not documents:
+        return []
+    
+    ids = ids or _document_ids(documents)
+    vectors = embed_documents_in_batches(
+        [doc.page_content for doc in documents], embeddings, progress_callback=progress_callback
+    )
+    _upsert_embedded_documents(vectorstore, ids, vectors, documents)
+    return ids
+
+def reindex_vectorstore(vectorstore: Chroma,
+                        documents: List[Document],
+                        embeddings: Embeddings,
+                        progress_callback: Optional[Callable[[int, int], None]] = None) -> Dict[str, int]:
+    """
+    Sincroniza incrementalmente o vectorstore com a lista atual de chunks
+    
+    Compara os identificadores estáveis dos chunks (metadado "chunk_id") com os que
+    o Chroma já contém: adiciona apenas os chunks novos ou alterados e remove os que
+    deixaram de existir. Chunks novos cujo conteúdo já está indexado com outro
+    identificador (p.ex. porque mudaram de posição) reutilizam o embedding existente.
+    
+    Args:
+        vectorstore: Vectorstore Chroma a atualizar
+        documents: Lista completa e atual de chunks
+        embeddings: Objeto de embeddings a utilizar
+        progress_callback: Função opcional chamada com (chunks processados, total)
+        
+    Returns:
+        Dicionário com o número de chunks adicionados, reutilizados, removidos e inalterados
+    """
+    collection = vectorstore._collection
+    existing = collection.get(include=["documents"])
+    existing_ids = set(existing["ids"])
+    
+    current = _unique_documents(documents)
+    new_ids = [doc_id for doc_id in current if doc_id not in existing_ids]
+    stale_ids = list(existing_ids - set(current))
+    
+    # Reaproveitar embeddings de conteúdo que já está indexado
+    ids_by_content = {
+        hashlib.sha256((text or "").encode("utf-8")).hexdigest()[:16]: doc_id
+        for doc_id, text in zip(existing["ids"], existing["documents"])
+    }
+    reuse = {}
+    for doc_id in new_ids:
+        doc = current[doc_id]
+        content_hash = doc.metadata.get("content_hash") or \
+            hashlib.sha256(doc.page_content.encode("utf-8")).hexdigest()[:16]
+        if content_hash in ids_by_content:
+            reuse[doc_id] = ids_by_content[content_hash]
+    
+    if reuse:
+        source_ids = list(set(reuse.values()))
+        stored = collection.get(ids=source_ids, include=["embeddings"])
+        vectors_by_id = dict(zip(stored["ids"], stored["embeddings"]))
+        reuse_ids = [doc_id for doc_id in reuse if reuse[doc_id] in vectors_by_id]
+        _upsert_embedded_documents(
+            vectorstore,
+            reuse_ids,
+            [list(vectors_by_id[reuse[doc_id]]) for doc_id in reuse_ids],
+            [current[doc_id] for doc_id in reuse_ids]
+        )
+        reused = set(reuse_ids)
+    else:
+        reused = set()
+    
+    to_embed = [doc_id for doc_id in new_ids if doc_id not in reused]
+    add_documents_in_batches(
+        vectorstore, [current[doc_id] for doc_id in to_embed], embeddings,
+        ids=to_embed, progress_callback=progress_callback
+    )
+    
+    max_batch = collection._client.get_max_batch_size()
+    for start in range(0, len(stale_ids), max_batch):
+        collection.delete(ids=stale_ids[start:start + max_batch])
+    
+    summary = {
+        "adicionados": len(to_embed),
+        "reutilizados": len(reused),
+        "removidos": len(stale_ids),
+        "inalterados": len(current) - len(new_ids)
+    }
+    logger.info(f"Vectorstore reindexado: {summary}")
+    return summary
+
+def _chroma_vectorstore(embeddings: Embeddings, collection_name: Optional[str] = None) -> Chroma:
+    """
+    Abre uma coleção do Chroma persistido em VECTOR_STORE_DIR
+    
+    Args:
+        embeddings: Objeto de embeddings
+        collection_name: Nome da coleção (por omissão, a coleção única do índice)
+        
+    Returns:
+        Objeto Chroma vectorstore
+    """
+    kwargs = {"collection_name": collection_name} if collection_name else {}
+    return Chroma(persist_directory=VECTOR_STORE_DIR, embedding_function=embeddings, **kwargs)
+
+def _create_chroma_vectorstore(documents: List[Document], embeddings: Embeddings, recreate: bool,
+                               reindex: bool, progress_callback: Optional[Callable[[int, int], None]],
+                               collection_name: Optional[str] = None) -> Chroma:
+    """
+    Cria, carrega ou atualiza o vectorstore Chroma persistido em VECTOR_STORE_DIR
     
     Args:
         documents: Lista de documentos para criar embeddings
+        embeddings: Objeto de embeddings
         recreate: Se True, recria o vectorstore mesmo se já existir
+        reindex: Se True, atualiza incrementalmente o vectorstore existente
+        progress_callback: Função opcional chamada com (chunks processados, total)
+        collection_name: Coleção a usar (por omissão, a coleção única do índice)
         
     Returns:
         Objeto Chroma vectorstore
     """
+    # Verificar se já existe um vectorstore persistido
+    if collection_name:
+        exists = _chroma_vectorstore(embeddings, collection_name)._collection.count() > 0
+    else:
+        exists = os.path.exists(VECTOR_STORE_DIR) and os.listdir(VECTOR_STORE_DIR)
+    if exists and not recreate:
+        logger.info(f"Carregando vectorstore existente de: {VECTOR_STORE_DIR}")
+        vectorstore = _chroma_vectorstore(embeddings, collection_name)
+        if reindex:
+            reindex_vectorstore(vectorstore, documents, embeddings, progress_callback=progress_callback)
+        return vectorstore
+    
+    if exists:
+        # Remover a coleção anterior para não duplicar os chunks
+        logger.info("Removendo a coleção existente antes de recriar o vectorstore")
+        _chroma_vectorstore(embeddings, collection_name).delete_collection()
+    
+    # Criar novo vectorstore
+    logger.info(f"Criando novo vectorstore em: {VECTOR_STORE_DIR}")
+    vectorstore = _chroma_vectorstore(embeddings, collection_name)
+    unique = _unique_documents(documents)
+    add_documents_in_batches(
+        vectorstore, list(unique.values()), embeddings,
+        ids=list(unique.keys()), progress_callback=progress_callback
+    )
+    vectorstore.persist()
+    logger.info("Vectorstore criado e persistido com sucesso")
+    return vectorstore
+
+def _numpy_vectorstore(embeddings: Embeddings, directory: str = NUMPY_INDEX_DIR) -> NumpyVectorStore:
+    """
+    Abre (ou prepara) um índice NumPy com a quantização configurada
+    
+    Args:
+        embeddings: Objeto de embeddings
+        directory: Diretório do índice
+        
+    Returns:
+        Vectorstore NumPy
+    """
+    return NumpyVectorStore(embeddings, directory, quantization=VECTOR_QUANTIZATION,
+                            rescore=QUANTIZATION_RESCORE, rescore_factor=QUANTIZATION_RESCORE_FACTOR)
+
+def _create_numpy_vectorstore(documents: List[Document], embeddings: Embeddings, recreate: bool,
+                              reindex: bool, progress_callback: Optional[Callable[[int, int], None]],
+                              directory: str = NUMPY_INDEX_DIR) -> NumpyVectorStore:
+    """
+    Cria, carrega ou atualiza um índice NumPy persistido (por omissão, em NUMPY_INDEX_DIR)
+    
+    Args:
+        documents: Lista de documentos para criar embeddings
+        embeddings: Objeto de embeddings
+        recreate: Se True, recria o índice mesmo se já existir
+        reindex: Se True, atualiza incrementalmente o índice existente
+        progress_callback: Função opcional chamada com (chunks processados, total)
+        directory: Diretório do índice
+        
+    Returns:
+        Vectorstore NumPy
+    """
+    def embed_texts(texts: List[str]) -> List[List[float]]:
+        return embed_documents_in_batches(texts, embeddings, progress_callback=progress_callback)
+    
+    exists = NumpyVectorStore.exists(directory)
+    if exists and not recreate:
+        logger.info(f"Carregando índice NumPy existente de: {directory}")
+        vectorstore = _numpy_vectorstore(embeddings, directory)
+        if reindex:
+            vectorstore.reindex(documents, embed_texts)
+            vectorstore.persist()
+        return vectorstore
+    
+    logger.info(f"Criando novo índice NumPy em: {directory}")
+    vectorstore = _numpy_vectorstore(embeddings, directory)
+    vectorstore.delete(vectorstore.get_ids())
+    unique = _unique_documents(documents)
+    vectorstore.add_embeddings(
+        list(unique.keys()),
+        embed_texts([doc.page_content for doc in unique.values()]),
+        list(unique.values())
+    )
+    vectorstore.persist()
+    logger.info("Índice NumPy criado e persistido com sucesso")
+    return vectorstore
+
+def _shard_directory(name: str) -> str:
+    return os.path.join(NUMPY_INDEX_DIR, "shards", name)
+
+def _open_sharded_vectorstore(embeddings: Embeddings, backend: str) -> ShardedVectorStore:
+    """
+    Abre as partições registadas em shards.json no diretório do índice
+    
+    Args:
+        embeddings: Objeto de embeddings
+        backend: Motor vetorial ("chroma" ou "numpy")
+        
+    Returns:
+        Vectorstore dividido por documento
+    """
+    directory = get_index_directory(backend)
+    metadata = read_shards(directory) or {}
+    if backend == "numpy":
+        open_shard = lambda name: _numpy_vectorstore(embeddings, _shard_directory(name))
+    else:
+        open_shard = lambda name: _chroma_vectorstore(embeddings, name)
+    shards = {name: open_shard(name) for name in metadata}
+    logger.info(f"Índice dividido em {len(shards)} partições")
+    return ShardedVectorStore(embeddings, shards, metadata, shard_factory=open_shard, directory=directory)
+
+def _create_sharded_vectorstore(documents: List[Document], embeddings: Embeddings, recreate: bool,
+                                reindex: bool, progress_callback: Optional[Callable[[int, int], None]],
+                                backend: str) -> ShardedVectorStore:
+    """
+    Cria, carrega ou atualiza o índice dividido por documento: uma partição por PDF
+    
+    Cada partição é criada ou atualizada como um índice independente (a coleção do
+    Chroma ou o diretório NumPy com o nome da partição), pelo que acrescentar um PDF
+    só gera embeddings para esse PDF. As partições de PDFs que deixaram de existir
+    são removidas.
+    
+    Args:
+        documents: Lista de documentos para criar embeddings
+        embeddings: Objeto de embeddings
+        recreate: Se True, recria as partições mesmo se já existirem
+        reindex: Se True, atualiza incrementalmente as partições existentes
+        progress_callback: Função opcional chamada com (chunks processados, total),
+            partição a partição
+        backend: Motor vetorial ("chroma" ou "numpy")
+        
+    Returns:
+        Vectorstore dividido por documento
+    """
+    directory = get_index_directory(backend)
+    groups = group_by_shard(documents)
+    previous = read_shards(directory) or {}
+    
+    for name, shard_documents in groups.items():
+        logger.info(f"Partição {name}: {len(shard_documents)} chunks")
+        if backend == "numpy":
+            _create_numpy_vectorstore(shard_documents, embeddings, recreate, reindex, progress_callback,
+                                      directory=_shard_directory(name))
+        else:
+            _create_chroma_vectorstore(shard_documents, embeddings, recreate, reindex, progress_callback,
+                                       collection_name=name)
+    
+    for name in set(previous) - set(groups):
+        logger.info(f"Removendo a partição {name} (o PDF deixou de existir)")
+        if backend == "numpy":
+            shutil.rmtree(_shard_directory(name), ignore_errors=True)
+        else:
+            _chroma_vectorstore(embeddings, name).delete_collection()
+    
+    write_shards(directory, {name: shard_metadata(shard_documents) for name, shard_documents in groups.items()})
+    return _open_sharded_vectorstore(embeddings, backend)
+
+def create_vectorstore(documents: List[Document], recreate: bool = False,
+                       progress_callback: Optional[Callable[[int, int], None]] = None,
+                       reindex: bool = False,
+                       backend: str = VECTOR_BACKEND,
+                       sharding: bool = VECTOR_SHARDING,
+                       lexical: bool = RETRIEVER_MODE == "hybrid") -> VectorStore:
+    """
+    Cria ou carrega um vectorstore a partir de documentos
+    
+    Args:
+        documents: Lista de documentos para criar embeddings
+        recreate: Se True, recria o vectorstore mesmo se já existir
+        progress_callback: Função opcional chamada com (chunks processados, total)
+            durante a geração de embeddings
+        reindex: Se True e o vectorstore já existir, atualiza-o incrementalmente,
+            gerando embeddings apenas para os chunks novos ou alterados
+        backend: Motor vetorial a usar ("chroma" ou "numpy")
+        sharding: Se True, divide o índice numa partição por PDF
+        lexical: Se True, constrói também o índice lexical BM25 da pesquisa híbrida
+            (por omissão, só com RETRIEVER_MODE = "hybrid")
+        
+    Returns:
+        Vectorstore configurado
+    """
     try:
-        embeddings = create_embeddings()
-        
-        # Verificar se já existe um vectorstore persistido
-        if os.path.exists(VECTOR_STORE_DIR) and os.listdir(VECTOR_STORE_DIR) and not recreate:
-            logger.info(f"Carregando vectorstore existente de: {VECTOR_STORE_DIR}")
-            return Chroma(persist_directory=VECTOR_STORE_DIR, embedding_function=embeddings)
-        
-        # Criar novo vectorstore
-        logger.info(f"Criando novo vectorstore em: {VECTOR_STORE_DIR}")
-        vectorstore = Chroma.from_documents(
-            documents, 
-            embedding=embeddings, 
-            persist_directory=VECTOR_STORE_DIR
-        )
-        vectorstore.persist()
-        logger.info("Vectorstore criado e persistido com sucesso")
+        embeddings = get_embeddings()
+        
+        if backend == "chroma" and VECTOR_QUANTIZATION != "float32":
+            logger.warning("VECTOR_QUANTIZATION só se aplica ao motor NumPy: o Chroma guarda os embeddings em float32")
+        
+        if backend not in ("numpy", "chroma"):
+            raise ValueError(f"Motor vetorial desconhecido: {backend}")
+        
+        if sharding:
+            vectorstore = _create_sharded_vectorstore(documents, embeddings, recreate, reindex,
+                                                      progress_callback, backend)
+        elif backend == "numpy":
+            vectorstore = _create_numpy_vectorstore(documents, embeddings, recreate, reindex, progress_callback)
+        else:
+            vectorstore = _create_chroma_vectorstore(documents, embeddings, recreate, reindex, progress_callback)
+        
+        # Índice lexical para a pesquisa híbrida, construído a partir dos mesmos chunks
+        if documents and lexical:
+            build_lexical_index(documents)
         return vectorstore
     except Exception as e:
         logger.error(f"Erro ao criar vectorstore: {str(e)}")
         raise
 
-def get_retriever(vectorstore: Chroma):
+def get_index_directory(backend: str = VECTOR_BACKEND) -> str:
+    """
+    Devolve o diretório onde o motor vetorial persiste o índice
+    
+    Args:
+        backend: Motor vetorial ("chroma" ou "numpy")
+        
+    Returns:
+        Caminho do diretório
+    """
+    return NUMPY_INDEX_DIR if backend == "numpy" else VECTOR_STORE_DIR
+
+def open_vectorstore(backend: str = VECTOR_BACKEND, sharding: bool = VECTOR_SHARDING) -> VectorStore:
+    """
+    Abre o vectorstore persistido, sem documentos nem geração de embeddings
+    
+    Args:
+        backend: Motor vetorial ("chroma" ou "numpy")
+        sharding: Se True, abre o índice dividido por documento
+        
+    Returns:
+        Vectorstore persistido
+    """
+    embeddings = get_embeddings()
+    if sharding:
+        return _open_sharded_vectorstore(embeddings, backend)
+    if backend == "numpy":
+        return _numpy_vectorstore(embeddings)
+    return _chroma_vectorstore(embeddings)
+
+def load_or_create_vectorstore(pdf_paths: Optional[List[str]] = None,
+                               chunk_size: int = CHUNK_SIZE,
+                               chunk_overlap: int = CHUNK_OVERLAP,
+                               recreate: bool = False,
+                               reindex: bool = False,
+                               progress_callback: Optional[Callable[[int, int], None]] = None,
+                               status_callback: Optional[Callable[[str], None]] = None,
+                               backend: str = VECTOR_BACKEND,
+                               sharding: bool = VECTOR_SHARDING) -> VectorStore:
+    """
+    Abre o índice diretamente se o manifesto coincidir com os PDFs e parâmetros atuais;
+    caso contrário lê e divide os PDFs e cria ou atualiza o índice
+    
+    Quando o índice existe mas está desatualizado, é atualizado incrementalmente; se o
+    modelo de embeddings ou o motor mudaram, é recriado. O manifesto é regravado no fim.
+    
+    Args:
+        pdf_paths: PDFs a indexar (por omissão, todos os PDFs em RESOURCES_DIR)
+        chunk_size: Tamanho de cada chunk
+        chunk_overlap: Sobreposição entre chunks
+        recreate: Se True, recria o índice mesmo que esteja atualizado
+        reindex: Se True, lê os PDFs e atualiza o índice incrementalmente mesmo que o
+            manifesto coincida
+        progress_callback: Função opcional chamada com (chunks processados, total)
+            durante a geração de embeddings
+        status_callback: Função opcional chamada com mensagens de estado
+        backend: Motor vetorial ("chroma" ou "numpy")
+        sharding: Se True, divide o índice numa partição por PDF
+        
+    Returns:
+        Vectorstore configurado
+    """
+    def status(message: str) -> None:
+        logger.info(message)
+        if status_callback:
+            status_callback(message)
+    
+    try:
+        pdf_paths = discover_pdfs() if pdf_paths is None else pdf_paths
+        directory = get_index_directory(backend)
+        params = {
+            "chunk_size": chunk_size,
+            "chunk_overlap": chunk_overlap,
+            "divisao": CHUNKING_MODE,
+            "modelo_embeddings": OLLAMA_EMBEDDINGS_MODEL,
+            "motor": backend
+        }
+        if CHUNKING_MODE == "structure":
+            params["tamanho_maximo"] = STRUCTURE_MAX_CHUNK_SIZE
+        if backend == "numpy":
+            params["quantizacao"] = VECTOR_QUANTIZATION
+        params["particoes"] = sharding
+        manifest = read_manifest(directory)
+        motivo = check_manifest(manifest, pdf_paths, params)
+        if motivo is None and RETRIEVER_MODE == "hybrid" and not os.path.exists(LEXICAL_INDEX_PATH):
+            motivo = "o índice lexical não existe"
+        
+        if motivo is None and not recreate and not reindex:
+            status(f"Índice atualizado ({manifest['chunks']} chunks): aberto sem ler os PDFs")
+            return open_vectorstore(backend, sharding)
+        
+        if motivo is not None:
+            status(f"Índice desatualizado: {motivo}")
+            reindex = True
+            # Embeddings de outro modelo não são comparáveis: recriar em vez de atualizar
+            if manifest is not None and manifest.get("modelo_embeddings") != OLLAMA_EMBEDDINGS_MODEL:
+                recreate = True
+        
+        documents = load_pdfs(pdf_paths)
+        status(f"{len(pdf_paths)} PDFs carregados com {len(documents)} páginas")
+        chunks = split_documents_parallel(documents, chunk_size, chunk_overlap)
+        status(f"Documentos divididos em {len(chunks)} chunks")
+        
+        remove_manifest(directory)
+        vectorstore = create_vectorstore(chunks, recreate, progress_callback=progress_callback,
+                                         reindex=reindex, backend=backend, sharding=sharding)
+        write_manifest(directory, build_manifest(pdf_paths, params, len(_unique_documents(chunks))))
+        return vectorstore
+    except Exception as e:
+        logger.error(f"Erro ao carregar ou criar o vectorstore: {str(e)}")
+        raise
+
+def get_index_version(vectorstore: VectorStore) -> str:
+    """
+    Calcula uma versão do índice a partir dos identificadores dos chunks indexados
+    
+    A versão muda sempre que um chunk é adicionado, alterado ou removido, o que permite
+    invalidar respostas guardadas que dependem do conteúdo do índice.
+    
+    Args:
+        vectorstore: Vectorstore (Chroma, NumPy ou dividido por documento)
+        
+    Returns:
+        Versão do índice (hash curto)
+    """
+    if isinstance(vectorstore, (NumpyVectorStore, ShardedVectorStore)):
+        ids = sorted(vectorstore.get_ids())
+    else:
+        ids = sorted(vectorstore._collection.get(include=[])["ids"])
+    return hashlib.sha256("\n".join(ids).encode("utf-8")).hexdigest()[:16]
+
+class ScoredVectorRetriever(BaseRetriever):
+    """
+    Retriever vetorial que guarda a pontuação de relevância de cada documento no
+    metadado "score", usado pelo corte por pontuação na montagem do contexto
+    """
+    
+    vectorstore: VectorStore
+    k: int = CONTEXT_MAX_CHUNKS
+    
+    def _get_relevant_documents(self, query: str, *,
+                                run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        """
+        Recupera os k documentos mais semelhantes à consulta
+        
+        Args:
+            query: Consulta
+            run_manager: Gestor de callbacks do LangChain
+        
+        Returns:
+            Lista de documentos (cópias), com a pontuação no metadado "score"
+        """
+        hits = self.vectorstore.similarity_search_with_relevance_scores(query, k=self.k)
+        return [Document(page_content=doc.page_content, metadata=dict(doc.metadata, score=score))
+                for doc, score in hits]
+
+class MMRRetriever(BaseRetriever):
+    """
+    Retriever vetorial com diversidade: dos fetch_k documentos mais semelhantes à
+    consulta escolhe k por Maximal Marginal Relevance, evitando chunks quase repetidos
+    
+    Os candidatos vêm com os embeddings já guardados no índice (ver search_with_vectors)
+    e a seleção é feita numa só passagem vetorizada com NumPy (ver
+    maximal_marginal_relevance). A similaridade de cosseno à consulta fica no metadado
+    "score", usado pela montagem do contexto.
+    """
+    
+    vectorstore: VectorStore
+    k: int = CONTEXT_MAX_CHUNKS
+    fetch_k: int = MMR_FETCH_K
+    lambda_mult: float = MMR_LAMBDA
+    
+    def _get_relevant_documents(self, query: str, *,
+                                run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        """
+        Recupera k documentos relevantes e diversos para a consulta
+        
+        Args:
+            query: Consulta
+            run_manager: Gestor de callbacks do LangChain
+        
+        Returns:
+            Lista de documentos (cópias), por ordem de escolha, com a pontuação no metadado "score"
+        """
+        embedding = self.vectorstore.embeddings.embed_query(query)
+        hits = search_with_vectors(self.vectorstore, embedding, max(self.k, self.fetch_k))
+        if not hits:
+            return []
+        selected, scores = maximal_marginal_relevance(embedding, np.stack([vector for _, _, vector in hits]),
+                                                      self.k, self.lambda_mult)
+        return [Document(page_content=hits[i][0].page_content, metadata=dict(hits[i][0].metadata, score=float(score)))
+                for i, score in zip(selected, scores)]
+
+def get_retriever(vectorstore: VectorStore, mode: str = RETRIEVER_MODE, packing: bool = CONTEXT_PACKING,
+                  shard_filter: Optional[Dict[str, Any]] = SHARD_FILTER):
     """
     Configura um retriever a partir do vectorstore
     
+    Com packing, são recuperados CONTEXT_MAX_CHUNKS candidatos com pontuação, e a
+    montagem do contexto decide quantos usar; sem packing, são usados RETRIEVER_K.
+    
     Args:
-        vectorstore: Objeto Chroma vectorstore
+        vectorstore: Vectorstore (Chroma ou NumPy)
+        mode: "similarity" para pesquisa vetorial, "hybrid" para combinar
+            a pesquisa vetorial com o índice lexical BM25, ou "mmr" para pesquisa
+            vetorial com diversidade (MMR_FETCH_K candidatos, MMR_LAMBDA)
+        packing: Se True, recupera candidatos para a montagem do contexto por orçamento
+        shard_filter: Pré-filtro pelos metadados das partições, num índice dividido por
+            documento (None pesquisa todas)
         
     Returns:
         Retriever configurado
     """
-    logger.info(f"Configurando retriever com k={RETRIEVER_K}")
+    k = CONTEXT_MAX_CHUNKS if packing else RETRIEVER_K
+    logger.info(f"Configurando retriever com k={k} (modo: {mode})")
     try:
+        if shard_filter and isinstance(vectorstore, ShardedVectorStore):
+            vectorstore = vectorstore.routed(shard_filter)
+            logger.info(f"Pesquisa restrita às partições: {', '.join(vectorstore.shards) or 'nenhuma'}")
+        if mode == "hybrid":
+            if not os.path.exists(LEXICAL_INDEX_PATH):
+                logger.warning(f"Índice lexical inexistente ({LEXICAL_INDEX_PATH}): a pesquisa híbrida usa só a "
+                               f"pesquisa vetorial até o índice ser reconstruído com RETRIEVER_MODE = \"hybrid\"")
+            return HybridRetriever(vectorstore=vectorstore, k=k,
+                                   document_filter=shard_filter if isinstance(vectorstore, ShardedVectorStore) else None)
+        if mode == "mmr":
+            return MMRRetriever(vectorstore=vectorstore, k=k)
+        if packing:
+            return ScoredVectorRetriever(vectorstore=vectorstore, k=k)
         return vectorstore.as_retriever(
             search_type="similarity",
             search_kwargs={"k": RETRIEVER_K}
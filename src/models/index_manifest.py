@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Manifesto do índice: descreve os PDFs e parâmetros com que o índice foi construído
+
+O manifesto (manifest.json no diretório do índice) guarda o tamanho, a data de
+modificação e o SHA-256 de cada PDF, os parâmetros de divisão e o modelo de embeddings.
+No arranque, se o manifesto coincidir com o estado atual, o índice pode ser aberto
+diretamente, sem ler nem dividir os PDFs.
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+from typing import Dict, Any, List, Optional
+
+from src.config.settings import ROOT_DIR
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = "manifest.json"
+MANIFEST_VERSION = 1
+
+def file_sha256(path: str, block_size: int = 1024 * 1024) -> str:
+    """
+    Calcula o SHA-256 de um ficheiro, por blocos
+    
+    Args:
+        path: Caminho do ficheiro
+        block_size: Tamanho de cada bloco lido
+    
+    Returns:
+        Hash em hexadecimal
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _relative_path(path: str) -> str:
+    return os.path.relpath(os.path.abspath(path), ROOT_DIR)
+
+def build_manifest(pdf_paths: List[str], params: Dict[str, Any], chunks: int) -> Dict[str, Any]:
+    """
+    Constrói o manifesto de um índice acabado de criar ou atualizar
+    
+    Args:
+        pdf_paths: PDFs indexados
+        params: Parâmetros do índice (divisão, modelo de embeddings, motor)
+        chunks: Número de chunks indexados
+    
+    Returns:
+        Dicionário do manifesto
+    """
+    fontes = []
+    for path in pdf_paths:
+        stat = os.stat(path)
+        fontes.append({
+            "caminho": _relative_path(path),
+            "tamanho": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": file_sha256(path)
+        })
+    return dict(params, versao=MANIFEST_VERSION, fontes=fontes, chunks=chunks, criado_em=time.time())
+
+def read_manifest(directory: str) -> Optional[Dict[str, Any]]:
+    """
+    Lê o manifesto de um diretório de índice
+    
+    Args:
+        directory: Diretório do índice
+    
+    Returns:
+        Manifesto, ou None se não existir ou estiver corrompido
+    """
+    path = os.path.join(directory, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Manifesto do índice ilegível ({path}): {str(e)}")
+        return None
+
+def write_manifest(directory: str, manifest: Dict[str, Any]) -> None:
+    """
+    Grava o manifesto de forma atómica
+    
+    Args:
+        directory: Diretório do índice
+        manifest: Manifesto a gravar
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, MANIFEST_FILE)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+    logger.info(f"Manifesto do índice gravado em: {path}")
+
+def remove_manifest(directory: str) -> None:
+    """
+    Remove o manifesto antes de modificar o índice, para que uma atualização
+    interrompida nunca deixe um índice incompleto marcado como atualizado
+    
+    Args:
+        directory: Diretório do índice
+    """
+    path = os.path.join(directory, MANIFEST_FILE)
+    if os.path.exists(path):
+        os.remove(path)
+
+def check_manifest(manifest: Optional[Dict[str, Any]], pdf_paths: List[str],
+                   params: Dict[str, Any]) -> Optional[str]:
+    """
+    Verifica se um manifesto corresponde aos PDFs e parâmetros atuais
+    
+    Ficheiros com o mesmo tamanho e data de modificação são considerados iguais sem
+    voltar a calcular o hash; se só a data mudou, o hash decide.
+    
+    Args:
+        manifest: Manifesto lido do índice (ou None)
+        pdf_paths: PDFs que seriam indexados agora
+        params: Parâmetros atuais do índice
+    
+    Returns:
+        None se o manifesto coincidir, ou o motivo da diferença
+    """
+    if manifest is None:
+        return "o índice não tem manifesto"
+    if manifest.get("versao") != MANIFEST_VERSION:
+        return "versão do manifesto diferente"
+    for key, value in params.items():
+        if manifest.get(key) != value:
+            return f"{key} mudou ({manifest.get(key)} -> {value})"
+    
+    recorded = {fonte["caminho"]: fonte for fonte in manifest.get("fontes", [])}
+    current = {_relative_path(path): path for path in pdf_paths}
+    if set(recorded) != set(current):
+        return "a lista de PDFs mudou"
+    
+    for relative, path in current.items():
+        fonte = recorded[relative]
+        stat = os.stat(path)
+        if stat.st_size != fonte["tamanho"]:
+            return f"{relative} mudou"
+        if stat.st_mtime_ns != fonte["mtime_ns"] and file_sha256(path) != fonte["sha256"]:
+            return f"{relative} mudou"
+    return None
@@ -0,0 +1,432 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Índice lexical BM25 e retriever híbrido (BM25 + pesquisa vetorial)
+"""
+
+import os
+import re
+import gzip
+import json
+import math
+import hashlib
+import logging
+import threading
+import unicodedata
+from collections import Counter
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+from langchain.schema import Document
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
+
+from src.config.settings import (
+    LEXICAL_INDEX_PATH,
+    BM25_K1,
+    BM25_B,
+    RETRIEVER_K,
+    HYBRID_FETCH_K,
+    HYBRID_FUSION,
+    HYBRID_VECTOR_WEIGHT,
+    RRF_K
+)
+from src.models.sharding import matches_filter, shard_name
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+def _fold_accents(text: str) -> str:
+    """
+    Remove os acentos de um texto ("época" -> "epoca")
+    
+    Args:
+        text: Texto original
+    
+    Returns:
+        Texto sem acentos
+    """
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+# Palavras funcionais do português que não ajudam a distinguir chunks
+STOPWORDS = {_fold_accents(word) for word in """
+a ao aos as à às com como da das de do dos e é em entre essa esse esta este isso isto já
+la lhe lo mais mas me mesmo na nas nem no nos não o os ou para pela pelas pelo pelos por
+qual quais quando que quem se sem ser seu seus sua suas só também te tem ter um uma
+umas uns foi são será serão há pode podem deve devem cada sobre após até
+""".split()}
+
+# Números de artigos/alíneas ("2.6.3"), palavras com hífen ("estudante-atleta") e palavras simples
+TOKEN_PATTERN = re.compile(r"\d+(?:\.\d+)+|\w+(?:-\w+)+|\w+", re.UNICODE)
+
+def _stem(token: str) -> str:
+    """
+    Reduz plurais comuns do português à forma singular (stemming leve)
+    
+    Args:
+        token: Palavra sem acentos, em minúsculas
+    
+    Returns:
+        Palavra reduzida
+    """
+    if len(token) <= 3 or token[0].isdigit():
+        return token
+    for suffix, replacement in (("oes", "ao"), ("aes", "ao"), ("ais", "al"), ("eis", "el"),
+                                ("ns", "m"), ("res", "r"), ("zes", "z"), ("s", "")):
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            return token[:-len(suffix)] + replacement
+    return token
+
+def tokenize(text: str) -> List[str]:
+    """
+    Divide um texto em termos para o índice lexical
+    
+    Mantém números de artigos ("2.6.3") e palavras compostas ("estudante-atleta")
+    como termos únicos (acrescentando também as partes das palavras compostas),
+    remove acentos e palavras funcionais e reduz plurais.
+    
+    Args:
+        text: Texto a dividir
+    
+    Returns:
+        Lista de termos
+    """
+    terms = []
+    for token in TOKEN_PATTERN.findall(_fold_accents(text.lower())):
+        token = token.strip(".")
+        if not token or token in STOPWORDS:
+            continue
+        if "-" in token:
+            parts = [_stem(part) for part in token.split("-") if part and part not in STOPWORDS]
+            terms.append("-".join(parts))
+            terms.extend(parts)
+        else:
+            terms.append(_stem(token))
+    return terms
+
+def documents_fingerprint(documents: List[Document]) -> str:
+    """
+    Calcula uma impressão digital da lista de chunks a partir dos seus identificadores
+    
+    Args:
+        documents: Chunks indexados
+    
+    Returns:
+        Hash curto dos identificadores
+    """
+    ids = sorted(doc.metadata.get("chunk_id") or doc.page_content for doc in documents)
+    return hashlib.sha256("\n".join(ids).encode("utf-8")).hexdigest()[:16]
+
+class BM25Index:
+    """
+    Índice invertido BM25 sobre os chunks do documento
+    
+    As listas de ocorrências são guardadas como pares de arrays NumPy (posições, frequências),
+    pelo que a pontuação de uma consulta é uma soma vetorizada por termo.
+    """
+    
+    def __init__(self, ids: List[str], texts: List[str], metadatas: List[Dict[str, Any]],
+                 postings: Dict[str, Tuple[List[int], List[int]]], lengths: List[int],
+                 fingerprint: str = "", k1: float = BM25_K1, b: float = BM25_B):
+        """
+        Inicializa o índice
+        
+        Args:
+            ids: Identificadores dos chunks
+            texts: Textos dos chunks
+            metadatas: Metadados dos chunks
+            postings: Para cada termo, (posições dos chunks, frequências do termo)
+            lengths: Número de termos de cada chunk
+            fingerprint: Impressão digital dos chunks indexados
+            k1: Parâmetro de saturação da frequência do BM25
+            b: Parâmetro de normalização do comprimento do BM25
+        """
+        self.ids = ids
+        self.texts = texts
+        self.metadatas = metadatas
+        self.fingerprint = fingerprint
+        self.k1 = k1
+        self.b = b
+        self.lengths = np.asarray(lengths, dtype=np.float32)
+        self.avg_length = float(self.lengths.mean()) if len(lengths) else 0.0
+        self.postings = {
+            term: (np.asarray(positions, dtype=np.int32), np.asarray(freqs, dtype=np.float32))
+            for term, (positions, freqs) in postings.items()
+        }
+        count = len(ids)
+        self.idf = {
+            term: math.log(1 + (count - len(positions) + 0.5) / (len(positions) + 0.5))
+            for term, (positions, _) in self.postings.items()
+        }
+    
+    @classmethod
+    def build(cls, documents: List[Document]) -> "BM25Index":
+        """
+        Constrói o índice a partir dos chunks produzidos por split_documents
+        
+        Args:
+            documents: Chunks a indexar
+        
+        Returns:
+            Índice construído
+        """
+        postings: Dict[str, Tuple[List[int], List[int]]] = {}
+        lengths = []
+        for position, doc in enumerate(documents):
+            terms = tokenize(doc.page_content)
+            lengths.append(len(terms))
+            for term, freq in Counter(terms).items():
+                entry = postings.setdefault(term, ([], []))
+                entry[0].append(position)
+                entry[1].append(freq)
+        
+        return cls(
+            ids=[doc.metadata.get("chunk_id") or str(i) for i, doc in enumerate(documents)],
+            texts=[doc.page_content for doc in documents],
+            metadatas=[dict(doc.metadata) for doc in documents],
+            postings=postings,
+            lengths=lengths,
+            fingerprint=documents_fingerprint(documents)
+        )
+    
+    def save(self, path: str) -> None:
+        """
+        Grava o índice num ficheiro JSON comprimido
+        
+        Args:
+            path: Caminho do ficheiro
+        """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = {
+            "fingerprint": self.fingerprint,
+            "ids": self.ids,
+            "texts": self.texts,
+            "metadatas": self.metadatas,
+            "lengths": self.lengths.astype(int).tolist(),
+            "postings": {term: [positions.tolist(), freqs.astype(int).tolist()]
+                         for term, (positions, freqs) in self.postings.items()}
+        }
+        with gzip.open(path + ".tmp", "wt", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(path + ".tmp", path)
+        logger.info(f"Índice lexical gravado em {path} ({len(self.ids)} chunks, {len(self.postings)} termos)")
+    
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        """
+        Carrega um índice gravado com save
+        
+        Args:
+            path: Caminho do ficheiro
+        
+        Returns:
+            Índice carregado
+        """
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(
+            ids=data["ids"],
+            texts=data["texts"],
+            metadatas=data["metadatas"],
+            postings={term: (entry[0], entry[1]) for term, entry in data["postings"].items()},
+            lengths=data["lengths"],
+            fingerprint=data.get("fingerprint", "")
+        )
+    
+    def search(self, query: str, k: int = RETRIEVER_K,
+               filter: Optional[Dict[str, Any]] = None) -> List[Tuple[Document, float]]:
+        """
+        Pesquisa os chunks com maior pontuação BM25 para a consulta
+        
+        Args:
+            query: Consulta
+            k: Número de resultados
+            filter: Pré-filtro pelos metadados dos chunks, com as mesmas regras do
+                pré-filtro das partições (ver matches_filter)
+        
+        Returns:
+            Lista de tuplas (documento, pontuação BM25), por ordem decrescente
+        """
+        if not self.ids:
+            return []
+        
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        norm = self.k1 * (1 - self.b + self.b * self.lengths / max(self.avg_length, 1e-9))
+        for term in set(tokenize(query)):
+            entry = self.postings.get(term)
+            if entry is None:
+                continue
+            positions, freqs = entry
+            scores[positions] += self.idf[term] * freqs * (self.k1 + 1) / (freqs + norm[positions])
+        
+        matched = np.flatnonzero(scores > 0)
+        if filter:
+            matched = np.asarray([i for i in matched if matches_filter(self._filter_metadata(int(i)), filter)],
+                                 dtype=np.int64)
+        if not len(matched):
+            return []
+        best = matched[np.argsort(-scores[matched])[:k]]
+        return [(self.document(int(i)), float(scores[i])) for i in best]
+    
+    def _filter_metadata(self, position: int) -> Dict[str, Any]:
+        metadata = self.metadatas[position]
+        return dict(metadata, shard=shard_name(str(metadata.get("source", ""))))
+    
+    def document(self, position: int) -> Document:
+        """
+        Constrói o documento guardado numa posição do índice
+        
+        Args:
+            position: Posição no índice
+        
+        Returns:
+            Documento correspondente
+        """
+        return Document(page_content=self.texts[position], metadata=dict(self.metadatas[position]))
+
+# Índices lexicais carregados de forma preguiçosa (só na primeira pesquisa híbrida), por caminho
+_lexical_indexes: Dict[str, BM25Index] = {}
+_lexical_index_lock = threading.Lock()
+
+def build_lexical_index(documents: List[Document], path: str = LEXICAL_INDEX_PATH) -> BM25Index:
+    """
+    Constrói e grava o índice lexical, a menos que o índice gravado já corresponda aos chunks
+    
+    Args:
+        documents: Chunks produzidos por split_documents
+        path: Caminho do ficheiro do índice
+    
+    Returns:
+        Índice lexical
+    """
+    key = os.path.abspath(path)
+    fingerprint = documents_fingerprint(documents)
+    with _lexical_index_lock:
+        loaded = _lexical_indexes.get(key)
+        if loaded is not None and loaded.fingerprint == fingerprint:
+            return loaded
+        if os.path.exists(path):
+            stored = BM25Index.load(path)
+            if stored.fingerprint == fingerprint:
+                _lexical_indexes[key] = stored
+                return stored
+        
+        logger.info(f"Construindo índice lexical BM25 para {len(documents)} chunks")
+        index = BM25Index.build(documents)
+        index.save(path)
+        _lexical_indexes[key] = index
+        return index
+
+def get_lexical_index(path: str = LEXICAL_INDEX_PATH) -> Optional[BM25Index]:
+    """
+    Devolve o índice lexical guardado num caminho, carregando-o do disco na primeira
+    chamada para esse caminho
+    
+    Args:
+        path: Caminho do ficheiro do índice
+    
+    Returns:
+        Índice lexical ou None se ainda não tiver sido construído
+    """
+    key = os.path.abspath(path)
+    with _lexical_index_lock:
+        if key not in _lexical_indexes and os.path.exists(path):
+            _lexical_indexes[key] = BM25Index.load(path)
+            logger.info(f"Índice lexical carregado de {path} ({len(_lexical_indexes[key].ids)} chunks)")
+        return _lexical_indexes.get(key)
+
+def _document_key(doc: Document) -> str:
+    """
+    Chave usada para juntar os resultados das duas pesquisas
+    
+    Args:
+        doc: Documento
+    
+    Returns:
+        Identificador do chunk (ou o próprio texto, se não tiver identificador)
+    """
+    return doc.metadata.get("chunk_id") or doc.page_content
+
+def fuse_results(vector_hits: List[Tuple[Document, float]],
+                 lexical_hits: List[Tuple[Document, float]],
+                 k: int,
+                 fusion: str = HYBRID_FUSION,
+                 vector_weight: float = HYBRID_VECTOR_WEIGHT,
+                 rrf_k: int = RRF_K) -> List[Tuple[Document, float]]:
+    """
+    Combina os resultados da pesquisa vetorial e da pesquisa BM25
+    
+    Args:
+        vector_hits: Resultados vetoriais (documento, pontuação), por ordem decrescente
+        lexical_hits: Resultados BM25 (documento, pontuação), por ordem decrescente
+        k: Número de resultados finais
+        fusion: "rrf" (Reciprocal Rank Fusion) ou "weighted" (soma ponderada de pontuações normalizadas)
+        vector_weight: Peso da pesquisa vetorial no modo "weighted"
+        rrf_k: Constante do RRF
+    
+    Returns:
+        Lista de tuplas (documento, pontuação combinada), por ordem decrescente
+    """
+    documents: Dict[str, Document] = {}
+    scores: Dict[str, float] = {}
+    
+    def normalized(hits):
+        if not hits:
+            return []
+        values = [score for _, score in hits]
+        low, high = min(values), max(values)
+        return [(doc, (score - low) / (high - low) if high > low else 1.0) for doc, score in hits]
+    
+    for hits, weight in ((vector_hits, vector_weight), (lexical_hits, 1 - vector_weight)):
+        if fusion == "rrf":
+            contributions = [(doc, 1.0 / (rrf_k + rank)) for rank, (doc, _) in enumerate(hits, 1)]
+        else:
+            contributions = [(doc, weight * score) for doc, score in normalized(hits)]
+        for doc, contribution in contributions:
+            key = _document_key(doc)
+            documents.setdefault(key, doc)
+            scores[key] = scores.get(key, 0.0) + contribution
+    
+    ranked = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [(documents[key], scores[key]) for key in ranked]
+
+class HybridRetriever(BaseRetriever):
+    """
+    Retriever que combina a pesquisa vetorial com o índice lexical BM25
+    """
+    
+    vectorstore: VectorStore
+    k: int = RETRIEVER_K
+    fetch_k: int = HYBRID_FETCH_K
+    fusion: str = HYBRID_FUSION
+    vector_weight: float = HYBRID_VECTOR_WEIGHT
+    lexical_path: str = LEXICAL_INDEX_PATH
+    document_filter: Optional[Dict[str, Any]] = None
+    
+    def _get_relevant_documents(self, query: str, *,
+                                run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        """
+        Recupera os documentos mais relevantes combinando as duas pesquisas
+        
+        Com document_filter, a pesquisa lexical só considera os chunks dos documentos
+        escolhidos pelo pré-filtro (a vetorial já vem restrita às partições).
+        
+        Args:
+            query: Consulta
+            run_manager: Gestor de callbacks do LangChain
+        
+        Returns:
+            Lista de documentos (cópias), com a pontuação combinada no metadado "fused_score"
+        """
+        vector_hits = self.vectorstore.similarity_search_with_relevance_scores(query, k=self.fetch_k)
+        index = get_lexical_index(self.lexical_path)
+        lexical_hits = index.search(query, self.fetch_k, self.document_filter) if index is not None else []
+        
+        # A pontuação combinada depende da posição nas listas (RRF) e não é uma similaridade:
+        # fica em "fused_score" para que o corte por pontuação do contexto não a use
+        return [Document(page_content=doc.page_content, metadata=dict(doc.metadata, fused_score=score))
+                for doc, score in fuse_results(vector_hits, lexical_hits, self.k, self.fusion, self.vector_weight)]
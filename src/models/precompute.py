@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Pré-geração offline das respostas às perguntas de exemplo e às mais frequentes
+
+Gera, com o pipeline RAG do processo, a resposta e os documentos fonte de cada
+pergunta da lista e grava-os em PRECOMPUTED_ANSWERS_PATH, associados à versão atual
+do índice. As aplicações servem estas respostas de imediato (ver PrecomputedAnswers);
+as restantes perguntas, ou todas depois de uma reindexação, são geradas em direto.
+
+Uso:
+    python -m src.models.precompute
+    python -m src.models.precompute --perguntas perguntas_frequentes.txt --concorrencia 2
+"""
+
+import sys
+import time
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
+
+from src.config.settings import PRECOMPUTED_ANSWERS_PATH, EXAMPLE_QUESTIONS, BATCH_CONCURRENCY
+from src.models.registry import get_pipeline
+from src.models.rag import process_query, get_response_cache_key
+from src.utils.response_store import PrecomputedAnswers, write_precomputed_answers
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+def read_questions(path: str) -> List[str]:
+    """
+    Lê as perguntas de um ficheiro, uma por linha (linhas vazias e começadas por '#' são ignoradas)
+    
+    Args:
+        path: Caminho do ficheiro
+    
+    Returns:
+        Lista de perguntas
+    """
+    with open(path, encoding="utf-8") as f:
+        linhas = [linha.strip() for linha in f]
+    return [linha for linha in linhas if linha and not linha.startswith("#")]
+
+def precompute_answers(questions: List[str], qa_chain, index_version: str,
+                       path: str = PRECOMPUTED_ANSWERS_PATH,
+                       concurrency: int = BATCH_CONCURRENCY,
+                       force: bool = False) -> Dict[str, Any]:
+    """
+    Gera as respostas às perguntas e grava-as no ficheiro de respostas pré-geradas
+    
+    Perguntas que já têm resposta para a mesma chave (mesma pergunta normalizada,
+    modelo, prompt e versão do índice) não são geradas de novo, salvo com force.
+    Respostas de outras versões do índice são descartadas.
+    
+    Args:
+        questions: Perguntas a pré-gerar
+        qa_chain: Cadeia de QA configurada
+        index_version: Versão atual do índice
+        path: Caminho do ficheiro JSON
+        concurrency: Perguntas geradas em simultâneo
+        force: Se True, gera de novo todas as respostas
+    
+    Returns:
+        Resumo com o número de respostas geradas, reutilizadas e falhadas e o tempo total
+    """
+    start_time = time.time()
+    existing = PrecomputedAnswers(path)
+    existing.refresh()
+    
+    pending: Dict[str, str] = {}
+    respostas: Dict[str, Dict[str, Any]] = {}
+    for question in questions:
+        key = get_response_cache_key(question, qa_chain, index_version)
+        if key in respostas or key in pending:
+            continue
+        if not force and key in existing.answers:
+            respostas[key] = existing.answers[key]
+        else:
+            pending[key] = question
+    
+    def generate(key: str) -> Optional[Dict[str, Any]]:
+        question = pending[key]
+        try:
+            inicio = time.time()
+            resultado = process_query(question, qa_chain)
+            logger.info(f"Resposta pré-gerada em {time.time() - inicio:.2f}s: {question}")
+            return {
+                "pergunta": question,
+                "resposta": resultado["resposta"],
+                "documentos": resultado["documentos"],
+                "tempo": time.time() - inicio
+            }
+        except Exception as e:
+            logger.error(f"Erro ao pré-gerar a resposta a '{question}': {str(e)}")
+            return None
+    
+    reutilizadas = len(respostas)
+    falhadas = 0
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        for key, entry in zip(pending, executor.map(generate, pending)):
+            if entry is None:
+                falhadas += 1
+            else:
+                respostas[key] = entry
+    
+    write_precomputed_answers(path, index_version, respostas)
+    return {
+        "geradas": len(pending) - falhadas,
+        "reutilizadas": reutilizadas,
+        "falhadas": falhadas,
+        "tempo": time.time() - start_time
+    }
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Pré-geração das respostas às perguntas de exemplo e frequentes")
+    parser.add_argument("--perguntas", action="append", default=[],
+                        help="Ficheiro com perguntas, uma por linha (pode repetir-se)")
+    parser.add_argument("--sem-exemplos", action="store_true",
+                        help="Não incluir as perguntas de exemplo da aplicação (EXAMPLE_QUESTIONS)")
+    parser.add_argument("--concorrencia", type=int, default=BATCH_CONCURRENCY, help="Perguntas em simultâneo")
+    parser.add_argument("--forcar", action="store_true", help="Gerar de novo as respostas já existentes")
+    parser.add_argument("--saida", default=PRECOMPUTED_ANSWERS_PATH, help="Ficheiro de respostas pré-geradas")
+    args = parser.parse_args()
+    
+    questions = [] if args.sem_exemplos else list(EXAMPLE_QUESTIONS)
+    for path in args.perguntas:
+        questions.extend(read_questions(path))
+    if not questions:
+        print("Nenhuma pergunta para pré-gerar")
+        return 1
+    
+    pipeline = get_pipeline(status_callback=print)
+    resumo = precompute_answers(questions, pipeline["qa_chain"], pipeline["index_version"],
+                                args.saida, args.concorrencia, args.forcar)
+    print(f"Índice {pipeline['index_version']}: {resumo['geradas']} respostas geradas, "
+          f"{resumo['reutilizadas']} reutilizadas, {resumo['falhadas']} falhadas "
+          f"em {resumo['tempo']:.1f}s ({args.saida})")
+    return 1 if resumo["falhadas"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
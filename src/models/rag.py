@@ -5,21 +5,48 @@
 Módulo para configuração e execução do pipeline RAG com Ollama
 """
 
+import time
+import asyncio
 import logging
-from typing import Dict, Any, List
+import threading
+import contextlib
+from typing import Dict, Any, List, Iterator, AsyncIterator, Tuple, Optional
 
 from langchain_ollama import OllamaLLM
 from langchain.chains import RetrievalQA
 from langchain.prompts import PromptTemplate
 from langchain.schema import Document
+from langchain_core.prompts import format_document
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
 
+from src.utils.response_store import ResponseStore, get_response_store, get_semantic_cache
+from src.utils.cache import normalize_query
+from src.utils.singleflight import SingleFlight, AsyncSingleFlight
+from src.models.context import count_tokens, pack_context
+from src.models.warmup import record_model_use, model_is_loaded, record_query_latency
+from src.models.clients import ollama_client_kwargs
+from src.utils.metrics import (
+    RETRIEVAL_SECONDS,
+    PROMPT_BUILD_SECONDS,
+    CONTEXT_TOKENS,
+    GENERATION_SECONDS,
+    TIME_TO_FIRST_TOKEN_SECONDS,
+    QUERY_SECONDS,
+    QUERIES_IN_FLIGHT,
+    record_ollama_metadata
+)
 from src.config.settings import (
+    OLLAMA_BASE_URL,
     OLLAMA_MODEL,
     OLLAMA_TEMPERATURE,
     OLLAMA_TOP_P,
     OLLAMA_NUM_CTX,
     OLLAMA_NUM_THREAD,
-    OLLAMA_NUM_GPU
+    OLLAMA_NUM_GPU,
+    OLLAMA_KEEP_ALIVE,
+    CONTEXT_PACKING,
+    QUERY_COALESCING
 )
 
 # Configurar logging
@@ -40,6 +67,20 @@ Pergunta: {question}
 Resposta em português:
 """
 
+class OllamaMetricsHandler(BaseCallbackHandler):
+    """
+    Regista nas métricas os tempos e contagens de tokens que o Ollama devolve no fim
+    de cada geração (com ou sem streaming), e o uso do modelo para o keep-alive
+    """
+    
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], **kwargs: Any) -> None:
+        record_model_use(kwargs.get("invocation_params", {}).get("model", OLLAMA_MODEL))
+    
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        for generations in response.generations:
+            for generation in generations:
+                record_ollama_metadata(generation.generation_info)
+
 def create_llm() -> OllamaLLM:
     """
     Cria e configura o modelo Ollama LLM
@@ -51,17 +92,50 @@ def create_llm() -> OllamaLLM:
     try:
         return OllamaLLM(
             model=OLLAMA_MODEL,
+            base_url=OLLAMA_BASE_URL,
             temperature=OLLAMA_TEMPERATURE,
             stop=["\n\n"],
             top_p=OLLAMA_TOP_P,
             num_ctx=OLLAMA_NUM_CTX,
             num_thread=OLLAMA_NUM_THREAD,
-            num_gpu=OLLAMA_NUM_GPU
+            num_gpu=OLLAMA_NUM_GPU,
+            keep_alive=OLLAMA_KEEP_ALIVE,
+            client_kwargs=ollama_client_kwargs(),
+            callbacks=[OllamaMetricsHandler()]
         )
     except Exception as e:
         logger.error(f"Erro ao configurar modelo Ollama: {str(e)}")
         raise
 
+# Modelo LLM partilhado por todo o processo (e pelo seu pool de ligações ao Ollama)
+_llm: Optional[OllamaLLM] = None
+_llm_lock = threading.Lock()
+
+def get_llm() -> OllamaLLM:
+    """
+    Devolve o modelo LLM do processo, criando-o na primeira chamada
+    
+    Returns:
+        Modelo OllamaLLM partilhado
+    """
+    global _llm
+    with _llm_lock:
+        if _llm is None:
+            _llm = create_llm()
+        return _llm
+
+def create_prompt() -> PromptTemplate:
+    """
+    Cria o template de prompt em português usado na geração
+    
+    Returns:
+        Template de prompt configurado
+    """
+    return PromptTemplate(
+        template=PROMPT_TEMPLATE,
+        input_variables=["context", "question"]
+    )
+
 def create_qa_chain(retriever):
     """
     Cria uma cadeia de QA com o retriever e o modelo LLM
@@ -74,13 +148,10 @@ def create_qa_chain(retriever):
     """
     logger.info("Configurando cadeia de QA")
     try:
-        llm = create_llm()
+        llm = get_llm()
         
         # Criar o template de prompt
-        prompt = PromptTemplate(
-            template=PROMPT_TEMPLATE,
-            input_variables=["context", "question"]
-        )
+        prompt = create_prompt()
         
         # Criar a cadeia de QA
         qa_chain = RetrievalQA.from_chain_type(
@@ -97,35 +168,557 @@ def create_qa_chain(retriever):
         logger.error(f"Erro ao criar cadeia de QA: {str(e)}")
         raise
 
-def process_query(query: str, qa_chain) -> Dict[str, Any]:
+def _get_chain_components(qa_chain) -> Tuple[Any, PromptTemplate, OllamaLLM, Any]:
+    """
+    Extrai os componentes internos de uma cadeia RetrievalQA
+    
+    Args:
+        qa_chain: Cadeia de QA criada por create_qa_chain
+        
+    Returns:
+        Tupla (retriever, prompt, llm, cadeia "stuff" de combinação de documentos)
+    """
+    combine_chain = qa_chain.combine_documents_chain
+    llm_chain = combine_chain.llm_chain
+    return qa_chain.retriever, llm_chain.prompt, llm_chain.llm, combine_chain
+
+def get_response_cache_key(query: str, qa_chain, index_version: str) -> str:
     """
-    Processa uma consulta usando a cadeia de QA
+    Gera a chave de uma resposta no armazém persistente, a partir da pergunta normalizada,
+    do modelo e do prompt da cadeia de QA e da versão do índice
     
     Args:
         query: Pergunta do usuário
         qa_chain: Cadeia de QA configurada
+        index_version: Versão do índice (ver get_index_version)
         
     Returns:
-        Dicionário com a resposta e documentos fonte
+        Chave da resposta
     """
-    logger.info(f"Processando consulta: {query}")
+    _, prompt, llm, _ = _get_chain_components(qa_chain)
+    return ResponseStore.make_key(query, llm.model, prompt.template, index_version)
+
+def get_cache_namespace(qa_chain, index_version: str) -> str:
+    """
+    Gera o espaço das respostas em cache que dependem do modelo, do prompt e do índice,
+    para os caches que não são indexados pela pergunta (ver SemanticCache)
+    
+    Args:
+        qa_chain: Cadeia de QA configurada
+        index_version: Versão do índice (ver get_index_version)
+        
+    Returns:
+        Identificador do espaço
+    """
+    return get_response_cache_key("", qa_chain, index_version)
+
+def lookup_response(query: str, qa_chain, index_version: str,
+                    embeddings=None) -> Tuple[str, Optional[Dict[str, Any]], Optional[List[float]]]:
+    """
+    Procura uma resposta já gerada: primeiro no armazém persistente, pela chave exata,
+    e depois no cache semântico do processo, por uma pergunta semelhante
+    
+    O embedding da pergunta fica no cache de embeddings de consultas, pelo que a
+    recuperação que se segue a uma falha não volta a chamar o modelo.
+    
+    Args:
+        query: Pergunta do usuário
+        qa_chain: Cadeia de QA configurada
+        index_version: Versão do índice (ver get_index_version)
+        embeddings: Embeddings das consultas (None desativa o cache semântico)
+        
+    Returns:
+        Tupla (chave, resultado ou None, embedding da pergunta ou None), a passar a store_response
+    """
+    key = get_response_cache_key(query, qa_chain, index_version)
+    resultado = get_response_store().get(key)
+    if resultado is not None or embeddings is None:
+        return key, resultado, None
+    
+    vector = embeddings.embed_query(query)
+    semantic_hit = get_semantic_cache().get(vector, get_cache_namespace(qa_chain, index_version))
+    if semantic_hit:
+        resultado, similaridade = semantic_hit
+        logger.info(f"Usando resposta de pergunta semelhante (similaridade={similaridade:.3f})")
+        return key, resultado, None
+    return key, None, vector
+
+def store_response(key: str, query: str, resultado: Dict[str, Any], qa_chain, index_version: str,
+                   vector: Optional[List[float]] = None) -> None:
+    """
+    Guarda uma resposta gerada no armazém persistente e, se houver embedding, no cache semântico
+    
+    Args:
+        key: Chave devolvida por lookup_response
+        query: Pergunta do usuário
+        resultado: Dicionário com resposta, documentos e tempo
+        qa_chain: Cadeia de QA configurada
+        index_version: Versão do índice
+        vector: Embedding da pergunta devolvido por lookup_response
+    """
+    get_response_store().set(key, query, resultado)
+    if vector is not None:
+        get_semantic_cache().set(vector, resultado, get_cache_namespace(qa_chain, index_version))
+
+def retrieve_documents(query: str, retriever) -> Dict[str, Any]:
+    """
+    Etapa de recuperação: obtém os documentos relevantes para a consulta
+    
+    Args:
+        query: Pergunta do usuário
+        retriever: Retriever configurado
+        
+    Returns:
+        Dicionário com os documentos recuperados e o tempo da etapa
+    """
+    start_time = time.time()
+    documentos = retriever.invoke(query)
+    tempo = time.time() - start_time
+    RETRIEVAL_SECONDS.observe(tempo)
+    logger.info(f"Recuperados {len(documentos)} documentos em {tempo:.2f}s")
+    return {"documentos": documentos, "tempo": tempo}
+
+def build_prompt(query: str, documents: List[Document],
+                 prompt: Optional[PromptTemplate] = None,
+                 document_prompt: Optional[PromptTemplate] = None,
+                 document_separator: str = "\n\n",
+                 packing: bool = CONTEXT_PACKING) -> Dict[str, Any]:
+    """
+    Etapa de montagem do prompt: junta os documentos no contexto, como a cadeia "stuff"
+    
+    Com packing, o contexto é montado por pack_context: os candidatos abaixo do corte
+    de pontuação são descartados, os restantes entram enquanto couberem no orçamento de
+    tokens e os chunks vizinhos são fundidos sem repetir a sobreposição.
+    
+    Args:
+        query: Pergunta do usuário
+        documents: Documentos recuperados
+        prompt: Template de prompt (por omissão, o de create_prompt)
+        document_prompt: Template de formatação de cada documento (por omissão, só o texto)
+        document_separator: Separador entre documentos no contexto
+        packing: Se True, monta o contexto com orçamento de tokens
+        
+    Returns:
+        Dicionário com o prompt final, os documentos usados no contexto, os tokens
+        estimados do contexto e o tempo da etapa
+    """
+    start_time = time.time()
+    prompt = prompt or create_prompt()
+    document_prompt = document_prompt or PromptTemplate.from_template("{page_content}")
+    blocos = usados = documents
+    if packing:
+        overhead = count_tokens(prompt.format(context="", question=query))
+        contexto_montado = pack_context(documents, overhead)
+        blocos, usados = contexto_montado["blocos"], contexto_montado["documentos"]
+    partes = [format_document(doc, document_prompt) for doc in blocos]
+    contexto = document_separator.join(partes)
+    prompt_texto = prompt.format(context=contexto, question=query)
+    tokens = sum(count_tokens(parte) for parte in partes)
+    tempo = time.time() - start_time
+    PROMPT_BUILD_SECONDS.observe(tempo)
+    CONTEXT_TOKENS.observe(tokens)
+    return {"prompt": prompt_texto, "documentos": usados, "tokens": tokens, "tempo": tempo}
+
+def generate_answer(prompt_text: str, llm: OllamaLLM) -> Dict[str, Any]:
+    """
+    Etapa de geração: obtém a resposta completa do modelo para um prompt já montado
+    
+    Args:
+        prompt_text: Prompt final
+        llm: Modelo LLM configurado
+        
+    Returns:
+        Dicionário com a resposta e o tempo da etapa
+    """
+    start_time = time.time()
+    resposta = llm.invoke(prompt_text)
+    tempo = time.time() - start_time
+    GENERATION_SECONDS.observe(tempo)
+    logger.info(f"Resposta gerada em {tempo:.2f}s")
+    return {"resposta": resposta, "tempo": tempo}
+
+def stream_answer(prompt_text: str, llm: OllamaLLM) -> Iterator[str]:
+    """
+    Etapa de geração em streaming: produz a resposta do modelo token a token
+    
+    Args:
+        prompt_text: Prompt final
+        llm: Modelo LLM configurado
+        
+    Returns:
+        Iterador de fragmentos da resposta
+    """
+    return llm.stream(prompt_text)
+
+async def aretrieve_documents(query: str, retriever) -> Dict[str, Any]:
+    """
+    Versão assíncrona da etapa de recuperação
+    
+    Args:
+        query: Pergunta do usuário
+        retriever: Retriever configurado
+        
+    Returns:
+        Dicionário com os documentos recuperados e o tempo da etapa
+    """
+    start_time = time.time()
+    documentos = await retriever.ainvoke(query)
+    tempo = time.time() - start_time
+    RETRIEVAL_SECONDS.observe(tempo)
+    logger.info(f"Recuperados {len(documentos)} documentos em {tempo:.2f}s")
+    return {"documentos": documentos, "tempo": tempo}
+
+async def agenerate_answer(prompt_text: str, llm: OllamaLLM) -> Dict[str, Any]:
+    """
+    Versão assíncrona da etapa de geração
+    
+    Args:
+        prompt_text: Prompt final
+        llm: Modelo LLM configurado
+        
+    Returns:
+        Dicionário com a resposta e o tempo da etapa
+    """
+    start_time = time.time()
+    resposta = await llm.ainvoke(prompt_text)
+    tempo = time.time() - start_time
+    GENERATION_SECONDS.observe(tempo)
+    logger.info(f"Resposta gerada em {tempo:.2f}s")
+    return {"resposta": resposta, "tempo": tempo}
+
+def astream_answer(prompt_text: str, llm: OllamaLLM) -> AsyncIterator[str]:
+    """
+    Versão assíncrona da etapa de geração em streaming
+    
+    Args:
+        prompt_text: Prompt final
+        llm: Modelo LLM configurado
+        
+    Returns:
+        Iterador assíncrono de fragmentos da resposta
+    """
+    return llm.astream(prompt_text)
+
+@contextlib.contextmanager
+def _query_in_flight(erro: str) -> Iterator[None]:
+    """
+    Conta a consulta em urobot_queries_in_flight enquanto decorre, regista no log o
+    erro que a interrompa e, se terminar, a sua latência (ver record_query_latency)
+    
+    Args:
+        erro: Mensagem do log em caso de erro
+    """
+    QUERIES_IN_FLIGHT.inc()
+    frio = not model_is_loaded(OLLAMA_MODEL)
+    start_time = time.time()
     try:
-        # Executar a consulta
-        result = qa_chain.invoke({"query": query})
-        
-        # Extrair a resposta e os documentos fonte
-        if isinstance(result, dict) and "result" in result:
-            resposta = result["result"]
-            documentos = result.get("source_documents", [])
-        else:
-            resposta = str(result)
-            documentos = []
+        yield
+    except Exception as e:
+        logger.error(f"{erro}: {str(e)}")
+        raise
+    else:
+        record_query_latency(time.time() - start_time, frio)
+    finally:
+        QUERIES_IN_FLIGHT.dec()
+
+def _build_chain_prompt(query: str, documents: List[Document], prompt: PromptTemplate, combine_chain) -> Dict[str, Any]:
+    """
+    Monta o prompt como a cadeia "stuff" da cadeia de QA, com o seu template de
+    documento e o seu separador
+    
+    Args:
+        query: Pergunta do usuário
+        documents: Documentos recuperados
+        prompt: Template de prompt da cadeia
+        combine_chain: Cadeia "stuff" da cadeia de QA
+        
+    Returns:
+        Dicionário de build_prompt
+    """
+    return build_prompt(query, documents, prompt, combine_chain.document_prompt, combine_chain.document_separator)
+
+def _query_result(start_time: float, recuperacao: Dict[str, Any], montagem: Dict[str, Any],
+                  geracao: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Regista o tempo total de uma consulta e junta o resultado das três etapas
+    
+    Args:
+        start_time: Início da consulta
+        recuperacao: Resultado da etapa de recuperação
+        montagem: Resultado da montagem do prompt
+        geracao: Resultado da etapa de geração
+        
+    Returns:
+        Dicionário com a resposta, documentos fonte e o tempo de cada etapa
+    """
+    QUERY_SECONDS.observe(time.time() - start_time)
+    logger.info("Consulta processada com sucesso")
+    return {
+        "resposta": geracao["resposta"],
+        "documentos": montagem["documentos"],
+        "tempos": {
+            "recuperacao": recuperacao["tempo"],
+            "prompt": montagem["tempo"],
+            "geracao": geracao["tempo"]
+        }
+    }
+
+class _AnswerStream:
+    """
+    Acompanha a geração em streaming de uma consulta: converte os fragmentos em eventos
+    "token", mede o tempo até ao primeiro e produz o evento "fim"
+    """
+    
+    def __init__(self, start_time: float):
+        """
+        Args:
+            start_time: Início da consulta
+        """
+        self.start_time = start_time
+        self.inicio_geracao = time.time()
+        self.tempo_primeiro_token: Optional[float] = None
+        self.partes: List[str] = []
+    
+    def token(self, token: str) -> Dict[str, Any]:
+        """
+        Regista um fragmento da resposta
+        
+        Args:
+            token: Fragmento gerado pelo modelo
+            
+        Returns:
+            Evento "token"
+        """
+        if self.tempo_primeiro_token is None:
+            self.tempo_primeiro_token = time.time() - self.start_time
+        self.partes.append(token)
+        return {"tipo": "token", "token": token}
+    
+    def end(self, recuperacao: Dict[str, Any], montagem: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Regista as métricas da consulta terminada
+        
+        Args:
+            recuperacao: Resultado da etapa de recuperação
+            montagem: Resultado da montagem do prompt
             
-        logger.info("Consulta processada com sucesso")
+        Returns:
+            Evento "fim"
+        """
+        tempo_total = time.time() - self.start_time
+        tempo_geracao = time.time() - self.inicio_geracao
+        if self.tempo_primeiro_token is not None:
+            TIME_TO_FIRST_TOKEN_SECONDS.observe(self.tempo_primeiro_token)
+        GENERATION_SECONDS.observe(tempo_geracao)
+        QUERY_SECONDS.observe(tempo_total)
+        logger.info(
+            f"Consulta processada com sucesso (primeiro token: "
+            f"{(self.tempo_primeiro_token or tempo_total):.2f}s, total: {tempo_total:.2f}s)"
+        )
         return {
-            "resposta": resposta,
-            "documentos": documentos
+            "tipo": "fim",
+            "resposta": "".join(self.partes),
+            "documentos": montagem["documentos"],
+            "tempo_primeiro_token": self.tempo_primeiro_token if self.tempo_primeiro_token is not None else tempo_total,
+            "tempo_total": tempo_total,
+            "tempos": {
+                "recuperacao": recuperacao["tempo"],
+                "prompt": montagem["tempo"],
+                "geracao": tempo_geracao
+            }
         }
-    except Exception as e:
-        logger.error(f"Erro ao processar consulta: {str(e)}")
-        raise
+
+def process_query(query: str, qa_chain) -> Dict[str, Any]:
+    """
+    Processa uma consulta usando os componentes da cadeia de QA
+    
+    Args:
+        query: Pergunta do usuário
+        qa_chain: Cadeia de QA configurada
+        
+    Returns:
+        Dicionário com a resposta, documentos fonte e o tempo de cada etapa
+    """
+    logger.info(f"Processando consulta: {query}")
+    with _query_in_flight("Erro ao processar consulta"):
+        start_time = time.time()
+        retriever, prompt, llm, combine_chain = _get_chain_components(qa_chain)
+        
+        recuperacao = retrieve_documents(query, retriever)
+        montagem = _build_chain_prompt(query, recuperacao["documentos"], prompt, combine_chain)
+        geracao = generate_answer(montagem["prompt"], llm)
+        return _query_result(start_time, recuperacao, montagem, geracao)
+
+def process_query_stream(query: str, qa_chain) -> Iterator[Dict[str, Any]]:
+    """
+    Processa uma consulta usando a cadeia de QA, produzindo a resposta token a token
+    
+    Os eventos produzidos são dicionários com a chave "tipo":
+        - "documentos": emitido uma vez, antes da geração, com os documentos fonte
+        - "token": um fragmento da resposta, à medida que o modelo o gera
+        - "fim": a resposta completa, os documentos fonte, o tempo até ao
+          primeiro token, o tempo total e o tempo de cada etapa (em segundos)
+    
+    Args:
+        query: Pergunta do usuário
+        qa_chain: Cadeia de QA configurada
+        
+    Returns:
+        Iterador de eventos da consulta
+    """
+    logger.info(f"Processando consulta em streaming: {query}")
+    with _query_in_flight("Erro ao processar consulta em streaming"):
+        start_time = time.time()
+        retriever, prompt, llm, combine_chain = _get_chain_components(qa_chain)
+        
+        # Recuperar os documentos relevantes e montar o prompt antes de gerar
+        recuperacao = retrieve_documents(query, retriever)
+        montagem = _build_chain_prompt(query, recuperacao["documentos"], prompt, combine_chain)
+        yield {"tipo": "documentos", "documentos": montagem["documentos"]}
+        
+        # Gerar a resposta de forma incremental
+        stream = _AnswerStream(start_time)
+        for token in stream_answer(montagem["prompt"], llm):
+            yield stream.token(token)
+        yield stream.end(recuperacao, montagem)
+
+async def aprocess_query(query: str, qa_chain) -> Dict[str, Any]:
+    """
+    Versão assíncrona de process_query, sem bloquear o event loop
+    
+    Args:
+        query: Pergunta do usuário
+        qa_chain: Cadeia de QA configurada
+        
+    Returns:
+        Dicionário com a resposta, documentos fonte e o tempo de cada etapa
+    """
+    logger.info(f"Processando consulta (async): {query}")
+    with _query_in_flight("Erro ao processar consulta"):
+        start_time = time.time()
+        retriever, prompt, llm, combine_chain = _get_chain_components(qa_chain)
+        
+        recuperacao = await aretrieve_documents(query, retriever)
+        montagem = _build_chain_prompt(query, recuperacao["documentos"], prompt, combine_chain)
+        geracao = await agenerate_answer(montagem["prompt"], llm)
+        return _query_result(start_time, recuperacao, montagem, geracao)
+
+async def aprocess_query_stream(query: str, qa_chain) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Versão assíncrona de process_query_stream, com os mesmos eventos
+    
+    Args:
+        query: Pergunta do usuário
+        qa_chain: Cadeia de QA configurada
+        
+    Returns:
+        Iterador assíncrono de eventos da consulta
+    """
+    logger.info(f"Processando consulta em streaming (async): {query}")
+    with _query_in_flight("Erro ao processar consulta em streaming"):
+        start_time = time.time()
+        retriever, prompt, llm, combine_chain = _get_chain_components(qa_chain)
+        
+        recuperacao = await aretrieve_documents(query, retriever)
+        montagem = _build_chain_prompt(query, recuperacao["documentos"], prompt, combine_chain)
+        yield {"tipo": "documentos", "documentos": montagem["documentos"]}
+        
+        stream = _AnswerStream(start_time)
+        async for token in astream_answer(montagem["prompt"], llm):
+            yield stream.token(token)
+        yield stream.end(recuperacao, montagem)
+
+# Consultas idênticas em curso partilham uma única execução (threads e event loop)
+_single_flight = SingleFlight("consultas")
+_async_single_flight = AsyncSingleFlight("consultas_async")
+
+def _coalescing_key(query: str, qa_chain) -> str:
+    """
+    Chave de coalescência: a pergunta normalizada e a cadeia de QA que a responde
+    """
+    return f"{id(qa_chain)}:{normalize_query(query)}"
+
+def process_query_shared(query: str, qa_chain, coalesce: bool = QUERY_COALESCING) -> Dict[str, Any]:
+    """
+    Versão de process_query em que pedidos simultâneos para a mesma pergunta
+    (normalizada) aguardam uma única execução em curso
+    
+    Args:
+        query: Pergunta do usuário
+        qa_chain: Cadeia de QA configurada
+        coalesce: Se False, executa sempre a consulta
+        
+    Returns:
+        Dicionário de process_query, com "partilhado" = True se o resultado veio de
+        uma execução iniciada por outro pedido
+    """
+    if not coalesce:
+        return dict(process_query(query, qa_chain), partilhado=False)
+    resultado, partilhado = _single_flight.do(_coalescing_key(query, qa_chain),
+                                              lambda: process_query(query, qa_chain))
+    return dict(resultado, partilhado=partilhado)
+
+def process_query_stream_shared(query: str, qa_chain, coalesce: bool = QUERY_COALESCING) -> Iterator[Dict[str, Any]]:
+    """
+    Versão de process_query_stream em que pedidos simultâneos para a mesma pergunta
+    recebem os eventos de um único streaming
+    
+    Args:
+        query: Pergunta do usuário
+        qa_chain: Cadeia de QA configurada
+        coalesce: Se False, executa sempre a consulta
+        
+    Returns:
+        Iterador de eventos da consulta (os mesmos de process_query_stream)
+    """
+    if not coalesce:
+        return process_query_stream(query, qa_chain)
+    return _single_flight.stream(_coalescing_key(query, qa_chain),
+                                 lambda: process_query_stream(query, qa_chain))
+
+async def aprocess_query_shared(query: str, qa_chain, limiter: Optional[asyncio.Semaphore] = None,
+                                coalesce: bool = QUERY_COALESCING) -> Dict[str, Any]:
+    """
+    Versão assíncrona de process_query_shared
+    
+    Args:
+        query: Pergunta do usuário
+        qa_chain: Cadeia de QA configurada
+        limiter: Semáforo opcional adquirido apenas pela execução real (os pedidos que
+            aguardam uma execução em curso não ocupam vagas)
+        coalesce: Se False, executa sempre a consulta
+        
+    Returns:
+        Dicionário de aprocess_query, com "partilhado"
+    """
+    async def run() -> Dict[str, Any]:
+        async with limiter or contextlib.nullcontext():
+            return await aprocess_query(query, qa_chain)
+    
+    if not coalesce:
+        return dict(await run(), partilhado=False)
+    resultado, partilhado = await _async_single_flight.do(_coalescing_key(query, qa_chain), run)
+    return dict(resultado, partilhado=partilhado)
+
+def aprocess_query_stream_shared(query: str, qa_chain, limiter: Optional[asyncio.Semaphore] = None,
+                                 coalesce: bool = QUERY_COALESCING) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Versão assíncrona de process_query_stream_shared
+    
+    Args:
+        query: Pergunta do usuário
+        qa_chain: Cadeia de QA configurada
+        limiter: Semáforo opcional adquirido apenas pelo streaming real
+        coalesce: Se False, executa sempre a consulta
+        
+    Returns:
+        Iterador assíncrono de eventos da consulta
+    """
+    async def run() -> AsyncIterator[Dict[str, Any]]:
+        async with limiter or contextlib.nullcontext():
+            async for evento in aprocess_query_stream(query, qa_chain):
+                yield evento
+    
+    if not coalesce:
+        return run()
+    return _async_single_flight.stream(_coalescing_key(query, qa_chain), run)
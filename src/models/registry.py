@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Registo do pipeline RAG partilhado por todo o processo
+
+O vectorstore, o retriever e a cadeia de QA são criados uma vez por processo e
+reutilizados por todas as sessões da aplicação Streamlit, pelo serviço HTTP e pela CLI.
+O LLM e os embeddings vêm de get_llm e get_embeddings, com os seus pools de ligações
+keep-alive ao Ollama, pelo que nenhuma sessão volta a pagar a sua criação.
+"""
+
+import logging
+import threading
+from typing import Dict, Any, Optional, Callable
+
+from src.models.embeddings import load_or_create_vectorstore, get_retriever, get_index_version
+from src.models.rag import create_qa_chain
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+_pipeline: Optional[Dict[str, Any]] = None
+_pipeline_lock = threading.Lock()
+
+def get_pipeline(recreate: bool = False, reindex: bool = False,
+                 progress_callback: Optional[Callable[[int, int], None]] = None,
+                 status_callback: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+    """
+    Devolve o pipeline RAG do processo, criando-o na primeira chamada
+    
+    Pedidos em simultâneo esperam pela mesma criação. Com recreate ou reindex, o
+    vectorstore é recriado ou atualizado e o pipeline é substituído para todas as sessões.
+    
+    Args:
+        recreate: Se True, recria o vectorstore
+        reindex: Se True, atualiza o vectorstore incrementalmente
+        progress_callback: Função opcional chamada com (chunks processados, total)
+            durante a geração de embeddings
+        status_callback: Função opcional chamada com mensagens de estado
+    
+    Returns:
+        Dicionário com o vectorstore, o retriever, a cadeia de QA e a versão do índice
+    """
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is not None and not recreate and not reindex:
+            return _pipeline
+        try:
+            logger.info("Criando o pipeline RAG do processo")
+            vectorstore = load_or_create_vectorstore(recreate=recreate, reindex=reindex,
+                                                     progress_callback=progress_callback,
+                                                     status_callback=status_callback)
+            retriever = get_retriever(vectorstore)
+            _pipeline = {
+                "vectorstore": vectorstore,
+                "retriever": retriever,
+                "qa_chain": create_qa_chain(retriever),
+                "index_version": get_index_version(vectorstore)
+            }
+            return _pipeline
+        except Exception as e:
+            logger.error(f"Erro ao criar o pipeline RAG: {str(e)}")
+            raise
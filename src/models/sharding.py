@@ -0,0 +1,436 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Índice dividido por documento: uma partição (coleção Chroma ou índice NumPy) por PDF
+
+Com uma única coleção, o custo de cada pesquisa cresce com o corpus inteiro. Com uma
+partição por regulamento, um pré-filtro pelos metadados das partições (nome do
+ficheiro, título) encaminha a consulta só para os documentos relevantes, e as
+partições restantes são pesquisadas em paralelo num pool de threads; os resultados
+são fundidos num top-k global. Acrescentar um regulamento não torna mais lentas as
+consultas encaminhadas para os outros.
+
+A lista de partições e os seus metadados ficam em shards.json, no diretório do índice.
+"""
+
+import os
+import re
+import json
+import heapq
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Dict, Any, Iterable, Tuple, Callable
+
+import numpy as np
+from langchain.schema import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from src.config.settings import SHARD_MAX_WORKERS
+from src.models.vector_index import NumpyVectorStore, maximal_marginal_relevance
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+SHARDS_FILE = "shards.json"
+
+# Metadados de cada chunk copiados para os metadados da partição (usados no pré-filtro)
+SHARD_METADATA_KEYS = ("source", "file_name", "title")
+
+def shard_name(source: str) -> str:
+    """
+    Nome da partição de um PDF, válido como nome de coleção do Chroma e de diretório
+    
+    Args:
+        source: Caminho do PDF (metadado "source" dos chunks)
+    
+    Returns:
+        Nome estável, derivado do nome do ficheiro (e de um hash do nome completo)
+    """
+    stem = os.path.splitext(os.path.basename(source))[0].lower()
+    slug = re.sub(r"[^a-z0-9]+", "_", stem).strip("_")[:40] or "documento"
+    digest = hashlib.sha256(os.path.basename(source).encode("utf-8")).hexdigest()[:8]
+    return f"doc_{slug}_{digest}"
+
+def group_by_shard(documents: List[Document]) -> Dict[str, List[Document]]:
+    """
+    Agrupa os chunks pela partição do PDF de onde vieram
+    
+    Args:
+        documents: Chunks com o metadado "source"
+    
+    Returns:
+        Dicionário partição -> chunks
+    """
+    groups: Dict[str, List[Document]] = {}
+    for doc in documents:
+        groups.setdefault(shard_name(str(doc.metadata.get("source", ""))), []).append(doc)
+    return groups
+
+def shard_metadata(documents: List[Document]) -> Dict[str, Any]:
+    """
+    Metadados de uma partição, a partir do primeiro chunk
+    
+    Args:
+        documents: Chunks da partição
+    
+    Returns:
+        Dicionário com a origem, o nome do ficheiro, o título e o número de chunks
+    """
+    first = documents[0].metadata if documents else {}
+    metadata = {key: first[key] for key in SHARD_METADATA_KEYS if first.get(key)}
+    metadata["chunks"] = len(documents)
+    return metadata
+
+def read_shards(directory: str) -> Optional[Dict[str, Dict[str, Any]]]:
+    """
+    Lê a lista de partições de um diretório de índice
+    
+    Args:
+        directory: Diretório do índice
+    
+    Returns:
+        Dicionário partição -> metadados, ou None se não existir
+    """
+    path = os.path.join(directory, SHARDS_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def write_shards(directory: str, shards: Dict[str, Dict[str, Any]]) -> None:
+    """
+    Grava a lista de partições de forma atómica
+    
+    Args:
+        directory: Diretório do índice
+        shards: Dicionário partição -> metadados
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, SHARDS_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(shards, f, ensure_ascii=False, indent=2)
+    os.replace(path + ".tmp", path)
+
+def matches_filter(metadata: Dict[str, Any], filter: Optional[Dict[str, Any]]) -> bool:
+    """
+    Indica se os metadados de uma partição satisfazem um pré-filtro
+    
+    Cada chave do filtro tem de coincidir; o valor pode ser um valor único ou uma
+    lista de valores aceites. A chave "shard" refere-se ao nome da partição.
+    
+    Args:
+        metadata: Metadados da partição
+        filter: Filtro (None aceita todas)
+    
+    Returns:
+        True se a partição deve ser pesquisada
+    """
+    for key, expected in (filter or {}).items():
+        accepted = expected if isinstance(expected, (list, tuple, set)) else [expected]
+        if metadata.get(key) not in accepted:
+            return False
+    return True
+
+def search_with_vectors(vectorstore: VectorStore, embedding: List[float],
+                        k: int) -> List[Tuple[Document, float, np.ndarray]]:
+    """
+    Pesquisa os k documentos mais semelhantes a um embedding, com os embeddings guardados
+    
+    Args:
+        vectorstore: Vectorstore (Chroma, NumPy ou dividido por documento)
+        embedding: Embedding da consulta
+        k: Número de documentos
+    
+    Returns:
+        Lista de tuplas (documento, pontuação de relevância, embedding), por relevância
+    """
+    if isinstance(vectorstore, (NumpyVectorStore, ShardedVectorStore)):
+        return vectorstore.similarity_search_with_vectors(embedding, k)
+    
+    # Chroma: obter os candidatos com os embeddings guardados, sem voltar a calculá-los
+    result = vectorstore._collection.query(query_embeddings=[embedding], n_results=k,
+                                           include=["documents", "metadatas", "embeddings", "distances"])
+    if not result["ids"] or not result["ids"][0]:
+        return []
+    relevance = vectorstore._select_relevance_score_fn()
+    return [(Document(page_content=text, metadata=metadata or {}), relevance(distance), np.asarray(vector))
+            for text, metadata, vector, distance in zip(result["documents"][0], result["metadatas"][0],
+                                                        result["embeddings"][0], result["distances"][0])]
+
+class ShardedVectorStore(VectorStore):
+    """
+    Vectorstore composto por uma partição por documento, pesquisadas em paralelo
+    
+    As pesquisas aceitam um argumento filter com os metadados das partições a
+    considerar (ver matches_filter); routed devolve uma vista já restrita a elas.
+    Os textos adicionados com add_texts vão para a partição do seu "source"; as
+    partições novas são abertas com shard_factory.
+    """
+    
+    def __init__(self, embedding: Embeddings, shards: Dict[str, VectorStore],
+                 metadata: Dict[str, Dict[str, Any]], max_workers: int = SHARD_MAX_WORKERS,
+                 executor: Optional[ThreadPoolExecutor] = None,
+                 shard_factory: Optional[Callable[[str], VectorStore]] = None,
+                 directory: Optional[str] = None):
+        """
+        Inicializa o vectorstore a partir das partições já abertas
+        
+        Args:
+            embedding: Objeto de embeddings usado para as consultas
+            shards: Dicionário partição -> vectorstore
+            metadata: Dicionário partição -> metadados (ver shard_metadata)
+            max_workers: Threads da pesquisa em paralelo
+            executor: Pool de threads partilhado (por omissão, criado na primeira pesquisa)
+            shard_factory: Função que abre (ou cria vazia) a partição com um dado nome,
+                usada por add_texts para os PDFs sem partição
+            directory: Diretório do índice, onde persist grava shards.json
+        """
+        self._embedding = embedding
+        self.shards = shards
+        self.metadata = metadata
+        self.max_workers = max_workers
+        self.shard_factory = shard_factory
+        self.directory = directory
+        self._parent: Optional["ShardedVectorStore"] = None
+        self._executor = executor
+        self._executor_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+    
+    @property
+    def embeddings(self) -> Embeddings:
+        """
+        Objeto de embeddings usado para as consultas
+        """
+        return self._embedding
+    
+    def _pool(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="particoes")
+            return self._executor
+    
+    def route(self, filter: Optional[Dict[str, Any]] = None) -> List[str]:
+        """
+        Escolhe as partições que satisfazem o pré-filtro
+        
+        Args:
+            filter: Filtro pelos metadados das partições (None escolhe todas)
+        
+        Returns:
+            Nomes das partições a pesquisar
+        """
+        return [name for name in self.shards
+                if matches_filter(dict(self.metadata.get(name, {}), shard=name), filter)]
+    
+    def routed(self, filter: Optional[Dict[str, Any]] = None) -> "ShardedVectorStore":
+        """
+        Devolve uma vista restrita às partições que satisfazem o pré-filtro
+        
+        Args:
+            filter: Filtro pelos metadados das partições
+        
+        Returns:
+            Vectorstore com as mesmas partições abertas e o mesmo pool de threads
+        """
+        names = self.route(filter)
+        if not names:
+            logger.warning(f"Nenhuma partição satisfaz o filtro {filter}")
+        view = ShardedVectorStore(self._embedding, {name: self.shards[name] for name in names},
+                                  {name: self.metadata.get(name, {}) for name in names},
+                                  self.max_workers, self._pool())
+        # As escritas na vista vão para o índice completo
+        view._parent = self._parent or self
+        return view
+    
+    def get_ids(self) -> List[str]:
+        """
+        Devolve os identificadores dos documentos de todas as partições
+        
+        Returns:
+            Lista de identificadores
+        """
+        ids: List[str] = []
+        for store in self.shards.values():
+            ids.extend(store.get_ids() if isinstance(store, NumpyVectorStore)
+                       else store._collection.get(include=[])["ids"])
+        return ids
+    
+    def _fan_out(self, search: Callable[[VectorStore], List[tuple]], names: List[str]) -> List[tuple]:
+        """
+        Executa uma pesquisa em cada partição (em paralelo se houver mais do que uma)
+        
+        Args:
+            search: Função que pesquisa uma partição
+            names: Partições a pesquisar
+        
+        Returns:
+            Resultados de todas as partições, concatenados
+        """
+        if len(names) == 1:
+            return search(self.shards[names[0]])
+        futures = [self._pool().submit(search, self.shards[name]) for name in names]
+        return [hit for future in futures for hit in future.result()]
+    
+    def similarity_search_with_vectors(self, embedding: List[float], k: int = 4,
+                                       filter: Optional[Dict[str, Any]] = None) -> List[Tuple[Document, float, np.ndarray]]:
+        """
+        Pesquisa os k documentos mais semelhantes em todas as partições escolhidas
+        
+        Cada partição devolve o seu top-k e os resultados são fundidos num top-k global
+        pela pontuação de relevância.
+        
+        Args:
+            embedding: Embedding da consulta
+            k: Número de documentos
+            filter: Pré-filtro pelos metadados das partições
+        
+        Returns:
+            Lista de tuplas (documento, pontuação de relevância, embedding), por relevância
+        """
+        names = self.route(filter)
+        if not names:
+            return []
+        hits = self._fan_out(lambda store: search_with_vectors(store, embedding, k), names)
+        return heapq.nlargest(k, hits, key=lambda hit: hit[1])
+    
+    def similarity_search_by_vector_with_score(self, embedding: List[float], k: int = 4,
+                                               filter: Optional[Dict[str, Any]] = None) -> List[Tuple[Document, float]]:
+        """
+        Pesquisa os k documentos mais semelhantes a um embedding, com a pontuação de relevância
+        """
+        return [(doc, score) for doc, score, _ in self.similarity_search_with_vectors(embedding, k, filter)]
+    
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4,
+                                    filter: Optional[Dict[str, Any]] = None, **kwargs: Any) -> List[Document]:
+        """
+        Pesquisa os k documentos mais semelhantes a um embedding (sem pontuações)
+        """
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k, filter)]
+    
+    def similarity_search_with_score(self, query: str, k: int = 4,
+                                     filter: Optional[Dict[str, Any]] = None, **kwargs: Any) -> List[Tuple[Document, float]]:
+        """
+        Pesquisa os k documentos mais semelhantes a uma consulta, com a pontuação de relevância
+        
+        O embedding da consulta é calculado uma vez e partilhado por todas as partições.
+        """
+        return self.similarity_search_by_vector_with_score(self._embedding.embed_query(query), k, filter)
+    
+    def similarity_search(self, query: str, k: int = 4,
+                          filter: Optional[Dict[str, Any]] = None, **kwargs: Any) -> List[Document]:
+        """
+        Pesquisa os k documentos mais semelhantes a uma consulta
+        """
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter)]
+    
+    def max_marginal_relevance_search_by_vector(self, embedding: List[float], k: int = 4, fetch_k: int = 20,
+                                                lambda_mult: float = 0.5,
+                                                filter: Optional[Dict[str, Any]] = None, **kwargs: Any) -> List[Document]:
+        """
+        Pesquisa os fetch_k candidatos globais e escolhe k diversos por MMR
+        """
+        hits = self.similarity_search_with_vectors(embedding, max(k, fetch_k), filter)
+        if not hits:
+            return []
+        selected, _ = maximal_marginal_relevance(embedding, np.stack([vector for _, _, vector in hits]),
+                                                 k, lambda_mult)
+        return [hits[i][0] for i in selected]
+    
+    def max_marginal_relevance_search(self, query: str, k: int = 4, fetch_k: int = 20,
+                                      lambda_mult: float = 0.5, **kwargs: Any) -> List[Document]:
+        """
+        Pesquisa k documentos relevantes e diversos para uma consulta
+        """
+        return self.max_marginal_relevance_search_by_vector(self._embedding.embed_query(query), k,
+                                                            fetch_k, lambda_mult, **kwargs)
+    
+    def _select_relevance_score_fn(self) -> Callable[[float], float]:
+        """
+        As pontuações das partições já são pontuações de relevância
+        """
+        return lambda score: score
+    
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, *,
+                  ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        """
+        Adiciona textos, cada um à partição do PDF de onde veio (metadado "source")
+        
+        As partições que ainda não existem são abertas com shard_factory. As partições
+        NumPy e a lista de partições só ficam em disco depois de persist.
+        
+        Args:
+            texts: Textos a adicionar
+            metadatas: Metadados de cada texto
+            ids: Identificadores de cada texto
+        
+        Returns:
+            Lista de identificadores inseridos, pela ordem dos textos
+        """
+        if self._parent is not None:
+            return self._parent.add_texts(texts, metadatas, ids=ids, **kwargs)
+        
+        texts = list(texts)
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [hashlib.sha256(text.encode("utf-8")).hexdigest()[:16] for text in texts]
+        groups: Dict[str, List[int]] = {}
+        for i, metadata in enumerate(metadatas):
+            groups.setdefault(shard_name(str(metadata.get("source", ""))), []).append(i)
+        
+        with self._write_lock:
+            for name, positions in groups.items():
+                documents = [Document(page_content=texts[i], metadata=metadatas[i]) for i in positions]
+                if name not in self.shards:
+                    if self.shard_factory is None:
+                        raise ValueError(f"Partição {name} inexistente e sem shard_factory para a criar")
+                    logger.info(f"Criando a partição {name}")
+                    self.shards[name] = self.shard_factory(name)
+                    self.metadata[name] = dict(shard_metadata(documents), chunks=0)
+                self.shards[name].add_texts([texts[i] for i in positions], [metadatas[i] for i in positions],
+                                            ids=[ids[i] for i in positions])
+                store = self.shards[name]
+                # Contar pela partição: identificadores já existentes substituem os anteriores
+                self.metadata[name]["chunks"] = (len(store.get_ids()) if isinstance(store, NumpyVectorStore)
+                                                 else store._collection.count())
+        return ids
+    
+    def persist(self) -> None:
+        """
+        Grava as partições NumPy e a lista de partições (shards.json) no diretório do índice
+        """
+        if self._parent is not None:
+            return self._parent.persist()
+        with self._write_lock:
+            for store in self.shards.values():
+                if isinstance(store, NumpyVectorStore):
+                    store.persist()
+            if self.directory:
+                write_shards(self.directory, self.metadata)
+    
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None, *,
+                   ids: Optional[List[str]] = None, shard_factory: Optional[Callable[[str], VectorStore]] = None,
+                   directory: Optional[str] = None, **kwargs: Any) -> "ShardedVectorStore":
+        """
+        Cria um índice dividido por documento a partir de textos
+        
+        Args:
+            texts: Textos a indexar
+            embedding: Objeto de embeddings
+            metadatas: Metadados de cada texto (o "source" escolhe a partição)
+            ids: Identificadores de cada texto
+            shard_factory: Função que cria a partição com um dado nome
+            directory: Diretório do índice (se indicado, o índice é gravado)
+        
+        Returns:
+            Vectorstore criado
+        """
+        store = cls(embedding, {}, {}, shard_factory=shard_factory, directory=directory)
+        store.add_texts(texts, metadatas, ids=ids)
+        if directory:
+            store.persist()
+        return store
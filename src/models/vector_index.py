@@ -0,0 +1,747 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Índice vetorial em memória com NumPy, alternativo ao Chroma para corpora pequenos
+
+Os embeddings podem ser guardados em float32, float16 ou int8 (quantização escalar
+com uma escala por vetor), reduzindo o índice para metade ou um quarto. Em int8 a
+pesquisa pontua sobre a forma quantizada (um quarto da memória); em float16, que o
+NumPy converte lentamente, pontua sobre uma cópia float32 mantida em memória (o
+índice em disco fica com metade, a memória não). Opcionalmente, volta a pontuar os
+melhores candidatos com a cópia float32 guardada em disco (lida em memory-map, pelo
+que só as linhas desses candidatos são carregadas).
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from typing import List, Optional, Dict, Any, Iterable, Tuple, Callable
+
+import numpy as np
+from langchain.schema import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+EMBEDDINGS_FILE = "embeddings.npy"
+SCALES_FILE = "scales.npy"
+FULL_EMBEDDINGS_FILE = "embeddings_float32.npy"
+METADATA_FILE = "metadata.json"
+QUANTIZATION_MODES = ("float32", "float16", "int8")
+SEARCH_BLOCK_ROWS = 8192  # Linhas convertidas para float32 de cada vez ao pontuar um índice quantizado
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """
+    Normaliza as linhas de uma matriz para norma unitária (produto interno = cosseno)
+    
+    Args:
+        matrix: Matriz de embeddings (N x D)
+    
+    Returns:
+        Matriz float32 com linhas normalizadas
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix[np.newaxis, :]
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+def quantize(matrix: np.ndarray, mode: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    Converte uma matriz de embeddings normalizados para a forma guardada no índice
+    
+    Em int8, cada vetor é dividido pela sua escala (maior valor absoluto / 127) e
+    arredondado; a escala é guardada à parte para recuperar as pontuações.
+    
+    Args:
+        matrix: Matriz float32 (N x D)
+        mode: "float32", "float16" ou "int8"
+    
+    Returns:
+        Tupla (matriz quantizada, escalas por vetor ou None)
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if mode == "float32":
+        return np.ascontiguousarray(matrix), None
+    if mode == "float16":
+        return matrix.astype(np.float16), None
+    if mode == "int8":
+        scales = np.abs(matrix).max(axis=1) / 127 if len(matrix) else np.zeros(0, dtype=np.float32)
+        scales[scales == 0] = 1.0
+        codes = np.clip(np.rint(matrix / scales[:, np.newaxis]), -127, 127).astype(np.int8)
+        return codes, scales.astype(np.float32)
+    raise ValueError(f"Quantização desconhecida: {mode} (opções: {', '.join(QUANTIZATION_MODES)})")
+
+def dequantize(codes: np.ndarray, scales: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Reconstrói (aproximadamente) a matriz float32 a partir da forma quantizada
+    
+    Args:
+        codes: Matriz quantizada (N x D)
+        scales: Escalas por vetor (só em int8)
+    
+    Returns:
+        Matriz float32
+    """
+    matrix = np.asarray(codes, dtype=np.float32)
+    return matrix * scales[:, np.newaxis] if scales is not None else matrix
+
+def quantized_scores(queries: np.ndarray, codes: np.ndarray, scales: Optional[np.ndarray] = None,
+                     block_rows: int = SEARCH_BLOCK_ROWS) -> np.ndarray:
+    """
+    Calcula a similaridade das consultas com todos os vetores de um índice quantizado
+    
+    O NumPy não tem produto de matrizes otimizado para float16 nem int8, pelo que a
+    matriz é convertida para float32 por blocos de linhas, sem nunca ficar toda em
+    float32 na memória; a escala de cada vetor é aplicada às pontuações no fim.
+    
+    Args:
+        queries: Consultas normalizadas (M x D)
+        codes: Matriz guardada (N x D), em float32, float16 ou int8
+        scales: Escalas por vetor (só em int8)
+        block_rows: Linhas convertidas de cada vez
+    
+    Returns:
+        Matriz de pontuações (M x N)
+    """
+    if codes.dtype == np.float32:
+        return queries @ np.asarray(codes).T
+    scores = np.empty((len(queries), len(codes)), dtype=np.float32)
+    for start in range(0, len(codes), block_rows):
+        block = np.asarray(codes[start:start + block_rows], dtype=np.float32)
+        scores[:, start:start + len(block)] = queries @ block.T
+    if scales is not None:
+        scores *= scales
+    return scores
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Devolve os índices dos k maiores valores de cada linha, por ordem decrescente
+    
+    Usa argpartition (O(N)) e ordena apenas os k candidatos selecionados.
+    
+    Args:
+        scores: Matriz de pontuações (M x N) ou vetor (N)
+        k: Número de resultados
+    
+    Returns:
+        Matriz (M x k) ou vetor (k) de índices
+    """
+    single = scores.ndim == 1
+    scores = np.atleast_2d(scores)
+    k = min(k, scores.shape[1])
+    if k <= 0:
+        indices = np.empty((scores.shape[0], 0), dtype=np.int64)
+    else:
+        candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        order = np.argsort(-np.take_along_axis(scores, candidates, axis=1), axis=1)
+        indices = np.take_along_axis(candidates, order, axis=1)
+    return indices[0] if single else indices
+
+def maximal_marginal_relevance(query_vector, candidate_vectors, k: int,
+                               lambda_mult: float = 0.5) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Escolhe k candidatos por Maximal Marginal Relevance (relevância menos redundância)
+    
+    As similaridades à consulta e entre candidatos são calculadas de uma vez (um
+    produto matriz-vetor e um matriz-matriz); cada escolha atualiza apenas o vetor da
+    maior similaridade de cada candidato aos já escolhidos, sem comparações par a par.
+    
+    Args:
+        query_vector: Embedding da consulta (D)
+        candidate_vectors: Embeddings dos candidatos (N x D)
+        k: Número de candidatos a escolher
+        lambda_mult: Peso da relevância (1 = só relevância, 0 = só diversidade)
+    
+    Returns:
+        Tupla (índices escolhidos, por ordem de escolha; similaridade de cosseno de cada
+        um à consulta)
+    """
+    candidates = _normalize_rows(candidate_vectors)
+    k = min(k, len(candidates)) if candidates.size else 0
+    if k <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    
+    relevance = candidates @ _normalize_rows(query_vector)[0]
+    similarity = candidates @ candidates.T
+    redundancy = np.zeros(len(candidates), dtype=np.float32)
+    available = np.ones(len(candidates), dtype=bool)
+    selected = np.empty(k, dtype=np.int64)
+    for step in range(k):
+        scores = np.where(available, lambda_mult * relevance - (1 - lambda_mult) * redundancy, -np.inf)
+        best = int(np.argmax(scores))
+        selected[step] = best
+        available[best] = False
+        redundancy = similarity[best] if step == 0 else np.maximum(redundancy, similarity[best])
+    return selected, relevance[selected]
+
+class NumpyVectorStore(VectorStore):
+    """
+    Vectorstore baseado numa matriz NumPy de embeddings normalizados
+    
+    Os embeddings são guardados num ficheiro .npy (aberto em memory-map), em float32 ou
+    quantizados (ver quantize), e os textos e metadados num ficheiro JSON. Uma pesquisa
+    top-k é um único produto matriz-vetor seguido de argpartition; várias consultas são
+    resolvidas de uma vez com um produto matriz-matriz.
+    """
+    
+    def __init__(self, embedding: Embeddings, directory: str, quantization: str = "float32",
+                 rescore: bool = True, rescore_factor: int = 4):
+        """
+        Inicializa o vectorstore, carregando o índice persistido se existir
+        
+        Args:
+            embedding: Objeto de embeddings usado para as consultas
+            directory: Diretório do índice
+            quantization: Forma dos embeddings guardados ("float32", "float16" ou "int8")
+            rescore: Se True e o índice for quantizado, guarda também os embeddings em
+                float32 e volta a pontuar os melhores candidatos com eles
+            rescore_factor: Candidatos repontuados por resultado pedido (k x fator)
+        """
+        if quantization not in QUANTIZATION_MODES:
+            raise ValueError(f"Quantização desconhecida: {quantization} (opções: {', '.join(QUANTIZATION_MODES)})")
+        self._embedding = embedding
+        self.directory = directory
+        self.quantization = quantization
+        self.rescore = rescore
+        self.rescore_factor = rescore_factor
+        self.ids: List[str] = []
+        self.texts: List[str] = []
+        self.metadatas: List[Dict[str, Any]] = []
+        self.vectors = np.zeros((0, 0), dtype=np.float32)
+        self.scales: Optional[np.ndarray] = None
+        self.full_vectors: Optional[np.ndarray] = None
+        self._scoring_vectors: Optional[np.ndarray] = None
+        self._positions: Dict[str, int] = {}
+        self._lock = threading.RLock()
+        
+        if self.exists(directory):
+            self._load()
+    
+    @staticmethod
+    def exists(directory: str) -> bool:
+        """
+        Indica se existe um índice persistido no diretório
+        
+        Args:
+            directory: Diretório do índice
+        
+        Returns:
+            True se os ficheiros do índice existirem
+        """
+        return (os.path.exists(os.path.join(directory, EMBEDDINGS_FILE)) and
+                os.path.exists(os.path.join(directory, METADATA_FILE)))
+    
+    @property
+    def embeddings(self) -> Embeddings:
+        """
+        Objeto de embeddings usado para as consultas
+        """
+        return self._embedding
+    
+    def _load(self) -> None:
+        """
+        Carrega o índice persistido (embeddings em memory-map)
+        """
+        with open(os.path.join(self.directory, METADATA_FILE), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        self.ids = data["ids"]
+        self.texts = data["texts"]
+        self.metadatas = data["metadatas"]
+        stored = data.get("quantizacao", "float32")
+        self._open_vectors()
+        self._positions = {doc_id: i for i, doc_id in enumerate(self.ids)}
+        if stored != self.quantization:
+            # Índice gravado noutra forma: converter em memória (gravado na forma nova em persist)
+            logger.info(f"Índice NumPy em {stored}: a converter para {self.quantization}")
+            self._set_vectors(self._full_matrix())
+        logger.info(f"Índice NumPy carregado de {self.directory} ({len(self.ids)} chunks, {stored})")
+    
+    def _open_vectors(self) -> None:
+        """
+        Abre os embeddings persistidos: a matriz guardada e, com repontuação, a cópia
+        float32 em memory-map; as escalas (pequenas) ficam em memória
+        """
+        scales_path = os.path.join(self.directory, SCALES_FILE)
+        full_path = os.path.join(self.directory, FULL_EMBEDDINGS_FILE)
+        self.vectors = np.load(os.path.join(self.directory, EMBEDDINGS_FILE), mmap_mode="r")
+        self.scales = np.load(scales_path) if self.vectors.dtype == np.int8 and os.path.exists(scales_path) else None
+        self.full_vectors = np.load(full_path, mmap_mode="r") \
+            if self.rescore and self.vectors.dtype != np.float32 and os.path.exists(full_path) else None
+        self._scoring_vectors = None
+    
+    def _full_matrix(self) -> np.ndarray:
+        """
+        Devolve todos os embeddings em float32: a cópia de precisão total, se existir,
+        ou a reconstrução a partir da forma quantizada
+        """
+        if self.vectors.dtype == np.float32:
+            return np.asarray(self.vectors)
+        if self.full_vectors is not None:
+            return np.asarray(self.full_vectors)
+        return dequantize(self.vectors, self.scales)
+    
+    def _rows(self, positions: np.ndarray) -> np.ndarray:
+        """
+        Devolve os embeddings float32 de algumas posições, lendo só essas linhas
+        
+        Args:
+            positions: Posições no índice (qualquer forma)
+        
+        Returns:
+            Embeddings com a forma de positions mais a dimensão
+        """
+        if self.vectors.dtype == np.float32:
+            return np.asarray(self.vectors[positions])
+        if self.full_vectors is not None:
+            return np.asarray(self.full_vectors[positions])
+        rows = np.asarray(self.vectors[positions], dtype=np.float32)
+        return rows * self.scales[positions][..., np.newaxis] if self.scales is not None else rows
+    
+    def _set_vectors(self, matrix: np.ndarray) -> None:
+        """
+        Substitui os embeddings em memória, guardando-os na forma configurada
+        
+        Args:
+            matrix: Embeddings normalizados em float32 (N x D)
+        """
+        self.vectors, self.scales = quantize(matrix, self.quantization)
+        quantized = self.quantization != "float32"
+        self.full_vectors = np.asarray(matrix, dtype=np.float32) if quantized and self.rescore else None
+        self._scoring_vectors = None
+    
+    def _scoring_matrix(self) -> np.ndarray:
+        """
+        Devolve a matriz sobre a qual a pesquisa pontua
+        
+        Em float16, converter o índice por blocos em cada consulta custa mais do que o
+        próprio produto de matrizes, pelo que a conversão para float32 é feita uma vez e
+        guardada até os embeddings mudarem; float32 e int8 usam a matriz guardada.
+        
+        Returns:
+            Matriz de embeddings (N x D)
+        """
+        if self.vectors.dtype != np.float16:
+            return self.vectors
+        if self._scoring_vectors is None:
+            self._scoring_vectors = np.asarray(self.vectors, dtype=np.float32)
+        return self._scoring_vectors
+    
+    def persist(self) -> None:
+        """
+        Grava o índice em disco de forma atómica e reabre os embeddings em memory-map
+        """
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            metadata_path = os.path.join(self.directory, METADATA_FILE)
+            files = ((EMBEDDINGS_FILE, self.vectors), (SCALES_FILE, self.scales),
+                     (FULL_EMBEDDINGS_FILE, self.full_vectors))
+            for name, array in files:
+                path = os.path.join(self.directory, name)
+                if array is None:
+                    # Não deixar ficheiros de outra forma de quantização
+                    if os.path.exists(path):
+                        os.remove(path)
+                    continue
+                np.save(path + ".tmp.npy", np.ascontiguousarray(array))
+                os.replace(path + ".tmp.npy", path)
+            with open(metadata_path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump({"ids": self.ids, "texts": self.texts, "metadatas": self.metadatas,
+                           "quantizacao": self.quantization}, f, ensure_ascii=False)
+            os.replace(metadata_path + ".tmp", metadata_path)
+            
+            self._open_vectors()
+    
+    def nbytes(self) -> int:
+        """
+        Tamanho em bytes dos embeddings usados na pesquisa (matriz pontuada e escalas),
+        sem a cópia float32 de repontuação, que fica em disco
+        """
+        matrix = self._scoring_matrix()
+        return int(matrix.nbytes + (self.scales.nbytes if self.scales is not None else 0))
+    
+    def get_ids(self) -> List[str]:
+        """
+        Devolve os identificadores dos documentos indexados
+        
+        Returns:
+            Lista de identificadores
+        """
+        return list(self.ids)
+    
+    def add_embeddings(self, ids: List[str], vectors: List[List[float]], documents: List[Document]) -> List[str]:
+        """
+        Insere ou atualiza documentos com embeddings já calculados
+        
+        Args:
+            ids: Identificadores dos documentos
+            vectors: Embeddings dos documentos
+            documents: Documentos a guardar
+        
+        Returns:
+            Lista de identificadores inseridos
+        """
+        if not ids:
+            return []
+        
+        with self._lock:
+            new_vectors = _normalize_rows(vectors)
+            matrix = np.array(self._full_matrix(), dtype=np.float32) if len(self.ids) else \
+                np.zeros((0, new_vectors.shape[1]), dtype=np.float32)
+            
+            appended = []
+            for doc_id, vector, doc in zip(ids, new_vectors, documents):
+                position = self._positions.get(doc_id)
+                if position is not None:
+                    # Identificador já indexado, ou repetido no mesmo lote (prevalece o último)
+                    if position >= len(matrix):
+                        appended[position - len(matrix)] = vector
+                    else:
+                        matrix[position] = vector
+                    self.texts[position] = doc.page_content
+                    self.metadatas[position] = dict(doc.metadata)
+                else:
+                    self._positions[doc_id] = len(self.ids)
+                    self.ids.append(doc_id)
+                    self.texts.append(doc.page_content)
+                    self.metadatas.append(dict(doc.metadata))
+                    appended.append(vector)
+            
+            if appended:
+                matrix = np.vstack([matrix, np.asarray(appended, dtype=np.float32)])
+            self._set_vectors(matrix)
+            return list(ids)
+    
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, *,
+                  ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        """
+        Gera embeddings para os textos e adiciona-os ao índice
+        
+        Args:
+            texts: Textos a adicionar
+            metadatas: Metadados de cada texto
+            ids: Identificadores de cada texto
+        
+        Returns:
+            Lista de identificadores inseridos
+        """
+        texts = list(texts)
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [hashlib.sha256(text.encode("utf-8")).hexdigest()[:16] for text in texts]
+        documents = [Document(page_content=text, metadata=metadata) for text, metadata in zip(texts, metadatas)]
+        return self.add_embeddings(ids, self._embedding.embed_documents(texts), documents)
+    
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        """
+        Remove documentos do índice
+        
+        Args:
+            ids: Identificadores a remover
+        
+        Returns:
+            True se a operação foi concluída
+        """
+        if not ids:
+            return True
+        
+        with self._lock:
+            remove = set(ids)
+            keep = [i for i, doc_id in enumerate(self.ids) if doc_id not in remove]
+            self._set_vectors(self._rows(np.asarray(keep, dtype=np.int64)) if keep else
+                              np.zeros((0, self.vectors.shape[1] if self.vectors.ndim == 2 else 0), dtype=np.float32))
+            self.ids = [self.ids[i] for i in keep]
+            self.texts = [self.texts[i] for i in keep]
+            self.metadatas = [self.metadatas[i] for i in keep]
+            self._positions = {doc_id: i for i, doc_id in enumerate(self.ids)}
+        return True
+    
+    def reindex(self, documents: List[Document],
+                embed_texts: Callable[[List[str]], List[List[float]]]) -> Dict[str, int]:
+        """
+        Sincroniza o índice com a lista atual de chunks, gerando embeddings só para o que mudou
+        
+        Args:
+            documents: Lista completa e atual de chunks (com metadado "chunk_id")
+            embed_texts: Função que gera embeddings para uma lista de textos
+        
+        Returns:
+            Dicionário com o número de chunks adicionados, reutilizados, removidos e inalterados
+        """
+        with self._lock:
+            current: Dict[str, Document] = {}
+            for doc in documents:
+                doc_id = doc.metadata.get("chunk_id") or hashlib.sha256(doc.page_content.encode("utf-8")).hexdigest()[:16]
+                current.setdefault(doc_id, doc)
+            
+            existing = set(self.ids)
+            new_ids = [doc_id for doc_id in current if doc_id not in existing]
+            stale_ids = [doc_id for doc_id in self.ids if doc_id not in current]
+            
+            # Reaproveitar embeddings de conteúdo que já está indexado
+            positions_by_text = {text: i for i, text in enumerate(self.texts)}
+            reuse_ids = [doc_id for doc_id in new_ids if current[doc_id].page_content in positions_by_text]
+            reuse_vectors = [np.array(self._rows(positions_by_text[current[doc_id].page_content]))
+                             for doc_id in reuse_ids]
+            
+            reused = set(reuse_ids)
+            to_embed = [doc_id for doc_id in new_ids if doc_id not in reused]
+            embedded = embed_texts([current[doc_id].page_content for doc_id in to_embed]) if to_embed else []
+            
+            self.delete(stale_ids)
+            self.add_embeddings(reuse_ids, reuse_vectors, [current[doc_id] for doc_id in reuse_ids])
+            self.add_embeddings(to_embed, embedded, [current[doc_id] for doc_id in to_embed])
+            
+            summary = {
+                "adicionados": len(to_embed),
+                "reutilizados": len(reuse_ids),
+                "removidos": len(stale_ids),
+                "inalterados": len(current) - len(new_ids)
+            }
+            logger.info(f"Índice NumPy reindexado: {summary}")
+            return summary
+    
+    def _document(self, position: int) -> Document:
+        """
+        Constrói o documento guardado numa posição do índice
+        
+        Args:
+            position: Posição no índice
+        
+        Returns:
+            Documento correspondente
+        """
+        return Document(page_content=self.texts[position], metadata=dict(self.metadatas[position]))
+    
+    def search_vectors(self, vectors, k: int) -> List[List[Tuple[Document, float]]]:
+        """
+        Pesquisa os k documentos mais semelhantes para uma ou várias consultas de uma só vez
+        
+        Args:
+            vectors: Embeddings das consultas (M x D)
+            k: Número de documentos por consulta
+        
+        Returns:
+            Para cada consulta, lista de tuplas (documento, similaridade de cosseno)
+        """
+        queries = _normalize_rows(vectors)
+        with self._lock:
+            if not self.ids:
+                return [[] for _ in range(len(queries))]
+            indices, scores = self._search(queries, k)
+            return [
+                [(self._document(int(i)), float(score)) for i, score in zip(indices[row], scores[row])]
+                for row in range(len(queries))
+            ]
+    
+    def _search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Encontra os k vetores mais semelhantes a cada consulta
+        
+        Num índice quantizado com repontuação, os k x rescore_factor melhores candidatos
+        pela forma quantizada são pontuados de novo com os embeddings float32.
+        
+        Args:
+            queries: Consultas normalizadas (M x D)
+            k: Número de resultados por consulta
+        
+        Returns:
+            Tupla (posições M x k, similaridades de cosseno M x k)
+        """
+        scores = quantized_scores(queries, self._scoring_matrix(), self.scales)
+        if self.full_vectors is None or not self.rescore:
+            indices = top_k(scores, k)
+            return indices, np.take_along_axis(scores, indices, axis=1)
+        
+        candidates = top_k(scores, k * self.rescore_factor)
+        exact = np.einsum("mkd,md->mk", self._rows(candidates), queries)
+        order = top_k(exact, k)
+        return np.take_along_axis(candidates, order, axis=1), np.take_along_axis(exact, order, axis=1)
+    
+    def similarity_search_by_vector_with_score(self, embedding: List[float], k: int = 4) -> List[Tuple[Document, float]]:
+        """
+        Pesquisa os k documentos mais semelhantes a um embedding
+        
+        Args:
+            embedding: Embedding da consulta
+            k: Número de documentos
+        
+        Returns:
+            Lista de tuplas (documento, similaridade de cosseno)
+        """
+        return self.search_vectors([embedding], k)[0]
+    
+    def similarity_search_with_vectors(self, embedding: List[float], k: int = 4) -> List[Tuple[Document, float, np.ndarray]]:
+        """
+        Pesquisa os k documentos mais semelhantes a um embedding, com os seus embeddings
+        
+        Args:
+            embedding: Embedding da consulta
+            k: Número de documentos
+        
+        Returns:
+            Lista de tuplas (documento, similaridade de cosseno, embedding float32)
+        """
+        query = _normalize_rows(embedding)
+        with self._lock:
+            if not self.ids:
+                return []
+            indices, scores = self._search(query, k)
+            vectors = self._rows(indices[0])
+            return [(self._document(int(i)), float(score), vector)
+                    for i, score, vector in zip(indices[0], scores[0], vectors)]
+    
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        """
+        Pesquisa os k documentos mais semelhantes a um embedding (sem pontuações)
+        """
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k)]
+    
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        """
+        Pesquisa os k documentos mais semelhantes a uma consulta, com a similaridade de cosseno
+        """
+        return self.similarity_search_by_vector_with_score(self._embedding.embed_query(query), k)
+    
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        """
+        Pesquisa os k documentos mais semelhantes a uma consulta
+        """
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
+    
+    def similarity_search_batch(self, queries: List[str], k: int = 4) -> List[List[Document]]:
+        """
+        Pesquisa várias consultas com um único pedido de embeddings e um único produto de matrizes
+        
+        Args:
+            queries: Consultas
+            k: Número de documentos por consulta
+        
+        Returns:
+            Lista de documentos por consulta
+        """
+        if not queries:
+            return []
+        results = self.search_vectors(self._embedding.embed_documents(queries), k)
+        return [[doc for doc, _ in hits] for hits in results]
+    
+    def max_marginal_relevance_search_with_score_by_vector(self, embedding: List[float], k: int = 4,
+                                                           fetch_k: int = 20,
+                                                           lambda_mult: float = 0.5) -> List[Tuple[Document, float]]:
+        """
+        Pesquisa os fetch_k documentos mais semelhantes e escolhe k diversos por MMR
+        
+        Os embeddings dos candidatos são lidos diretamente do índice (em float32).
+        
+        Args:
+            embedding: Embedding da consulta
+            k: Número de documentos
+            fetch_k: Candidatos considerados
+            lambda_mult: Peso da relevância (1 = só relevância, 0 = só diversidade)
+        
+        Returns:
+            Lista de tuplas (documento, similaridade de cosseno), por ordem de escolha
+        """
+        query = _normalize_rows(embedding)
+        with self._lock:
+            if not self.ids:
+                return []
+            candidates = self._search(query, max(k, fetch_k))[0][0]
+            selected, scores = maximal_marginal_relevance(query[0], self._rows(candidates), k, lambda_mult)
+            return [(self._document(int(candidates[i])), float(score)) for i, score in zip(selected, scores)]
+    
+    def max_marginal_relevance_search_by_vector(self, embedding: List[float], k: int = 4, fetch_k: int = 20,
+                                                lambda_mult: float = 0.5, **kwargs: Any) -> List[Document]:
+        """
+        Pesquisa k documentos relevantes e diversos para um embedding (sem pontuações)
+        """
+        return [doc for doc, _ in self.max_marginal_relevance_search_with_score_by_vector(
+            embedding, k, fetch_k, lambda_mult)]
+    
+    def max_marginal_relevance_search(self, query: str, k: int = 4, fetch_k: int = 20,
+                                      lambda_mult: float = 0.5, **kwargs: Any) -> List[Document]:
+        """
+        Pesquisa k documentos relevantes e diversos para uma consulta
+        """
+        return self.max_marginal_relevance_search_by_vector(self._embedding.embed_query(query), k,
+                                                            fetch_k, lambda_mult)
+    
+    def _select_relevance_score_fn(self) -> Callable[[float], float]:
+        """
+        As pontuações já são similaridades de cosseno, usadas diretamente como relevância
+        """
+        return lambda score: score
+    
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None, *,
+                   ids: Optional[List[str]] = None, directory: str = "", **kwargs: Any) -> "NumpyVectorStore":
+        """
+        Cria um índice a partir de textos
+        
+        Args:
+            texts: Textos a indexar
+            embedding: Objeto de embeddings
+            metadatas: Metadados de cada texto
+            ids: Identificadores de cada texto
+            directory: Diretório do índice
+        
+        Returns:
+            Vectorstore criado
+        """
+        store = cls(embedding, directory)
+        store.add_texts(texts, metadatas, ids=ids)
+        if directory:
+            store.persist()
+        return store
+
+def quantization_report(vectors: np.ndarray, queries: np.ndarray, k: int = 4,
+                        modes: Iterable[str] = QUANTIZATION_MODES,
+                        rescore_factor: int = 4) -> Dict[str, Dict[str, float]]:
+    """
+    Compara as formas quantizadas do índice com a pesquisa exata em float32
+    
+    Para cada forma (com e sem repontuação), constrói um índice em memória com os mesmos
+    embeddings e mede o recall@k face ao top-k exato, a latência de cada consulta e o
+    tamanho da matriz usada na pesquisa.
+    
+    Args:
+        vectors: Embeddings indexados (N x D)
+        queries: Embeddings das consultas (M x D)
+        k: Número de resultados por consulta
+        modes: Formas a comparar
+        rescore_factor: Candidatos repontuados por resultado pedido
+    
+    Returns:
+        Dicionário por configuração com "recall", "p50_ms", "p95_ms" e "bytes"
+    """
+    queries = _normalize_rows(queries)
+    exact = top_k(queries @ _normalize_rows(vectors).T, k)
+    ids = [str(i) for i in range(len(vectors))]
+    documents = [Document(page_content="") for _ in ids]
+    
+    report: Dict[str, Dict[str, float]] = {}
+    for mode in modes:
+        for rescore in ((False,) if mode == "float32" else (False, True)):
+            store = NumpyVectorStore(None, "", quantization=mode, rescore=rescore, rescore_factor=rescore_factor)
+            store.add_embeddings(ids, vectors, documents)
+            found, samples = [], []
+            for query in queries:
+                start = time.perf_counter()
+                found.append(store._search(query[np.newaxis, :], k)[0][0])
+                samples.append(time.perf_counter() - start)
+            hits = [len(set(row.tolist()) & set(expected.tolist())) for row, expected in zip(found, exact)]
+            latencies = np.asarray(samples) * 1000
+            report[f"{mode}+repontuação" if rescore else mode] = {
+                "recall": float(np.sum(hits) / (len(queries) * min(k, len(vectors)))),
+                "p50_ms": float(np.percentile(latencies, 50)),
+                "p95_ms": float(np.percentile(latencies, 95)),
+                "bytes": store.nbytes()
+            }
+    return report
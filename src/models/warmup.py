@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Aquecimento e manutenção em memória dos modelos do Ollama
+
+Depois de um reinício, ou de OLLAMA_KEEP_ALIVE sem pedidos, o Ollama descarrega os
+modelos e a primeira pergunta paga o carregamento do llama3 e do nomic-embed-text.
+warm_up_models carrega os dois no arranque com um pedido mínimo, e start_keep_alive
+volta a enviar esse pedido a cada modelo que fique KEEP_ALIVE_REFRESH_INTERVAL sem uso,
+para que nunca chegue a ser descarregado enquanto o serviço está parado.
+record_query_latency guarda a latência da primeira consulta real do processo e se o
+llama3 já estava carregado quando ela começou.
+"""
+
+import time
+import logging
+import threading
+from typing import Dict, Any, Optional
+
+from ollama import Client
+
+from src.config.settings import (
+    OLLAMA_BASE_URL,
+    OLLAMA_MODEL,
+    OLLAMA_EMBEDDINGS_MODEL,
+    OLLAMA_NUM_CTX,
+    OLLAMA_NUM_THREAD,
+    OLLAMA_NUM_GPU,
+    OLLAMA_KEEP_ALIVE,
+    MODEL_WARMUP,
+    KEEP_ALIVE_REFRESH_INTERVAL,
+    COLD_LOAD_THRESHOLD
+)
+from src.models.clients import create_ollama_client
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Último uso de cada modelo (time.monotonic), atualizado pelos pedidos reais e pelos refrescamentos
+_last_use: Dict[str, float] = {}
+_last_use_lock = threading.Lock()
+_keep_alive_thread: Optional[threading.Thread] = None
+_warmup_report: Optional[Dict[str, Dict[str, Any]]] = None
+_first_query: Optional[Dict[str, Any]] = None
+_warmup_lock = threading.Lock()
+
+def record_model_use(model: str) -> None:
+    """
+    Regista que um modelo acabou de receber um pedido (e por isso continua carregado)
+    
+    Args:
+        model: Nome do modelo
+    """
+    with _last_use_lock:
+        _last_use[model] = time.monotonic()
+
+def _idle_seconds(model: str) -> float:
+    with _last_use_lock:
+        last = _last_use.get(model)
+    return float("inf") if last is None else time.monotonic() - last
+
+def model_is_loaded(model: str, keep_alive: Any = OLLAMA_KEEP_ALIVE) -> bool:
+    """
+    Indica se um modelo deve estar em memória no Ollama, pelo tempo desde o último pedido
+    
+    Args:
+        model: Nome do modelo
+        keep_alive: Segundos que o Ollama mantém o modelo após o último pedido (-1 = sempre)
+    
+    Returns:
+        True se o modelo recebeu um pedido há menos de keep_alive segundos
+    """
+    idle = _idle_seconds(model)
+    return idle != float("inf") and (keep_alive < 0 or idle < keep_alive)
+
+def record_query_latency(seconds: float, cold: bool) -> None:
+    """
+    Regista a latência da primeira consulta real do processo (as seguintes são ignoradas)
+    
+    Args:
+        seconds: Duração da consulta
+        cold: Se o llama3 não estava carregado quando a consulta começou
+    """
+    global _first_query
+    with _warmup_lock:
+        if _first_query is not None:
+            return
+        _first_query = {"tempo": seconds, "frio": cold}
+    logger.info(f"Primeira consulta processada em {seconds:.2f}s "
+                f"({'modelo frio' if cold else 'modelo já carregado'})")
+
+def get_first_query() -> Optional[Dict[str, Any]]:
+    """
+    Devolve a latência da primeira consulta real (None se ainda não houve nenhuma)
+    
+    Returns:
+        Dicionário com o tempo da consulta, em segundos, e se o modelo estava frio
+    """
+    with _warmup_lock:
+        return dict(_first_query) if _first_query is not None else None
+
+def _load_options() -> Dict[str, Any]:
+    """
+    Opções que determinam como o llama3 é carregado; têm de ser iguais às de create_llm,
+    caso contrário o Ollama volta a carregar o modelo no primeiro pedido real
+    """
+    return {"num_ctx": OLLAMA_NUM_CTX, "num_thread": OLLAMA_NUM_THREAD, "num_gpu": OLLAMA_NUM_GPU}
+
+def preload_model(client: Client, model: str, keep_alive: Any = OLLAMA_KEEP_ALIVE) -> Dict[str, float]:
+    """
+    Envia um pedido mínimo a um modelo, carregando-o se necessário
+    
+    O llama3 recebe um prompt vazio (o Ollama só carrega o modelo, sem gerar) e o
+    modelo de embeddings uma palavra.
+    
+    Args:
+        client: Cliente do Ollama
+        model: Nome do modelo
+        keep_alive: Tempo que o modelo deve ficar em memória após o pedido
+    
+    Returns:
+        Dicionário com a duração do pedido e o tempo de carregamento do modelo, em segundos
+    """
+    start = time.perf_counter()
+    if model == OLLAMA_EMBEDDINGS_MODEL:
+        response = client.embed(model=model, input="aquecimento", keep_alive=keep_alive)
+    else:
+        response = client.generate(model=model, prompt="", options=_load_options(), keep_alive=keep_alive)
+    record_model_use(model)
+    return {"tempo": time.perf_counter() - start, "carga": (response.load_duration or 0) / 1e9}
+
+def warm_up_models(base_url: str = OLLAMA_BASE_URL, keep_alive: Any = OLLAMA_KEEP_ALIVE) -> Dict[str, Dict[str, Any]]:
+    """
+    Carrega o llama3 e o nomic-embed-text e mede a latência do carregamento
+    
+    Cada modelo recebe um pedido mínimo, que inclui o carregamento se o modelo não
+    estava em memória. A latência com o modelo quente é a da primeira consulta real
+    (ver record_query_latency). Falhas são registadas no log sem interromper o arranque.
+    
+    Args:
+        base_url: Endereço do servidor Ollama
+        keep_alive: Tempo que os modelos devem ficar em memória
+    
+    Returns:
+        Relatório por modelo: primeiro pedido e carregamento (segundos), se o modelo
+        estava frio, ou o erro
+    """
+    global _warmup_report
+    client = create_ollama_client(base_url)
+    relatorio: Dict[str, Dict[str, Any]] = {}
+    for model in (OLLAMA_MODEL, OLLAMA_EMBEDDINGS_MODEL):
+        try:
+            primeiro = preload_model(client, model, keep_alive)
+            frio = primeiro["carga"] >= COLD_LOAD_THRESHOLD
+            relatorio[model] = {
+                "primeiro_pedido": primeiro["tempo"],
+                "carga": primeiro["carga"],
+                "frio": frio
+            }
+            estado = f"frio, carga {primeiro['carga']:.2f}s" if frio else "já estava carregado"
+            logger.info(f"Modelo {model} aquecido: primeiro pedido {primeiro['tempo']:.2f}s ({estado})")
+        except Exception as e:
+            logger.warning(f"Não foi possível aquecer o modelo {model}: {str(e)}")
+            relatorio[model] = {"erro": str(e)}
+    with _warmup_lock:
+        _warmup_report = relatorio
+    return relatorio
+
+def get_warmup_report() -> Optional[Dict[str, Dict[str, Any]]]:
+    """
+    Devolve o relatório do último aquecimento (None se ainda não houve nenhum)
+    """
+    with _warmup_lock:
+        return _warmup_report
+
+def start_keep_alive(interval: Optional[float] = KEEP_ALIVE_REFRESH_INTERVAL,
+                     base_url: str = OLLAMA_BASE_URL, keep_alive: Any = OLLAMA_KEEP_ALIVE) -> None:
+    """
+    Refresca periodicamente os modelos sem uso, numa thread de fundo
+    
+    A cada intervalo, cada modelo sem pedidos há pelo menos `interval` segundos recebe
+    um pedido mínimo, que renova o seu keep_alive. O intervalo deve ser inferior a
+    metade de OLLAMA_KEEP_ALIVE.
+    
+    Args:
+        interval: Segundos sem uso após os quais um modelo é refrescado (None desativa)
+        base_url: Endereço do servidor Ollama
+        keep_alive: Tempo que os modelos devem ficar em memória
+    """
+    global _keep_alive_thread
+    if not interval:
+        return
+    with _warmup_lock:
+        if _keep_alive_thread is not None:
+            return
+        
+        def run():
+            client = create_ollama_client(base_url)
+            while True:
+                time.sleep(interval)
+                for model in (OLLAMA_MODEL, OLLAMA_EMBEDDINGS_MODEL):
+                    if _idle_seconds(model) < interval:
+                        continue
+                    try:
+                        resultado = preload_model(client, model, keep_alive)
+                        logger.debug(f"Modelo {model} refrescado em {resultado['tempo']:.3f}s")
+                        if resultado["carga"] >= COLD_LOAD_THRESHOLD:
+                            logger.info(f"Modelo {model} tinha sido descarregado e foi recarregado "
+                                        f"({resultado['carga']:.2f}s)")
+                    except Exception as e:
+                        logger.warning(f"Não foi possível refrescar o modelo {model}: {str(e)}")
+        
+        _keep_alive_thread = threading.Thread(target=run, name="ollama-keep-alive", daemon=True)
+        _keep_alive_thread.start()
+        logger.info(f"Keep-alive dos modelos ativo (refresca após {interval}s sem uso)")
+
+def warm_up_and_keep_alive(enabled: bool = MODEL_WARMUP) -> Optional[Dict[str, Dict[str, Any]]]:
+    """
+    Gancho de arranque: aquece os modelos e inicia o keep-alive periódico
+    
+    Args:
+        enabled: Se False, não faz nada
+    
+    Returns:
+        Relatório do aquecimento (ver warm_up_models), ou None se desativado
+    """
+    if not enabled:
+        return None
+    relatorio = warm_up_models()
+    start_keep_alive()
+    return relatorio
@@ -5,9 +5,22 @@
 Utilitários para cache e otimização de performance
 """
 
+import os
+import re
+import sys
 import time
+import array
+import heapq
+import itertools
+import sqlite3
+import hashlib
 import logging
-from typing import Dict, Any, Callable
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -15,20 +28,37 @@ logger = logging.getLogger(__name__)
 
 class SimpleCache:
     """
-    Implementação simples de cache com TTL (Time To Live)
+    Cache LRU com TTL (Time To Live), limitado em número de entradas e em memória
+    
+    As entradas são mantidas por ordem de utilização (remoção LRU em O(1)) e os prazos
+    de expiração num heap, de onde as entradas expiradas são removidas em cada operação,
+    sem esperar que a mesma chave volte a ser lida. Todas as operações são protegidas
+    por um lock, pelo que o cache pode ser partilhado entre threads.
     """
     
-    def __init__(self, ttl: int = 1800):
+    def __init__(self, ttl: int = 1800, max_entries: int = 256, max_bytes: int = 32 * 1024 * 1024):
         """
         Inicializa o cache
         
         Args:
             ttl: Tempo de vida das entradas em segundos (padrão: 30 minutos)
+            max_entries: Número máximo de entradas
+            max_bytes: Tamanho máximo estimado do conteúdo do cache, em bytes
         """
-        self.cache = {}
-        self.timestamps = {}
         self.ttl = ttl
-        logger.info(f"Cache inicializado com TTL de {ttl} segundos")
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.cache: "OrderedDict[str, Tuple[Any, int, float]]" = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._deadlines: List[Tuple[float, int, str]] = []
+        self._sequence = itertools.count()
+        self._lock = threading.RLock()
+        logger.info(f"Cache inicializado com TTL de {ttl} segundos "
+                    f"(máximo {max_entries} entradas, {max_bytes} bytes)")
     
     def get(self, key: str) -> Any:
         """
@@ -40,30 +70,66 @@ class SimpleCache:
         Returns:
             Valor armazenado ou None se não existir ou estiver expirado
         """
-        if key in self.cache:
-            # Verificar se o item expirou
-            if time.time() - self.timestamps[key] > self.ttl:
-                logger.debug(f"Item expirado no cache: {key}")
-                self._remove(key)
+        with self._lock:
+            self._purge_expired()
+            entry = self.cache.get(key)
+            if entry is None:
+                self.misses += 1
+                logger.debug(f"Cache miss: {key}")
                 return None
             
+            self.cache.move_to_end(key)
+            self.hits += 1
             logger.debug(f"Cache hit: {key}")
-            return self.cache[key]
-        
-        logger.debug(f"Cache miss: {key}")
-        return None
+            return entry[0]
     
     def set(self, key: str, value: Any) -> None:
         """
-        Armazena um valor no cache
+        Armazena um valor no cache, removendo as entradas menos usadas se os limites forem excedidos
         
         Args:
             key: Chave para armazenar
             value: Valor a ser armazenado
         """
-        self.cache[key] = value
-        self.timestamps[key] = time.time()
-        logger.debug(f"Item adicionado ao cache: {key}")
+        size = estimate_size(value)
+        with self._lock:
+            self._purge_expired()
+            if size > self.max_bytes:
+                logger.debug(f"Item demasiado grande para o cache ({size} bytes): {key}")
+                self._remove(key)
+                return
+            
+            self._remove(key)
+            deadline = time.time() + self.ttl
+            self.cache[key] = (value, size, deadline)
+            self.bytes += size
+            heapq.heappush(self._deadlines, (deadline, next(self._sequence), key))
+            
+            while len(self.cache) > self.max_entries or self.bytes > self.max_bytes:
+                oldest_key = next(iter(self.cache))
+                self._remove(oldest_key)
+                self.evictions += 1
+                logger.debug(f"Item removido por LRU: {oldest_key}")
+            
+            # Evitar que o heap acumule prazos de chaves já substituídas ou removidas
+            if len(self._deadlines) > 2 * len(self.cache) + 64:
+                self._deadlines = [(entry[2], next(self._sequence), k) for k, entry in self.cache.items()]
+                heapq.heapify(self._deadlines)
+            logger.debug(f"Item adicionado ao cache: {key}")
+    
+    def _purge_expired(self) -> None:
+        """
+        Remove todas as entradas cujo prazo já passou, a partir do heap de prazos
+        """
+        now = time.time()
+        while self._deadlines and self._deadlines[0][0] <= now:
+            deadline, _, key = heapq.heappop(self._deadlines)
+            entry = self.cache.get(key)
+            # Ignorar prazos antigos de chaves entretanto atualizadas
+            if entry is not None and entry[2] == deadline:
+                self._remove(key)
+                self.expirations += 1
+                logger.debug(f"Item expirado no cache: {key}")
     
     def _remove(self, key: str) -> None:
         """
@@ -72,48 +138,348 @@ class SimpleCache:
         Args:
             key: Chave a ser removida
         """
-        if key in self.cache:
-            del self.cache[key]
-            del self.timestamps[key]
-            logger.debug(f"Item removido do cache: {key}")
+        with self._lock:
+            entry = self.cache.pop(key, None)
+            if entry is not None:
+                self.bytes -= entry[1]
+                logger.debug(f"Item removido do cache: {key}")
+    
+    def purge_expired(self) -> None:
+        """
+        Remove as entradas expiradas (útil para chamadas periódicas em processos inativos)
+        """
+        with self._lock:
+            self._purge_expired()
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        Devolve as estatísticas de utilização do cache
+        
+        Returns:
+            Dicionário com hits, misses, remoções, expirações e tamanho
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / total if total else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "size": len(self.cache),
+                "bytes": self.bytes
+            }
     
     def clear(self) -> None:
         """
         Limpa todo o cache
         """
-        self.cache = {}
-        self.timestamps = {}
+        with self._lock:
+            self.cache = OrderedDict()
+            self._deadlines = []
+            self.bytes = 0
         logger.info("Cache limpo")
 
-def normalize_query(query: str) -> str:
+def estimate_size(value: Any, _depth: int = 0) -> int:
     """
-    Normaliza uma consulta para melhorar hits de cache
+    Estima o tamanho em memória de um valor, percorrendo dicionários, listas e documentos
     
     Args:
-        query: Consulta original
+        value: Valor a medir
         
     Returns:
-        Consulta normalizada
+        Tamanho aproximado em bytes
     """
-    # Remover espaços extras e converter para minúsculas
-    return query.lower().strip()
+    size = sys.getsizeof(value)
+    if _depth > 4:
+        return size
+    if isinstance(value, dict):
+        size += sum(estimate_size(k, _depth + 1) + estimate_size(v, _depth + 1) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set)):
+        size += sum(estimate_size(item, _depth + 1) for item in value)
+    elif hasattr(value, "page_content"):
+        # Documentos LangChain: contar o texto e os metadados
+        size += estimate_size(value.page_content, _depth + 1) + estimate_size(getattr(value, "metadata", {}), _depth + 1)
+    return size
+
+class EmbeddingCache:
+    """
+    Cache de embeddings de consultas com uma camada LRU em memória
+    e uma camada opcional persistida em disco (SQLite)
+    """
+    
+    def __init__(self, max_entries: int = 1024, path: Optional[str] = None):
+        """
+        Inicializa o cache
+        
+        Args:
+            max_entries: Número máximo de embeddings mantidos em memória
+            path: Caminho do ficheiro SQLite para a camada em disco (None desativa)
+        """
+        self.max_entries = max_entries
+        self.path = path
+        self.memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = None
+        
+        if path:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+            )
+            self._db.commit()
+        logger.info(f"Cache de embeddings inicializado (memória: {max_entries}, disco: {path or 'desativado'})")
+    
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        """
+        Gera a chave do cache a partir do modelo e do texto normalizado
+        
+        Args:
+            model: Nome do modelo de embeddings
+            text: Texto da consulta
+            
+        Returns:
+            Chave do cache
+        """
+        return hashlib.sha256(f"{model}\0{normalize_query(text)}".encode("utf-8")).hexdigest()
+    
+    def get(self, key: str) -> Optional[List[float]]:
+        """
+        Recupera um embedding do cache, procurando primeiro em memória e depois em disco
+        
+        Args:
+            key: Chave gerada por make_key
+            
+        Returns:
+            Embedding armazenado ou None se não existir
+        """
+        with self._lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                self.hits += 1
+                return self.memory[key]
+            
+            if self._db is not None:
+                row = self._db.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    vector = array.array("f", row[0]).tolist()
+                    self._store_in_memory(key, vector)
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return vector
+            
+            self.misses += 1
+            return None
+    
+    def set(self, key: str, vector: List[float]) -> None:
+        """
+        Armazena um embedding no cache (memória e, se ativo, disco)
+        
+        Args:
+            key: Chave gerada por make_key
+            vector: Embedding a armazenar
+        """
+        with self._lock:
+            self._store_in_memory(key, vector)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                    (key, array.array("f", vector).tobytes())
+                )
+                self._db.commit()
+    
+    def _store_in_memory(self, key: str, vector: List[float]) -> None:
+        """
+        Armazena um embedding na camada em memória, removendo o menos usado se necessário
+        
+        Args:
+            key: Chave do embedding
+            vector: Embedding a armazenar
+        """
+        self.memory[key] = vector
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        Devolve as estatísticas de utilização do cache
+        
+        Returns:
+            Dicionário com hits, misses, taxa de acerto e tamanho
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / total if total else 0.0,
+                "size": len(self.memory)
+            }
+    
+    def clear(self) -> None:
+        """
+        Limpa todo o cache (memória e disco)
+        """
+        with self._lock:
+            self.memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM embeddings")
+                self._db.commit()
+        logger.info("Cache de embeddings limpo")
 
-def timed_execution(func: Callable, *args, **kwargs) -> Dict[str, Any]:
+class SemanticCache:
+    """
+    Cache de respostas pesquisado por similaridade de cosseno entre embeddings de consultas
+    
+    Os embeddings (normalizados) das consultas guardadas formam uma matriz em memória,
+    pelo que cada pesquisa é um único produto matriz-vetor. Quando o cache está cheio,
+    a entrada mais antiga é substituída. Cada entrada pertence a um espaço (por exemplo,
+    o modelo, o prompt e a versão do índice, ver get_cache_namespace) e só é devolvida
+    a pesquisas do mesmo espaço, pelo que as respostas anteriores a uma reindexação
+    deixam de ser servidas.
     """
-    Executa uma função e mede o tempo de execução
+    
+    def __init__(self, threshold: float = 0.92, max_entries: int = 512, ttl: int = 1800):
+        """
+        Inicializa o cache
+        
+        Args:
+            threshold: Similaridade de cosseno mínima para considerar um hit
+            max_entries: Número máximo de respostas guardadas
+            ttl: Tempo de vida das entradas em segundos
+        """
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.vectors: Optional[np.ndarray] = None
+        self.timestamps = np.zeros(max_entries, dtype=np.float64)
+        self.values: List[Any] = [None] * max_entries
+        self.namespaces: List[Optional[str]] = [None] * max_entries
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._next = 0
+        self._lock = threading.Lock()
+        logger.info(f"Cache semântico inicializado (limiar={threshold}, máximo={max_entries} entradas)")
+    
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        """
+        Converte um embedding num vetor float32 de norma unitária
+        
+        Args:
+            vector: Embedding a normalizar
+            
+        Returns:
+            Vetor normalizado
+        """
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+    
+    def get(self, vector, namespace: str = "") -> Optional[Tuple[Any, float]]:
+        """
+        Procura a resposta guardada mais semelhante a um embedding de consulta
+        
+        Args:
+            vector: Embedding da consulta
+            namespace: Espaço das entradas consideradas
+            
+        Returns:
+            Tupla (valor, similaridade) ou None se nenhuma entrada válida atingir o limiar
+        """
+        query = self._normalize(vector)
+        with self._lock:
+            if self.size == 0:
+                self.misses += 1
+                return None
+            
+            similarities = self.vectors[:self.size] @ query
+            expired = time.time() - self.timestamps[:self.size] > self.ttl
+            similarities[expired] = -np.inf
+            other = np.fromiter((entry != namespace for entry in self.namespaces[:self.size]),
+                                dtype=bool, count=self.size)
+            similarities[other] = -np.inf
+            
+            best = int(np.argmax(similarities))
+            score = float(similarities[best])
+            if score >= self.threshold:
+                self.hits += 1
+                logger.debug(f"Cache semântico hit (similaridade={score:.3f})")
+                return self.values[best], score
+            
+            self.misses += 1
+            return None
+    
+    def set(self, vector, value: Any, namespace: str = "") -> None:
+        """
+        Guarda uma resposta associada ao embedding da consulta
+        
+        Args:
+            vector: Embedding da consulta
+            value: Valor a guardar
+            namespace: Espaço da entrada
+        """
+        query = self._normalize(vector)
+        with self._lock:
+            if self.vectors is None:
+                self.vectors = np.zeros((self.max_entries, query.shape[0]), dtype=np.float32)
+            
+            index = self._next
+            self.vectors[index] = query
+            self.timestamps[index] = time.time()
+            self.values[index] = value
+            self.namespaces[index] = namespace
+            self._next = (index + 1) % self.max_entries
+            self.size = min(self.size + 1, self.max_entries)
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        Devolve as estatísticas de utilização do cache
+        
+        Returns:
+            Dicionário com hits, misses, taxa de acerto e tamanho
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / total if total else 0.0,
+                "size": self.size
+            }
+    
+    def clear(self) -> None:
+        """
+        Limpa todo o cache
+        """
+        with self._lock:
+            self.vectors = None
+            self.timestamps[:] = 0
+            self.values = [None] * self.max_entries
+            self.namespaces = [None] * self.max_entries
+            self.size = 0
+            self._next = 0
+        logger.info("Cache semântico limpo")
+
+def normalize_query(query: str) -> str:
+    """
+    Normaliza uma consulta para melhorar hits de cache
     
     Args:
-        func: Função a ser executada
-        *args, **kwargs: Argumentos para a função
+        query: Consulta original
         
     Returns:
-        Dicionário com o resultado e o tempo de execução
+        Consulta normalizada
     """
-    start_time = time.time()
-    result = func(*args, **kwargs)
-    execution_time = time.time() - start_time
-    
-    return {
-        "result": result,
-        "execution_time": execution_time
-    }
+    # Unificar a representação Unicode (acentos compostos vs. decompostos)
+    query = unicodedata.normalize("NFC", query)
+    # Remover espaços extras e converter para minúsculas
+    return re.sub(r"\s+", " ", query).lower().strip()
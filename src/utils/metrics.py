@@ -0,0 +1,415 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Métricas de desempenho do pipeline RAG (histogramas, contadores e gauges)
+
+As métricas são exportadas no formato de texto do Prometheus (render, endpoint /metrics
+do serviço HTTP ou start_metrics_server) e resumidas periodicamente no log
+(start_log_summary).
+"""
+
+import time
+import logging
+import threading
+import weakref
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, List, Optional, Tuple, Iterator
+
+import numpy as np
+
+from src.config.settings import COLD_LOAD_THRESHOLD, METRICS_HOST
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Limites dos buckets, em segundos, adequados a latências entre 1 ms e 1 minuto
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+THROUGHPUT_BUCKETS = (1, 2, 5, 10, 15, 20, 30, 40, 60, 80, 100, 150, 200)
+TOKEN_BUCKETS = (64, 128, 256, 384, 512, 768, 1024, 1536, 2048, 4096)
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    """
+    Formata etiquetas no formato do Prometheus
+    
+    Args:
+        labels: Pares (nome, valor)
+    
+    Returns:
+        Texto como {nome="valor"} (vazio se não houver etiquetas)
+    """
+    if not labels:
+        return ""
+    escaped = []
+    for name, value in labels:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"')
+        escaped.append(f'{name}="{value}"')
+    return "{" + ",".join(escaped) + "}"
+
+class Histogram:
+    """
+    Histograma com buckets cumulativos, seguro para várias threads
+    
+    Além dos buckets, guarda as observações mais recentes para o resumo no log (p50/p95).
+    """
+    
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...] = LATENCY_BUCKETS,
+                 window: int = 1024):
+        """
+        Inicializa o histograma
+        
+        Args:
+            name: Nome da métrica
+            help_text: Descrição da métrica
+            buckets: Limites superiores dos buckets, por ordem crescente
+            window: Número de observações recentes mantidas para os percentis
+        """
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.recent = deque(maxlen=window)
+        self.lock = threading.Lock()
+    
+    def observe(self, value: float) -> None:
+        """
+        Regista uma observação
+        
+        Args:
+            value: Valor observado
+        """
+        with self.lock:
+            self.counts[bisect_left(self.buckets, value)] += 1
+            self.sum += value
+            self.count += 1
+            self.recent.append(value)
+    
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        """
+        Mede a duração do bloco e regista-a em segundos
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+    
+    def render(self) -> List[str]:
+        """
+        Linhas no formato de texto do Prometheus
+        """
+        with self.lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            lines.append(f'{self.name}_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {count}')
+        lines.append(f"{self.name}_sum {total}")
+        lines.append(f"{self.name}_count {count}")
+        return lines
+    
+    def summary(self) -> Optional[Dict[str, float]]:
+        """
+        Resumo das observações recentes
+        
+        Returns:
+            Dicionário com contagem total, p50 e p95 recentes, ou None sem observações
+        """
+        with self.lock:
+            if not self.recent:
+                return None
+            values = np.fromiter(self.recent, dtype=np.float64)
+            count = self.count
+        return {"count": count, "p50": float(np.percentile(values, 50)), "p95": float(np.percentile(values, 95))}
+
+class Counter:
+    """
+    Contador monótono, opcionalmente com etiquetas
+    """
+    
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self.values: Dict[Tuple[Tuple[str, str], ...], float] = {}
+        self.lock = threading.Lock()
+    
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        """
+        Incrementa o contador
+        
+        Args:
+            amount: Valor a somar
+            **labels: Etiquetas da série
+        """
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+    
+    def render(self) -> List[str]:
+        with self.lock:
+            values = dict(self.values)
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        lines.extend(f"{self.name}{_format_labels(key)} {value}" for key, value in values.items())
+        return lines
+
+class Gauge:
+    """
+    Valor instantâneo (por exemplo, consultas em curso)
+    """
+    
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self.value = 0.0
+        self.lock = threading.Lock()
+    
+    def inc(self, amount: float = 1) -> None:
+        with self.lock:
+            self.value += amount
+    
+    def dec(self, amount: float = 1) -> None:
+        with self.lock:
+            self.value -= amount
+    
+    @contextmanager
+    def track(self) -> Iterator[None]:
+        """
+        Incrementa o gauge durante o bloco
+        """
+        self.inc()
+        try:
+            yield
+        finally:
+            self.dec()
+    
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge",
+                f"{self.name} {self.value}"]
+
+class MetricsRegistry:
+    """
+    Conjunto das métricas do processo e dos caches cujas estatísticas são exportadas
+    """
+    
+    def __init__(self):
+        self.metrics: List[Any] = []
+        self.caches: Dict[str, "weakref.WeakSet"] = {}
+        self.lock = threading.Lock()
+    
+    def histogram(self, name: str, help_text: str, buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, help_text, buckets)
+        self.metrics.append(metric)
+        return metric
+    
+    def counter(self, name: str, help_text: str) -> Counter:
+        metric = Counter(name, help_text)
+        self.metrics.append(metric)
+        return metric
+    
+    def gauge(self, name: str, help_text: str) -> Gauge:
+        metric = Gauge(name, help_text)
+        self.metrics.append(metric)
+        return metric
+    
+    def register_cache(self, name: str, cache: Any) -> None:
+        """
+        Exporta as estatísticas (método stats()) de um cache
+        
+        Vários caches com o mesmo nome (por exemplo, um por sessão) são somados. Os caches
+        são guardados por referência fraca e deixam de contar quando são libertados.
+        
+        Args:
+            name: Nome do cache nas métricas
+            cache: Objeto com um método stats() que devolve "hits" e "misses"
+        """
+        with self.lock:
+            self.caches.setdefault(name, weakref.WeakSet()).add(cache)
+    
+    def cache_stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        Acertos, falhas e taxa de acerto de cada cache registado
+        
+        Returns:
+            Dicionário nome -> {"hits", "misses", "hit_ratio"}
+        """
+        with self.lock:
+            caches = {name: list(instances) for name, instances in self.caches.items()}
+        result = {}
+        for name, instances in caches.items():
+            hits = misses = 0
+            for cache in instances:
+                stats = cache.stats()
+                hits += stats.get("hits", 0)
+                misses += stats.get("misses", 0)
+            total = hits + misses
+            result[name] = {"hits": hits, "misses": misses, "hit_ratio": hits / total if total else 0.0}
+        return result
+    
+    def render(self) -> str:
+        """
+        Todas as métricas no formato de texto do Prometheus
+        
+        Returns:
+            Texto da exposição
+        """
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        
+        cache_stats = self.cache_stats()
+        for suffix, field, kind, help_text in (
+            ("hits_total", "hits", "counter", "Acertos do cache"),
+            ("misses_total", "misses", "counter", "Falhas do cache"),
+            ("hit_ratio", "hit_ratio", "gauge", "Taxa de acerto do cache")
+        ):
+            name = f"urobot_cache_{suffix}"
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for cache_name, stats in cache_stats.items():
+                lines.append(f'{name}{{cache="{cache_name}"}} {stats[field]}')
+        return "\n".join(lines) + "\n"
+    
+    def summary(self) -> str:
+        """
+        Resumo legível das métricas, para o log
+        
+        Returns:
+            Texto com uma linha por histograma e por cache
+        """
+        parts = []
+        for metric in self.metrics:
+            if isinstance(metric, Histogram):
+                summary = metric.summary()
+                if summary:
+                    parts.append(f"{metric.name}: n={summary['count']} p50={summary['p50']:.3f} "
+                                 f"p95={summary['p95']:.3f}")
+            elif isinstance(metric, Gauge):
+                parts.append(f"{metric.name}: {metric.value:g}")
+        for name, stats in self.cache_stats().items():
+            parts.append(f"cache {name}: {stats['hits']}/{stats['hits'] + stats['misses']} "
+                         f"({stats['hit_ratio']:.0%})")
+        return "\n".join(parts)
+
+# Registo partilhado por todo o processo e métricas do pipeline
+registry = MetricsRegistry()
+
+RETRIEVAL_SECONDS = registry.histogram("urobot_retrieval_seconds", "Tempo da recuperação de documentos")
+QUERY_EMBEDDING_SECONDS = registry.histogram("urobot_query_embedding_seconds",
+                                             "Tempo de cada pedido de embeddings de consultas (sem cache)")
+DOCUMENT_EMBEDDING_SECONDS = registry.histogram("urobot_document_embedding_seconds",
+                                                "Tempo de cada pedido de embeddings de documentos")
+PROMPT_BUILD_SECONDS = registry.histogram("urobot_prompt_build_seconds", "Tempo da montagem do prompt")
+PROMPT_EVAL_SECONDS = registry.histogram("urobot_prompt_eval_seconds",
+                                         "Tempo de avaliação do prompt no Ollama (prompt_eval_duration)")
+MODEL_LOAD_SECONDS = registry.histogram("urobot_model_load_seconds",
+                                        "Tempo de carregamento do modelo no Ollama (load_duration)")
+GENERATION_SECONDS = registry.histogram("urobot_generation_seconds", "Tempo total da etapa de geração")
+TIME_TO_FIRST_TOKEN_SECONDS = registry.histogram("urobot_time_to_first_token_seconds",
+                                                 "Tempo até ao primeiro token em streaming")
+QUERY_SECONDS = registry.histogram("urobot_query_seconds", "Tempo total de uma consulta")
+TOKENS_PER_SECOND = registry.histogram("urobot_generation_tokens_per_second",
+                                       "Velocidade de geração do Ollama (eval_count / eval_duration)",
+                                       THROUGHPUT_BUCKETS)
+CONTEXT_TOKENS = registry.histogram("urobot_context_tokens",
+                                    "Tokens estimados do contexto montado para o prompt", TOKEN_BUCKETS)
+TOKENS = registry.counter("urobot_tokens_total", "Tokens processados pelo Ollama")
+MODEL_COLD_STARTS = registry.counter("urobot_model_cold_starts_total",
+                                    "Pedidos ao Ollama que tiveram de carregar o modelo (load_duration acima de COLD_LOAD_THRESHOLD)")
+COALESCED_QUERIES = registry.counter("urobot_coalesced_queries_total",
+                                    "Consultas servidas por uma execução idêntica já em curso")
+QUERIES_IN_FLIGHT = registry.gauge("urobot_queries_in_flight", "Consultas em processamento")
+
+def record_ollama_metadata(metadata: Optional[Dict[str, Any]]) -> None:
+    """
+    Regista os tempos e contagens de tokens devolvidos pelo Ollama no fim de uma geração
+    
+    Args:
+        metadata: Campos finais da resposta do Ollama (durações em nanossegundos)
+    """
+    if not metadata:
+        return
+    if metadata.get("prompt_eval_duration"):
+        PROMPT_EVAL_SECONDS.observe(metadata["prompt_eval_duration"] / 1e9)
+    if metadata.get("load_duration"):
+        MODEL_LOAD_SECONDS.observe(metadata["load_duration"] / 1e9)
+        if metadata["load_duration"] / 1e9 >= COLD_LOAD_THRESHOLD:
+            MODEL_COLD_STARTS.inc(modelo=metadata.get("model") or "desconhecido")
+    if metadata.get("prompt_eval_count"):
+        TOKENS.inc(metadata["prompt_eval_count"], tipo="prompt")
+    if metadata.get("eval_count"):
+        TOKENS.inc(metadata["eval_count"], tipo="resposta")
+        if metadata.get("eval_duration"):
+            TOKENS_PER_SECOND.observe(metadata["eval_count"] / (metadata["eval_duration"] / 1e9))
+
+# Tarefas de fundo (arrancadas no máximo uma vez por processo)
+_background_lock = threading.Lock()
+_log_summary_thread: Optional[threading.Thread] = None
+_metrics_server: Optional[ThreadingHTTPServer] = None
+
+def start_log_summary(interval: float) -> None:
+    """
+    Escreve periodicamente um resumo das métricas no log, numa thread de fundo
+    
+    Args:
+        interval: Intervalo entre resumos, em segundos
+    """
+    global _log_summary_thread
+    with _background_lock:
+        if _log_summary_thread is not None:
+            return
+        
+        def run():
+            while True:
+                time.sleep(interval)
+                summary = registry.summary()
+                if summary:
+                    logger.info("Resumo das métricas:\n" + summary)
+        
+        _log_summary_thread = threading.Thread(target=run, name="metrics-log-summary", daemon=True)
+        _log_summary_thread.start()
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    """
+    Responde a GET /metrics com a exposição do Prometheus
+    """
+    
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        pass
+
+def start_metrics_server(port: int, host: str = METRICS_HOST) -> None:
+    """
+    Arranca um servidor HTTP mínimo com o endpoint /metrics, numa thread de fundo
+    
+    Útil nos processos sem servidor HTTP próprio (Streamlit, CLI).
+    
+    Args:
+        port: Porta de escuta
+        host: Endereço de escuta
+    """
+    global _metrics_server
+    with _background_lock:
+        if _metrics_server is not None:
+            return
+        _metrics_server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        threading.Thread(target=_metrics_server.serve_forever, name="metrics-server", daemon=True).start()
+        logger.info(f"Métricas disponíveis em http://{host}:{port}/metrics")
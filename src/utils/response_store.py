@@ -0,0 +1,404 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Armazenamento persistente de respostas partilhado entre sessões, processos e reinícios
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Dict, Any, Optional, List
+
+from langchain.schema import Document
+
+from src.config.settings import (
+    RESPONSE_STORE_PATH,
+    RESPONSE_STORE_TTL,
+    PRECOMPUTED_ANSWERS_PATH,
+    CACHE_TTL_RESPONSES,
+    SEMANTIC_CACHE_THRESHOLD,
+    SEMANTIC_CACHE_MAX_ENTRIES
+)
+from src.utils.cache import normalize_query, SemanticCache
+from src.utils.metrics import registry
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+class ResponseStore:
+    """
+    Armazém de respostas em SQLite (modo WAL), seguro para leitores e escritores concorrentes
+    
+    Cada thread usa a sua própria ligação; o modo WAL permite leituras em paralelo
+    com uma escrita, e o busy_timeout serializa escritores de processos diferentes.
+    As respostas pré-geradas (ver PrecomputedAnswers), se existirem, são consultadas
+    antes da base de dados.
+    """
+    
+    def __init__(self, path: str = RESPONSE_STORE_PATH, ttl: Optional[int] = RESPONSE_STORE_TTL,
+                 precomputed: Optional["PrecomputedAnswers"] = None):
+        """
+        Inicializa o armazém, criando o ficheiro e a tabela se necessário
+        
+        Args:
+            path: Caminho do ficheiro SQLite
+            ttl: Tempo de vida das respostas em segundos (None para não expirar)
+            precomputed: Respostas pré-geradas consultadas primeiro
+        """
+        self.path = path
+        self.ttl = ttl
+        self.precomputed = precomputed
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        
+        connection = self._connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                query TEXT NOT NULL,
+                answer TEXT NOT NULL,
+                documents TEXT NOT NULL,
+                execution_time REAL NOT NULL,
+                created_at REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0
+            )
+            """
+        )
+        connection.commit()
+        logger.info(f"Armazém de respostas persistente em: {path}")
+    
+    def _connection(self) -> sqlite3.Connection:
+        """
+        Devolve a ligação SQLite da thread atual, abrindo-a se necessário
+        
+        Returns:
+            Ligação SQLite
+        """
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA busy_timeout=30000")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+    
+    @staticmethod
+    def make_key(query: str, model: str, prompt_template: str, index_version: str) -> str:
+        """
+        Gera a chave de uma resposta
+        
+        Args:
+            query: Pergunta do usuário
+            model: Nome do modelo LLM
+            prompt_template: Template de prompt utilizado
+            index_version: Versão do índice de documentos
+        
+        Returns:
+            Chave da resposta
+        """
+        prompt_hash = hashlib.sha256(prompt_template.encode("utf-8")).hexdigest()
+        raw = "\0".join([normalize_query(query), model, prompt_hash, index_version])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+    
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Recupera uma resposta guardada
+        
+        Args:
+            key: Chave gerada por make_key
+        
+        Returns:
+            Dicionário com resposta, documentos e tempo, ou None se não existir ou tiver expirado
+        """
+        if self.precomputed is not None:
+            resultado = self.precomputed.get(key)
+            if resultado is not None:
+                return resultado
+        
+        connection = self._connection()
+        row = connection.execute(
+            "SELECT answer, documents, execution_time, created_at FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            self._record(hit=False)
+            return None
+        
+        answer, documents, execution_time, created_at = row
+        if self.ttl is not None and time.time() - created_at > self.ttl:
+            connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+            connection.commit()
+            self._record(hit=False)
+            return None
+        
+        connection.execute("UPDATE responses SET hits = hits + 1 WHERE key = ?", (key,))
+        connection.commit()
+        self._record(hit=True)
+        return {
+            "resposta": answer,
+            "documentos": _deserialize_documents(documents),
+            "tempo": execution_time
+        }
+    
+    def set(self, key: str, query: str, resultado: Dict[str, Any]) -> None:
+        """
+        Guarda uma resposta
+        
+        Args:
+            key: Chave gerada por make_key
+            query: Pergunta original
+            resultado: Dicionário com "resposta", "documentos" e "tempo"
+        """
+        connection = self._connection()
+        connection.execute(
+            "INSERT OR REPLACE INTO responses (key, query, answer, documents, execution_time, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                key,
+                query,
+                resultado["resposta"],
+                _serialize_documents(resultado.get("documentos", [])),
+                resultado.get("tempo", 0.0),
+                time.time()
+            )
+        )
+        connection.commit()
+    
+    def _record(self, hit: bool) -> None:
+        """
+        Regista um acerto ou uma falha nas estatísticas deste processo
+        
+        Args:
+            hit: True se a resposta foi encontrada
+        """
+        with self._stats_lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        Estatísticas de utilização do armazém neste processo
+        
+        Returns:
+            Dicionário com acertos, falhas e taxa de acerto
+        """
+        with self._stats_lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / total if total else 0.0
+            }
+    
+    def clear(self) -> None:
+        """
+        Remove todas as respostas guardadas
+        """
+        connection = self._connection()
+        connection.execute("DELETE FROM responses")
+        connection.commit()
+        logger.info("Armazém de respostas limpo")
+
+def _serialize_documents(documents: List[Document]) -> str:
+    """
+    Converte documentos em JSON
+    
+    Args:
+        documents: Documentos a converter
+    
+    Returns:
+        Texto JSON
+    """
+    return json.dumps(
+        [{"page_content": doc.page_content, "metadata": doc.metadata} for doc in documents],
+        ensure_ascii=False
+    )
+
+def _deserialize_documents(data: str) -> List[Document]:
+    """
+    Reconstrói documentos a partir de JSON
+    
+    Args:
+        data: Texto JSON produzido por _serialize_documents
+    
+    Returns:
+        Lista de documentos
+    """
+    return [Document(page_content=item["page_content"], metadata=item["metadata"]) for item in json.loads(data)]
+
+class PrecomputedAnswers:
+    """
+    Respostas pré-geradas offline para perguntas escolhidas, mantidas em memória
+    
+    O ficheiro JSON é escrito por src/models/precompute.py e lido de uma vez; cada
+    consulta é uma procura num dicionário. As chaves são as de ResponseStore.make_key,
+    que incluem a versão do índice: depois de uma reindexação as respostas antigas
+    deixam de coincidir e as perguntas voltam a ser geradas em direto até à próxima
+    pré-geração. O ficheiro é relido quando muda em disco.
+    """
+    
+    def __init__(self, path: str = PRECOMPUTED_ANSWERS_PATH):
+        """
+        Inicializa o armazém (o ficheiro é lido na primeira consulta)
+        
+        Args:
+            path: Caminho do ficheiro JSON
+        """
+        self.path = path
+        self.index_version: Optional[str] = None
+        self.answers: Dict[str, Dict[str, Any]] = {}
+        self._mtime: Optional[int] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def refresh(self) -> None:
+        """
+        Relê o ficheiro se foi criado ou alterado desde a última leitura
+        """
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime == self._mtime:
+            return
+        
+        answers: Dict[str, Dict[str, Any]] = {}
+        index_version = None
+        if mtime is not None:
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    data = json.load(f)
+                index_version = data.get("versao_indice")
+                for key, entry in data.get("respostas", {}).items():
+                    answers[key] = dict(entry, documentos=[
+                        Document(page_content=item["page_content"], metadata=item["metadata"])
+                        for item in entry.get("documentos", [])
+                    ])
+                logger.info(f"{len(answers)} respostas pré-geradas carregadas (índice {index_version})")
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Respostas pré-geradas ilegíveis ({self.path}): {str(e)}")
+        self.answers, self.index_version, self._mtime = answers, index_version, mtime
+    
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Procura uma resposta pré-gerada
+        
+        Args:
+            key: Chave gerada por ResponseStore.make_key
+        
+        Returns:
+            Dicionário com resposta, documentos e tempo, ou None se não existir
+        """
+        with self._lock:
+            self.refresh()
+            entry = self.answers.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return {
+            "resposta": entry["resposta"],
+            "documentos": list(entry["documentos"]),
+            "tempo": entry.get("tempo", 0.0),
+            "precomputada": True
+        }
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        Estatísticas de utilização das respostas pré-geradas neste processo
+        
+        Returns:
+            Dicionário com acertos, falhas, taxa de acerto, respostas e versão do índice
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / total if total else 0.0,
+                "respostas": len(self.answers),
+                "versao_indice": self.index_version
+            }
+
+def write_precomputed_answers(path: str, index_version: str, respostas: Dict[str, Dict[str, Any]]) -> None:
+    """
+    Grava as respostas pré-geradas de forma atómica
+    
+    Args:
+        path: Caminho do ficheiro JSON
+        index_version: Versão do índice com que as respostas foram geradas
+        respostas: Dicionário chave -> {"pergunta", "resposta", "documentos", "tempo"}
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    data = {
+        "versao_indice": index_version,
+        "gerado_em": time.time(),
+        "respostas": {
+            key: dict(entry, documentos=[{"page_content": doc.page_content, "metadata": doc.metadata}
+                                         for doc in entry.get("documentos", [])])
+            for key, entry in respostas.items()
+        }
+    }
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(path + ".tmp", path)
+    logger.info(f"{len(respostas)} respostas pré-geradas gravadas em: {path}")
+
+# Armazém partilhado por todo o processo
+_response_store: Optional[ResponseStore] = None
+_response_store_lock = threading.Lock()
+
+def get_response_store() -> ResponseStore:
+    """
+    Devolve o armazém de respostas do processo, criando-o na primeira chamada
+    
+    Returns:
+        Armazém de respostas
+    """
+    global _response_store
+    with _response_store_lock:
+        if _response_store is None:
+            precomputed = PrecomputedAnswers() if PRECOMPUTED_ANSWERS_PATH else None
+            _response_store = ResponseStore(precomputed=precomputed)
+            registry.register_cache("respostas", _response_store)
+            if precomputed is not None:
+                registry.register_cache("respostas_precomputadas", precomputed)
+        return _response_store
+
+# Cache semântico partilhado por todo o processo
+_semantic_cache: Optional[SemanticCache] = None
+_semantic_cache_lock = threading.Lock()
+
+def get_semantic_cache() -> SemanticCache:
+    """
+    Devolve o cache semântico do processo, criando-o na primeira chamada
+    
+    Uma pergunta respondida numa sessão (ou pelo serviço, ou pela CLI) serve perguntas
+    semelhantes feitas em qualquer outra.
+    
+    Returns:
+        Cache semântico
+    """
+    global _semantic_cache
+    with _semantic_cache_lock:
+        if _semantic_cache is None:
+            _semantic_cache = SemanticCache(
+                threshold=SEMANTIC_CACHE_THRESHOLD,
+                max_entries=SEMANTIC_CACHE_MAX_ENTRIES,
+                ttl=CACHE_TTL_RESPONSES
+            )
+            registry.register_cache("semantico", _semantic_cache)
+        return _semantic_cache
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Coalescência de pedidos idênticos em curso ("single-flight")
+
+Quando várias consultas com a mesma chave chegam antes de a primeira terminar, só a
+primeira é executada; as restantes esperam pelo mesmo resultado. Nas consultas em
+streaming, os eventos produzidos por uma única execução são distribuídos por todos os
+consumidores (os que chegam a meio recebem primeiro os eventos já produzidos).
+
+Há uma versão para threads (SingleFlight, usada pela aplicação Streamlit e pela CLI)
+e outra para asyncio (AsyncSingleFlight, usada pelo serviço HTTP).
+"""
+
+import asyncio
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterator, AsyncIterator, Awaitable, List, Optional, Tuple
+
+from src.utils.metrics import COALESCED_QUERIES
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+class _Call:
+    """
+    Execução em curso de uma função sem streaming
+    """
+    
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+class _Broadcast:
+    """
+    Eventos de uma execução em streaming, guardados para todos os consumidores
+    """
+    
+    def __init__(self):
+        self.events: List[Any] = []
+        self.finished = False
+        self.error: Optional[BaseException] = None
+        self.condition = threading.Condition()
+    
+    def publish(self, event: Any) -> None:
+        with self.condition:
+            self.events.append(event)
+            self.condition.notify_all()
+    
+    def close(self, error: Optional[BaseException] = None) -> None:
+        with self.condition:
+            self.finished = True
+            self.error = error
+            self.condition.notify_all()
+    
+    def subscribe(self) -> Iterator[Any]:
+        """
+        Produz todos os eventos, desde o primeiro, à medida que são publicados
+        """
+        position = 0
+        while True:
+            with self.condition:
+                while position >= len(self.events) and not self.finished:
+                    self.condition.wait()
+                pending = self.events[position:]
+                position = len(self.events)
+                finished, error = self.finished, self.error
+            yield from pending
+            if finished and position >= len(self.events):
+                if error is not None:
+                    raise error
+                return
+
+class SingleFlight:
+    """
+    Coalescência de chamadas idênticas em curso entre threads
+    """
+    
+    def __init__(self, name: str = "consultas"):
+        """
+        Inicializa o grupo
+        
+        Args:
+            name: Nome do grupo, usado no log e nas métricas
+        """
+        self.name = name
+        self.lock = threading.Lock()
+        self.calls: Dict[str, _Call] = {}
+        self.streams: Dict[str, _Broadcast] = {}
+    
+    def do(self, key: str, function: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Executa a função, ou espera pelo resultado de uma execução em curso com a mesma chave
+        
+        Args:
+            key: Chave da chamada
+            function: Função sem argumentos a executar
+        
+        Returns:
+            Tupla (resultado, True se foi partilhado de outra execução)
+        """
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = _Call()
+        
+        if not leader:
+            COALESCED_QUERIES.inc(grupo=self.name)
+            logger.info(f"Consulta idêntica já em curso ({self.name}): a aguardar o mesmo resultado")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+        
+        try:
+            call.result = function()
+            return call.result, False
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                self.calls.pop(key, None)
+            call.done.set()
+    
+    def stream(self, key: str, function: Callable[[], Iterator[Any]]) -> Iterator[Any]:
+        """
+        Consome um iterador partilhado: a primeira chamada com a chave inicia a execução
+        numa thread própria e todas as chamadas recebem os mesmos eventos
+        
+        A execução continua até ao fim mesmo que um consumidor desista, pelo que os
+        restantes não são afetados.
+        
+        Args:
+            key: Chave da chamada
+            function: Função sem argumentos que devolve o iterador de eventos
+        
+        Returns:
+            Iterador de eventos
+        """
+        with self.lock:
+            broadcast = self.streams.get(key)
+            leader = broadcast is None
+            if leader:
+                broadcast = self.streams[key] = _Broadcast()
+        
+        if leader:
+            def produce():
+                error = None
+                try:
+                    for event in function():
+                        broadcast.publish(event)
+                except BaseException as e:
+                    error = e
+                finally:
+                    with self.lock:
+                        self.streams.pop(key, None)
+                    broadcast.close(error)
+            
+            threading.Thread(target=produce, name=f"singleflight-{self.name}", daemon=True).start()
+        else:
+            COALESCED_QUERIES.inc(grupo=self.name)
+            logger.info(f"Consulta idêntica já em curso ({self.name}): a partilhar o mesmo streaming")
+        return broadcast.subscribe()
+
+class _AsyncBroadcast:
+    """
+    Eventos de uma execução assíncrona em streaming, guardados para todos os consumidores
+    """
+    
+    def __init__(self):
+        self.events: List[Any] = []
+        self.finished = False
+        self.error: Optional[BaseException] = None
+        self.changed = asyncio.Condition()
+    
+    async def publish(self, event: Any) -> None:
+        async with self.changed:
+            self.events.append(event)
+            self.changed.notify_all()
+    
+    async def close(self, error: Optional[BaseException] = None) -> None:
+        async with self.changed:
+            self.finished = True
+            self.error = error
+            self.changed.notify_all()
+    
+    async def subscribe(self) -> AsyncIterator[Any]:
+        """
+        Produz todos os eventos, desde o primeiro, à medida que são publicados
+        """
+        position = 0
+        while True:
+            async with self.changed:
+                await self.changed.wait_for(lambda: position < len(self.events) or self.finished)
+                pending = self.events[position:]
+                position = len(self.events)
+                finished, error = self.finished, self.error
+            for event in pending:
+                yield event
+            if finished and position >= len(self.events):
+                if error is not None:
+                    raise error
+                return
+
+class AsyncSingleFlight:
+    """
+    Coalescência de chamadas idênticas em curso num event loop
+    """
+    
+    def __init__(self, name: str = "consultas"):
+        """
+        Inicializa o grupo
+        
+        Args:
+            name: Nome do grupo, usado no log e nas métricas
+        """
+        self.name = name
+        self.calls: Dict[str, "asyncio.Task"] = {}
+        self.streams: Dict[str, _AsyncBroadcast] = {}
+        self.tasks: set = set()
+    
+    async def do(self, key: str, function: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Executa a corrotina, ou espera pelo resultado de uma execução em curso com a mesma chave
+        
+        A execução partilhada não é cancelada se um dos pedidos for cancelado.
+        
+        Args:
+            key: Chave da chamada
+            function: Função sem argumentos que devolve a corrotina a executar
+        
+        Returns:
+            Tupla (resultado, True se foi partilhado de outra execução)
+        """
+        task = self.calls.get(key)
+        shared = task is not None
+        if shared:
+            COALESCED_QUERIES.inc(grupo=self.name)
+            logger.info(f"Consulta idêntica já em curso ({self.name}): a aguardar o mesmo resultado")
+        else:
+            task = asyncio.ensure_future(function())
+            self.calls[key] = task
+            task.add_done_callback(lambda _: self.calls.pop(key, None))
+        return await asyncio.shield(task), shared
+    
+    async def stream(self, key: str, function: Callable[[], AsyncIterator[Any]]) -> AsyncIterator[Any]:
+        """
+        Consome um iterador assíncrono partilhado: a primeira chamada com a chave inicia a
+        execução numa tarefa própria e todas as chamadas recebem os mesmos eventos
+        
+        Args:
+            key: Chave da chamada
+            function: Função sem argumentos que devolve o iterador assíncrono de eventos
+        
+        Returns:
+            Iterador assíncrono de eventos
+        """
+        broadcast = self.streams.get(key)
+        if broadcast is None:
+            broadcast = self.streams[key] = _AsyncBroadcast()
+            
+            async def produce():
+                error = None
+                try:
+                    async for event in function():
+                        await broadcast.publish(event)
+                except Exception as e:
+                    error = e
+                finally:
+                    self.streams.pop(key, None)
+                    await broadcast.close(error)
+            
+            # Guardar a referência da tarefa até terminar, para não ser recolhida
+            task = asyncio.ensure_future(produce())
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+        else:
+            COALESCED_QUERIES.inc(grupo=self.name)
+            logger.info(f"Consulta idêntica já em curso ({self.name}): a partilhar o mesmo streaming")
+        
+        async for event in broadcast.subscribe():
+            yield event
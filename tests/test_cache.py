@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Cache LRU/TTL e cache semântico de respostas
+"""
+
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.models import rag
+from src.utils import response_store
+from src.utils import cache as cache_module
+from src.utils.cache import SimpleCache, SemanticCache, estimate_size
+from src.utils.response_store import ResponseStore
+
+class PhraseEmbeddings:
+    """
+    Embeddings fixos para algumas perguntas
+    """
+    
+    VECTORS = {
+        "Como posso justificar as faltas?": [1.0, 0.0, 0.0],
+        "Como justifico faltas?": [0.98, 0.1, 0.0],
+        "Quando são os exames?": [0.0, 0.0, 1.0]
+    }
+    
+    def embed_query(self, text):
+        return self.VECTORS[text]
+
+class FakeClock:
+    """
+    Relógio controlado pelos testes, em vez de time.time
+    """
+    
+    def __init__(self):
+        self.now = 1000.0
+    
+    def time(self):
+        return self.now
+
+def _clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(cache_module, "time", clock)
+    return clock
+
+def test_simple_cache_evicts_least_recently_used_first():
+    cache = SimpleCache(max_entries=3)
+    for key in ("a", "b", "c"):
+        cache.set(key, key)
+    cache.get("a")
+    
+    cache.set("d", "d")
+    assert list(cache.cache) == ["c", "a", "d"]
+    cache.set("e", "e")
+    assert list(cache.cache) == ["a", "d", "e"]
+    assert cache.get("b") is None and cache.get("c") is None
+    assert cache.stats()["evictions"] == 2
+
+def test_simple_cache_accounts_bytes_on_replace_remove_and_evict():
+    value = "x" * 1000
+    size = estimate_size(value)
+    cache = SimpleCache(max_entries=100, max_bytes=int(2.5 * size))
+    cache.set("a", value)
+    cache.set("b", value)
+    assert cache.bytes == 2 * size
+    
+    # Substituir uma chave desconta o valor anterior
+    cache.set("a", "curto")
+    assert cache.bytes == size + estimate_size("curto")
+    
+    # Exceder o limite de memória remove as entradas menos usadas
+    cache.set("c", value)
+    cache.set("d", value)
+    assert list(cache.cache) == ["a", "c", "d"]
+    assert cache.bytes == 2 * size + estimate_size("curto")
+    
+    # Um valor maior do que o cache não é guardado e remove a versão anterior da chave
+    cache.set("c", "x" * 10000)
+    assert list(cache.cache) == ["a", "d"]
+    assert cache.bytes == size + estimate_size("curto") == sum(entry[1] for entry in cache.cache.values())
+
+def test_simple_cache_expires_entries_from_the_deadline_heap(monkeypatch):
+    clock = _clock(monkeypatch)
+    cache = SimpleCache(ttl=10)
+    cache.set("a", 1)
+    clock.now += 5
+    cache.set("b", 2)
+    # Atualizar "a" renova o seu prazo; o prazo antigo fica no heap e é ignorado
+    clock.now += 1
+    cache.set("a", 3)
+    
+    clock.now += 9
+    cache.purge_expired()
+    assert list(cache.cache) == ["a"]
+    assert cache.stats()["expirations"] == 1
+    
+    # As entradas expiradas são removidas em qualquer operação, sem voltar a ler a chave
+    clock.now += 1
+    assert cache.get("outra") is None
+    assert cache.cache == {} and cache.bytes == 0
+    assert cache.stats()["expirations"] == 2
+
+def test_simple_cache_compacts_stale_deadlines(monkeypatch):
+    clock = _clock(monkeypatch)
+    cache = SimpleCache(ttl=10, max_entries=4)
+    for step in range(500):
+        clock.now += 0.001
+        cache.set(f"k{step % 8}", step)
+        assert len(cache._deadlines) <= 2 * len(cache.cache) + 64
+    
+    # O heap compactado tem exatamente um prazo, o atual, por entrada
+    live = {(entry[2], key) for key, entry in cache.cache.items()}
+    assert live <= {(deadline, key) for deadline, _, key in cache._deadlines}
+    clock.now += 10
+    cache.purge_expired()
+    assert cache.cache == {} and cache.bytes == 0
+
+def _qa_chain(model="llama3"):
+    llm_chain = SimpleNamespace(prompt=SimpleNamespace(template="{context} {question}"), llm=SimpleNamespace(model=model))
+    return SimpleNamespace(retriever=None, combine_documents_chain=SimpleNamespace(llm_chain=llm_chain))
+
+def test_semantic_cache_separates_namespaces():
+    cache = SemanticCache(threshold=0.9, max_entries=4)
+    cache.set([1.0, 0.0, 0.0], "antes da reindexação", "indice-1")
+    
+    assert cache.get([1.0, 0.05, 0.0], "indice-1")[0] == "antes da reindexação"
+    # Outra versão do índice (ou outro modelo ou prompt) não vê as entradas antigas
+    assert cache.get([1.0, 0.05, 0.0], "indice-2") is None
+    
+    cache.set([1.0, 0.0, 0.01], "depois da reindexação", "indice-2")
+    assert cache.get([1.0, 0.05, 0.0], "indice-2")[0] == "depois da reindexação"
+
+def test_semantic_cache_is_shared_by_all_entry_points(tmp_path, monkeypatch):
+    store = ResponseStore(path=str(tmp_path / "responses.sqlite"))
+    monkeypatch.setattr(rag, "get_response_store", lambda: store)
+    monkeypatch.setattr(response_store, "_semantic_cache", None)
+    embeddings, qa_chain = PhraseEmbeddings(), _qa_chain()
+    
+    # Uma sessão responde à pergunta...
+    key, resultado, vector = rag.lookup_response("Como posso justificar as faltas?", qa_chain, "v1", embeddings)
+    assert resultado is None and vector is not None
+    rag.store_response(key, "Como posso justificar as faltas?", {"resposta": "Nos serviços académicos",
+                                                                  "documentos": [], "tempo": 1.0},
+                       qa_chain, "v1", vector)
+    
+    # ...e outra sessão (ou o serviço, ou a CLI) recebe-a para uma pergunta semelhante
+    _, resultado, _ = rag.lookup_response("Como justifico faltas?", qa_chain, "v1", embeddings)
+    assert resultado["resposta"] == "Nos serviços académicos"
+    assert rag.lookup_response("Quando são os exames?", qa_chain, "v1", embeddings)[1] is None
+    
+    # Outro índice ou outro modelo não reutilizam a resposta
+    assert rag.lookup_response("Como justifico faltas?", qa_chain, "v2", embeddings)[1] is None
+    assert rag.lookup_response("Como justifico faltas?", _qa_chain("mistral"), "v1", embeddings)[1] is None
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Montagem do contexto com a pesquisa híbrida (BM25 + vetorial)
+"""
+
+import os
+import sys
+from typing import List
+
+import numpy as np
+from langchain.schema import Document
+from langchain_core.embeddings import Embeddings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.models import lexical_index
+from src.models.context import filter_by_score, pack_context
+from src.models.lexical_index import HybridRetriever, build_lexical_index
+from src.models.vector_index import NumpyVectorStore
+
+class KeywordEmbeddings(Embeddings):
+    """
+    Embeddings determinísticos: contagem de algumas palavras, mais uma componente constante
+    """
+    
+    VOCABULARY = ["faltas", "avaliação", "exames", "propinas"]
+    
+    def _embed(self, text: str) -> List[float]:
+        words = text.lower().split()
+        vector = np.array([1.0] + [words.count(word) * 4.0 for word in self.VOCABULARY])
+        return (vector / np.linalg.norm(vector)).tolist()
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+    
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+CHUNKS = [
+    ("regime", "Regime de faltas : as faltas justificadas não contam para a assiduidade"),
+    ("entrega", "2.6.3. As justificações são entregues nos serviços académicos"),
+    ("epocas", "Épocas de avaliação e exames de recurso"),
+    ("propinas", "Propinas e prazos de pagamento"),
+    ("exames", "Calendário de exames da época especial"),
+]
+
+def test_hybrid_packing_keeps_lexical_only_hits(tmp_path):
+    documents = [Document(page_content=text, metadata={"chunk_id": chunk_id}) for chunk_id, text in CHUNKS]
+    store = NumpyVectorStore(KeywordEmbeddings(), str(tmp_path / "vector_index"))
+    store.add_documents(documents, ids=[doc.metadata["chunk_id"] for doc in documents])
+    path = str(tmp_path / "lexical_index.json.gz")
+    build_lexical_index(documents, path)
+    
+    retriever = HybridRetriever(vectorstore=store, k=4, fetch_k=2, fusion="rrf", lexical_path=path)
+    candidates = retriever.invoke("faltas 2.6.3")
+    ids = [doc.metadata["chunk_id"] for doc in candidates]
+    # "regime" aparece nas duas pesquisas; "entrega" só na lexical
+    assert ids[0] == "regime"
+    assert "entrega" in ids
+    assert all("score" not in doc.metadata and "fused_score" in doc.metadata for doc in candidates)
+    
+    # O corte relativo não se aplica às pontuações RRF: o resultado só lexical é usado
+    assert filter_by_score(candidates) == candidates
+    used = [doc.metadata["chunk_id"] for doc in pack_context(candidates, budget=1024)["documentos"]]
+    assert "entrega" in used
+    assert len(used) > 1
+    
+    # Os documentos do índice lexical não são alterados pela pesquisa
+    assert all("fused_score" not in metadata for metadata in lexical_index.get_lexical_index(path).metadatas)
+
+def test_lexical_indexes_are_kept_per_path(tmp_path):
+    regulamento = [Document(page_content=text, metadata={"chunk_id": chunk_id}) for chunk_id, text in CHUNKS]
+    outro = [Document(page_content="Regulamento de bolsas de estudo", metadata={"chunk_id": "bolsas"})]
+    paths = {"regulamento": str(tmp_path / "regulamento.json.gz"), "outro": str(tmp_path / "outro.json.gz")}
+    build_lexical_index(regulamento, paths["regulamento"])
+    build_lexical_index(outro, paths["outro"])
+    
+    assert lexical_index.get_lexical_index(paths["regulamento"]).ids == [chunk_id for chunk_id, _ in CHUNKS]
+    assert lexical_index.get_lexical_index(paths["outro"]).ids == ["bolsas"]
+    
+    # Cada retriever pesquisa o índice lexical do seu caminho
+    store = NumpyVectorStore(KeywordEmbeddings(), str(tmp_path / "vector_index"))
+    store.add_documents(regulamento)
+    for name, found in (("regulamento", False), ("outro", True)):
+        retriever = HybridRetriever(vectorstore=store, k=5, fetch_k=5, lexical_path=paths[name])
+        ids = [doc.metadata["chunk_id"] for doc in retriever.invoke("bolsas de estudo")]
+        assert ("bolsas" in ids) == found
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Escrita no índice dividido por documento
+"""
+
+import os
+import sys
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.models.sharding import ShardedVectorStore, read_shards, shard_name
+from src.models.vector_index import NumpyVectorStore
+
+def test_add_texts_routes_by_source(tmp_path):
+    embedding = DeterministicFakeEmbedding(size=8)
+    factory = lambda name: NumpyVectorStore(embedding, str(tmp_path / "shards" / name))
+    metadatas = [{"source": "a.pdf", "file_name": "a.pdf"}, {"source": "a.pdf", "file_name": "a.pdf"},
+                 {"source": "b.pdf", "file_name": "b.pdf"}]
+    store = ShardedVectorStore.from_texts(["a1", "a2", "b1"], embedding, metadatas, ids=["a1", "a2", "b1"],
+                                          shard_factory=factory, directory=str(tmp_path))
+    
+    shards = read_shards(str(tmp_path))
+    assert shards[shard_name("a.pdf")]["chunks"] == 2
+    assert shards[shard_name("b.pdf")]["chunks"] == 1
+    
+    # Uma vista restrita escreve no índice completo, incluindo partições novas
+    view = store.routed({"file_name": "a.pdf"})
+    view.add_texts(["c1"], [{"source": "c.pdf", "file_name": "c.pdf"}], ids=["c1"])
+    view.persist()
+    assert read_shards(str(tmp_path))[shard_name("c.pdf")]["chunks"] == 1
+    assert sorted(store.get_ids()) == ["a1", "a2", "b1", "c1"]
+    assert store.similarity_search("c1", k=1, filter={"file_name": "c.pdf"})[0].page_content == "c1"
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Coalescência de pedidos idênticos em curso
+"""
+
+import os
+import sys
+import time
+import asyncio
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.utils.metrics import COALESCED_QUERIES
+from src.utils.singleflight import SingleFlight, AsyncSingleFlight
+
+def _coalesced(name):
+    return COALESCED_QUERIES.values.get((("grupo", name),), 0)
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "tempo esgotado"
+        time.sleep(0.001)
+
+def _run_waiters(group, key, function, count):
+    """
+    Inicia `count` chamadas a group.do noutras threads e devolve os seus resultados (ou erros)
+    """
+    results = [None] * count
+    
+    def call(position):
+        try:
+            results[position] = group.do(key, function)
+        except Exception as e:
+            results[position] = e
+    
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+def test_do_runs_identical_calls_once():
+    group = SingleFlight("teste-do")
+    release = threading.Event()
+    calls = []
+    
+    def function():
+        calls.append(1)
+        release.wait(5)
+        return "resposta"
+    
+    threads, results = _run_waiters(group, "chave", function, 1)
+    _wait_for(lambda: calls)
+    more, more_results = _run_waiters(group, "chave", function, 2)
+    _wait_for(lambda: _coalesced("teste-do") == 2)
+    release.set()
+    for thread in threads + more:
+        thread.join(5)
+    
+    assert len(calls) == 1
+    assert results + more_results == [("resposta", False), ("resposta", True), ("resposta", True)]
+    # Terminada a execução, a chave volta a executar a função
+    assert group.do("chave", lambda: "nova") == ("nova", False)
+
+def test_do_propagates_the_error_to_waiters():
+    group = SingleFlight("teste-do-erro")
+    release = threading.Event()
+    
+    def function():
+        release.wait(5)
+        raise ValueError("falhou")
+    
+    threads, results = _run_waiters(group, "chave", function, 1)
+    _wait_for(lambda: "chave" in group.calls)
+    more, more_results = _run_waiters(group, "chave", function, 2)
+    _wait_for(lambda: _coalesced("teste-do-erro") == 2)
+    release.set()
+    for thread in threads + more:
+        thread.join(5)
+    
+    assert all(isinstance(result, ValueError) and str(result) == "falhou" for result in results + more_results)
+    assert "chave" not in group.calls
+
+def test_stream_late_subscriber_receives_earlier_events():
+    group = SingleFlight("teste-stream")
+    release = threading.Event()
+    calls = []
+    
+    def function():
+        calls.append(1)
+        yield "a"
+        release.wait(5)
+        yield "b"
+    
+    first = group.stream("chave", function)
+    assert next(first) == "a"
+    late = group.stream("chave", function)
+    release.set()
+    
+    assert ["a"] + list(first) == ["a", "b"]
+    assert list(late) == ["a", "b"]
+    assert len(calls) == 1
+
+def test_stream_propagates_the_error_to_every_subscriber():
+    group = SingleFlight("teste-stream-erro")
+    release = threading.Event()
+    
+    def function():
+        yield "a"
+        release.wait(5)
+        raise ValueError("falhou")
+    
+    first = group.stream("chave", function)
+    assert next(first) == "a"
+    late = group.stream("chave", function)
+    release.set()
+    
+    for subscriber, expected in ((first, []), (late, ["a"])):
+        received = []
+        with pytest.raises(ValueError, match="falhou"):
+            for event in subscriber:
+                received.append(event)
+        assert received == expected
+
+def test_async_do_coalesces_and_propagates_errors():
+    async def scenario():
+        group = AsyncSingleFlight("teste-async-do")
+        release = asyncio.Event()
+        calls = []
+        
+        async def function():
+            calls.append(1)
+            await release.wait()
+            return "resposta"
+        
+        async def failing():
+            await release.wait()
+            raise ValueError("falhou")
+        
+        tasks = [asyncio.ensure_future(group.do("chave", function)) for _ in range(3)]
+        errors = [asyncio.ensure_future(group.do("erro", failing)) for _ in range(2)]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*tasks)
+        failures = await asyncio.gather(*errors, return_exceptions=True)
+        return results, failures, calls, group
+    
+    results, failures, calls, group = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert results == [("resposta", False), ("resposta", True), ("resposta", True)]
+    assert all(isinstance(failure, ValueError) for failure in failures)
+    assert group.calls == {}
+
+def test_async_stream_late_subscriber_and_error():
+    async def collect(iterator, received):
+        try:
+            async for event in iterator:
+                received.append(event)
+        except ValueError as e:
+            received.append(e)
+    
+    async def scenario():
+        group = AsyncSingleFlight("teste-async-stream")
+        release = asyncio.Event()
+        calls = []
+        
+        async def function():
+            calls.append(1)
+            yield "a"
+            await release.wait()
+            yield "b"
+            raise ValueError("falhou")
+        
+        first, late = [], []
+        first_task = asyncio.ensure_future(collect(group.stream("chave", function), first))
+        while not first:
+            await asyncio.sleep(0)
+        late_task = asyncio.ensure_future(collect(group.stream("chave", function), late))
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(first_task, late_task)
+        return first, late, calls
+    
+    first, late, calls = asyncio.run(scenario())
+    assert len(calls) == 1
+    for received in (first, late):
+        assert received[:2] == ["a", "b"]
+        assert isinstance(received[2], ValueError)
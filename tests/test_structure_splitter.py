@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Divisão dos documentos pelas cláusulas numeradas do regulamento
+"""
+
+import os
+import sys
+
+from langchain.schema import Document
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.data.structure_splitter import split_by_structure
+
+HEADER = "ESTG - Regulamento de Frequência e Avaliação"
+
+def _pages(*bodies):
+    return [
+        Document(page_content=f"{HEADER}\n{body}\npágina {number} de {len(bodies)}",
+                 metadata={"source": "regulamento.pdf", "page": number - 1})
+        for number, body in enumerate(bodies, start=1)
+    ]
+
+PAGES = _pages(
+    "1. DISPOSIÇÕES GERAIS\n1.1. Objetivo\nO regulamento define a frequência.\n1.2. Âmbito\nAplica-se aos cursos da ESTG.",
+    "2. FREQUÊNCIA DAS ATIVIDADES LETIVAS\n2.1. Regime de faltas\n2.1.1. São justificadas as faltas nos casos:\n"
+    "a) Falecimento de familiar;\nb) Internamento hospitalar;",
+    "c) Situações previstas na lei.\n2.1.2. A justificação é entregue nos serviços académicos em 5 dias úteis."
+)
+
+def test_chunks_follow_the_numbered_clauses():
+    chunks = split_by_structure(PAGES, max_size=200)
+    
+    assert [chunk.metadata["section"] for chunk in chunks] == ["1", "2", "2.1.2"]
+    # Títulos e cláusulas curtas da mesma secção partilham o chunk
+    assert chunks[0].page_content.startswith("1. DISPOSIÇÕES GERAIS\n1.1. Objetivo")
+    assert chunks[0].page_content.endswith("1.2. Âmbito\nAplica-se aos cursos da ESTG.")
+    # A cláusula 2.1.1 continua na página seguinte sem o cabeçalho nem o rodapé
+    assert chunks[1].page_content.endswith("b) Internamento hospitalar;\nc) Situações previstas na lei.")
+    assert (chunks[1].metadata["page"], chunks[1].metadata["page_end"]) == (1, 2)
+    assert all(HEADER not in chunk.page_content and "página" not in chunk.page_content for chunk in chunks)
+    assert chunks[2].page_content.startswith("2.1.2. A justificação")
+
+def test_long_clauses_are_cut_between_items():
+    chunks = split_by_structure(PAGES, max_size=120)
+    
+    clause = [chunk.page_content for chunk in chunks if chunk.metadata["section"] == "2.1.1"]
+    assert clause[0] == "2.1.1. São justificadas as faltas nos casos:\na) Falecimento de familiar;\nb) Internamento hospitalar;"
+    assert clause[1].startswith("c) Situações previstas na lei.")
+
+def test_chunks_keep_the_section_path():
+    chunks = split_by_structure(PAGES, max_size=120)
+    
+    paths = {chunk.metadata["section"]: chunk.metadata["section_path"] for chunk in chunks}
+    assert paths["1"] == "1. DISPOSIÇÕES GERAIS"
+    assert paths["2.1.1"] == ("2. FREQUÊNCIA DAS ATIVIDADES LETIVAS > 2.1. Regime de faltas > "
+                              "2.1.1. São justificadas as faltas nos casos:")
+    for chunk in chunks:
+        page = PAGES[chunk.metadata["page"]].page_content
+        assert page[chunk.metadata["start_index"]:].startswith(chunk.page_content.split("\n")[0])
+
+def test_long_lines_are_cut_to_the_maximum_size():
+    words = " ".join(f"palavra{index}" for index in range(100))
+    item = "a) " + "x" * 300
+    pages = _pages("1. ÚNICO\n1.1. Texto longo\n" + words + "\n" + item + "\nb) Fim da cláusula.",
+                   "2. OUTRO\n2.1. Curto.", "3. FIM\n3.1. Curto.")
+    chunks = split_by_structure(pages, max_size=200)
+    
+    assert all(len(chunk.page_content) <= 200 for chunk in chunks)
+    clause = [chunk.page_content for chunk in chunks if chunk.metadata["section"] == "1.1"]
+    # As linhas longas são cortadas nos espaços, sem partir palavras nem separar "a)" do
+    # seu texto, e só uma palavra mais longa do que o limite é cortada a meio
+    assert " ".join(clause).split()[:100] == words.split()
+    assert any(chunk.startswith("a) xxx") for chunk in clause)
+    assert "".join(clause).replace("\n", "").endswith(item + "b) Fim da cláusula.")
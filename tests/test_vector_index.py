@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Índice vetorial em NumPy
+"""
+
+import os
+import sys
+
+from langchain.schema import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.models.vector_index import NumpyVectorStore
+
+def test_repeated_id_in_one_batch_keeps_the_last_document(tmp_path):
+    store = NumpyVectorStore(DeterministicFakeEmbedding(size=8), str(tmp_path / "vector_index"))
+    store.add_embeddings(["a"], [[0.0, 1.0, 0.0]], [Document(page_content="original", metadata={"v": 0})])
+    
+    store.add_embeddings(
+        ["b", "b", "a"],
+        [[1.0, 0.0, 0.0], [0.0, 0.0, 1.0], [0.0, 1.0, 0.1]],
+        [Document(page_content="primeiro", metadata={"v": 1}),
+         Document(page_content="último", metadata={"v": 2}),
+         Document(page_content="atualizado", metadata={"v": 3})]
+    )
+    
+    assert store.get_ids() == ["a", "b"]
+    # O texto e os metadados correspondem ao vetor guardado
+    doc, score = store.similarity_search_by_vector_with_score([0.0, 0.0, 1.0], k=1)[0]
+    assert (doc.page_content, doc.metadata["v"]) == ("último", 2)
+    assert score > 0.99
+    doc, _ = store.similarity_search_by_vector_with_score([0.0, 1.0, 0.1], k=1)[0]
+    assert (doc.page_content, doc.metadata["v"]) == ("atualizado", 3)
+
+def test_float16_index_scores_like_float32_and_follows_updates(tmp_path):
+    vectors = [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.6, 0.8, 0.0]]
+    documents = [Document(page_content=str(i)) for i in range(len(vectors))]
+    exact = NumpyVectorStore(None, "", quantization="float32")
+    exact.add_embeddings(["a", "b", "c"], vectors, documents)
+    store = NumpyVectorStore(None, str(tmp_path / "vector_index"), quantization="float16", rescore=False)
+    store.add_embeddings(["a", "b", "c"], vectors, documents)
+    store.persist()
+    
+    query = [0.7, 0.7, 0.1]
+    expected = [(doc.page_content, round(score, 3)) for doc, score in exact.similarity_search_by_vector_with_score(query, k=3)]
+    found = [(doc.page_content, round(score, 3)) for doc, score in store.similarity_search_by_vector_with_score(query, k=3)]
+    assert found == expected
+    
+    # A cópia float32 usada na pesquisa acompanha os embeddings novos
+    store.add_embeddings(["d"], [[0.0, 0.0, 1.0]], [Document(page_content="d")])
+    assert store.similarity_search_by_vector_with_score([0.0, 0.0, 1.0], k=1)[0][0].page_content == "d"
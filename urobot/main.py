@@ -5,121 +5,284 @@
 RAG com Ollama para o Regulamento Pedagógico da ESTG
 """
 
-from langchain_community.vectorstores import Chroma
-from langchain_ollama import OllamaEmbeddings
-from langchain_ollama import OllamaLLM
-from langchain.chains import RetrievalQA
-from langchain_community.document_loaders import PyPDFLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.prompts import PromptTemplate
 import time
 import sys
 import os
-import shutil
+import json
+import argparse
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+
+# Permitir importar os módulos do projeto (src/) ao executar este script diretamente
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.config.settings import RESOURCES_DIR, VECTOR_STORE_DIR, BATCH_CONCURRENCY, METRICS_PORT
+from src.data.document_loader import discover_pdfs
+from src.models.registry import get_pipeline
+from src.models.rag import process_query_shared, process_query_stream_shared, lookup_response, store_response
+from src.models.warmup import warm_up_and_keep_alive
+from src.utils.metrics import registry, start_metrics_server
+
+def imprimir_documentos(docs, max_docs=None, max_chars=150):
+    """
+    Imprime os documentos fonte recuperados
+    
+    Args:
+        docs: Documentos fonte
+        max_docs: Número máximo de documentos fonte a mostrar (None mostra todos)
+        max_chars: Número de caracteres a mostrar de cada documento fonte
+    """
+    print(f"Recuperados {len(docs)} documentos relevantes")
+    print("\nDocumentos fonte recuperados:")
+    for j, doc in enumerate(docs[:max_docs], 1):
+        print(f"Documento {j}: {doc.page_content[:max_chars]}...")
+
+def imprimir_resposta_stream(pergunta, qa_chain, index_version="", embeddings=None, max_docs=None, max_chars=150):
+    """
+    Processa uma pergunta em streaming, imprimindo os documentos fonte e a resposta à medida que é gerada
+    
+    Perguntas já respondidas (por esta ou outra sessão), ou semelhantes a uma já respondida
+    neste processo, são servidas a partir do armazém de respostas e do cache semântico.
+    
+    Args:
+        pergunta: Pergunta do utilizador
+        qa_chain: Cadeia de QA configurada
+        index_version: Versão do índice, usada na chave do armazém de respostas
+        embeddings: Embeddings das consultas, usados pelo cache semântico
+        max_docs: Número máximo de documentos fonte a mostrar (None mostra todos)
+        max_chars: Número de caracteres a mostrar de cada documento fonte
+        
+    Returns:
+        Dicionário com a resposta, documentos fonte e tempos
+    """
+    start_time = time.time()
+    response_key, guardada, vector = lookup_response(pergunta, qa_chain, index_version, embeddings)
+    if guardada:
+        tempo = time.time() - start_time
+        imprimir_documentos(guardada["documentos"], max_docs, max_chars)
+        print(f"\n🧠 Resposta (em cache):\n{guardada['resposta']}")
+        print(f"Tempo de resposta: {tempo:.2f} segundos")
+        return {
+            "resposta": guardada["resposta"],
+            "documentos": guardada["documentos"],
+            "tempo_primeiro_token": tempo,
+            "tempo_total": tempo
+        }
+    
+    resultado = None
+    for evento in process_query_stream_shared(pergunta, qa_chain):
+        if evento["tipo"] == "documentos":
+            imprimir_documentos(evento["documentos"], max_docs, max_chars)
+            print("\n🧠 Resposta:")
+        elif evento["tipo"] == "token":
+            print(evento["token"], end="", flush=True)
+        elif evento["tipo"] == "fim":
+            resultado = evento
+    
+    print()
+    print(f"Tempo até ao primeiro token: {resultado['tempo_primeiro_token']:.2f} segundos")
+    print(f"Tempo de resposta: {resultado['tempo_total']:.2f} segundos")
+    tempos = resultado["tempos"]
+    print(f"Recuperação: {tempos['recuperacao']:.2f}s | Prompt: {tempos['prompt']:.3f}s | "
+          f"Geração: {tempos['geracao']:.2f}s")
+    
+    store_response(response_key, pergunta, {
+        "resposta": resultado["resposta"],
+        "documentos": resultado["documentos"],
+        "tempo": resultado["tempo_total"]
+    }, qa_chain, index_version, vector)
+    return resultado
+
+def ler_perguntas(caminho):
+    """
+    Lê as perguntas de um ficheiro (ou do stdin), uma por linha
+    
+    Linhas vazias e linhas começadas por '#' são ignoradas.
+    
+    Args:
+        caminho: Caminho do ficheiro, ou "-" para ler do stdin
+        
+    Returns:
+        Lista de perguntas
+    """
+    if caminho == "-":
+        linhas = sys.stdin.read().splitlines()
+    else:
+        with open(caminho, encoding="utf-8") as f:
+            linhas = f.read().splitlines()
+    return [linha.strip() for linha in linhas if linha.strip() and not linha.strip().startswith("#")]
+
+def responder_pergunta(pergunta, qa_chain, index_version="", embeddings=None):
+    """
+    Responde a uma pergunta sem imprimir nada, devolvendo o registo a escrever no JSONL
+    
+    Args:
+        pergunta: Pergunta do utilizador
+        qa_chain: Cadeia de QA configurada
+        index_version: Versão do índice, usada na chave do armazém de respostas
+        embeddings: Embeddings das consultas, usados pelo cache semântico
+        
+    Returns:
+        Dicionário com a pergunta, resposta, IDs dos chunks fonte e tempos por etapa
+    """
+    start_time = time.time()
+    try:
+        response_key, guardada, vector = lookup_response(pergunta, qa_chain, index_version, embeddings)
+        if guardada:
+            resposta, documentos, tempos = guardada["resposta"], guardada["documentos"], {}
+        else:
+            resultado = process_query_shared(pergunta, qa_chain)
+            resposta, documentos = resultado["resposta"], resultado["documentos"]
+            tempos = resultado["tempos"]
+            store_response(response_key, pergunta, {
+                "resposta": resposta,
+                "documentos": documentos,
+                "tempo": time.time() - start_time
+            }, qa_chain, index_version, vector)
+        return {
+            "pergunta": pergunta,
+            "resposta": resposta,
+            "fontes": [doc.metadata.get("chunk_id") for doc in documentos],
+            "tempos": tempos,
+            "tempo_total": time.time() - start_time,
+            "cache": bool(guardada)
+        }
+    except Exception as e:
+        return {
+            "pergunta": pergunta,
+            "erro": str(e),
+            "tempo_total": time.time() - start_time
+        }
+
+def executar_lote(perguntas, qa_chain, vectorstore, index_version, saida, concorrencia=BATCH_CONCURRENCY):
+    """
+    Responde a uma lista de perguntas em paralelo, escrevendo uma linha JSON por pergunta
+    
+    Os embeddings de todas as perguntas são gerados numa única chamada e ficam no cache
+    de embeddings de consultas, pelo que a recuperação de cada pergunta já não chama o
+    modelo de embeddings. As linhas são escritas pela ordem das perguntas; o tempo do
+    embedding em lote é apresentado uma vez, no resumo do lote.
+    
+    Args:
+        perguntas: Lista de perguntas
+        qa_chain: Cadeia de QA configurada
+        vectorstore: Vectorstore usado pela cadeia
+        index_version: Versão do índice, usada na chave do armazém de respostas
+        saida: Ficheiro de texto aberto onde escrever o JSONL
+        concorrencia: Número de perguntas processadas em simultâneo
+        
+    Returns:
+        Número de perguntas que falharam
+    """
+    start_time = time.time()
+    print(f"A gerar os embeddings de {len(perguntas)} perguntas...", file=sys.stderr)
+    vectorstore.embeddings.embed_queries(perguntas)
+    tempo_embedding = time.time() - start_time
+    
+    falhas = 0
+    with ThreadPoolExecutor(max_workers=concorrencia) as executor:
+        registos = executor.map(lambda p: responder_pergunta(p, qa_chain, index_version, vectorstore.embeddings), perguntas)
+        for i, registo in enumerate(registos, 1):
+            if "erro" in registo:
+                falhas += 1
+            saida.write(json.dumps(registo, ensure_ascii=False) + "\n")
+            saida.flush()
+            print(f"[{i}/{len(perguntas)}] {registo['tempo_total']:.2f}s - {registo['pergunta']}", file=sys.stderr)
+    
+    tempo_total = time.time() - start_time
+    print(f"{len(perguntas)} perguntas respondidas em {tempo_total:.2f} segundos "
+          f"({len(perguntas) / tempo_total:.2f} perguntas/s, {falhas} falhas)", file=sys.stderr)
+    print(f"Embeddings das perguntas (em lote): {tempo_embedding:.2f} segundos", file=sys.stderr)
+    print(f"Métricas:\n{registry.summary()}", file=sys.stderr)
+    return falhas
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="RAG com Ollama para o Regulamento Pedagógico da ESTG")
+    parser.add_argument("--lote", metavar="FICHEIRO",
+                        help="Modo em lote: lê as perguntas deste ficheiro (uma por linha, '-' para o stdin)")
+    parser.add_argument("--saida", metavar="FICHEIRO", default=None,
+                        help="Ficheiro JSONL com as respostas do modo em lote "
+                             "(por omissão resultados_lote.jsonl; '-' para o stdout)")
+    parser.add_argument("--concorrencia", type=int, default=BATCH_CONCURRENCY,
+                        help="Número de perguntas processadas em simultâneo no modo em lote")
+    return parser.parse_args()
 
 def main():
+    args = parse_args()
+    
+    # No modo em lote com saída para o stdout, as mensagens de progresso vão para o stderr
+    if args.lote and args.saida == "-":
+        with contextlib.redirect_stdout(sys.stderr):
+            executar(args)
+    else:
+        executar(args)
+
+def executar(args):
     print("=== RAG com Ollama para o Regulamento Pedagógico da ESTG ===\n")
+    if METRICS_PORT:
+        start_metrics_server(METRICS_PORT)
     
-    # === 1. Carregar o PDF ===
+    # === 1-3. Carregar os PDFs, dividi-los em chunks e criar o vector store ===
     # Obter o caminho absoluto para o diretório raiz do projeto
     root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     
-    # Construir o caminho completo para o arquivo PDF
-    pdf_path = os.path.join(root_dir, "resources", "ESTG_Regulamento-Frequencia-Avaliacao2023.pdf")
-    print(f"Carregando PDF de: {pdf_path}")
+    # Todos os PDFs do diretório resources/ são considerados; só são lidos (em paralelo)
+    # se o manifesto do índice não coincidir com os ficheiros e parâmetros atuais
+    print(f"{len(discover_pdfs(RESOURCES_DIR))} PDFs em: {RESOURCES_DIR}")
+    print(f"Vectorstore em: {VECTOR_STORE_DIR}")
     
     try:
-        loader = PyPDFLoader(pdf_path)
-        documents = loader.load()
-        print(f"PDF carregado com {len(documents)} páginas")
-
-        # === 2. Dividir o texto em chunks menores ===
-        print("\nDividindo o documento em chunks menores...")
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=500,  # Chunks menores para melhor precisão
-            chunk_overlap=100,
-            length_function=len
-        )
-        chunks = text_splitter.split_documents(documents)
-        print(f"Documento dividido em {len(chunks)} chunks")
-        
-        # === 3. Converter em embeddings e criar vector store ===
-        print("\nConvertendo documentos em embeddings...")
-        embeddings = OllamaEmbeddings(model="nomic-embed-text")
-        
-        # Usar o caminho absoluto para o diretório de persistência
-        vector_store_path = os.path.join(root_dir, "vector_store")
-        print(f"Salvando vectorstore em: {vector_store_path}")
-        
         # Verificar se já existe um vectorstore persistido
         recriar_vectorstore = False
-        if os.path.exists(vector_store_path) and os.listdir(vector_store_path):
-            resposta = input("Vectorstore já existe. Deseja recriá-lo? (s/n): ")
+        atualizar_vectorstore = False
+        if args.lote:
+            # Modo não interativo: usar o vectorstore existente (ou criá-lo)
+            print("Modo em lote: usando o vectorstore existente...")
+        elif os.path.exists(VECTOR_STORE_DIR) and os.listdir(VECTOR_STORE_DIR):
+            resposta = input("Vectorstore já existe. Deseja recriá-lo (s), atualizá-lo incrementalmente (a) ou usá-lo como está (n)? (s/a/n): ")
             if resposta.lower() == 's':
-                print("Removendo vectorstore existente...")
-                shutil.rmtree(vector_store_path)
+                print("Recriando vectorstore (pode demorar alguns minutos)...")
                 recriar_vectorstore = True
+            elif resposta.lower() == 'a':
+                print("Atualizando apenas os chunks novos ou alterados...")
+                atualizar_vectorstore = True
             else:
-                print("Usando vectorstore existente...")
-                vectorstore = Chroma(persist_directory=vector_store_path, embedding_function=embeddings)
+                print("Usando vectorstore existente (atualizado apenas se os PDFs mudaram)...")
         else:
-            recriar_vectorstore = True
-        
-        if recriar_vectorstore:
             print("Criando novo vectorstore (pode demorar alguns minutos)...")
-            vectorstore = Chroma.from_documents(
-                documents=chunks,  # Usar chunks em vez de documentos completos
-                embedding=embeddings,
-                persist_directory=vector_store_path
-            )
-            vectorstore.persist()
-            print("Vectorstore criado e persistido com sucesso!")
-
+        
         # === 4. Criar pipeline de RAG ===
+        # O mesmo pipeline (índice, retriever, prompt e modelo) da aplicação, do serviço e das
+        # respostas pré-geradas, pelo que as chaves do armazém de respostas coincidem
         print("\nConfigurando o pipeline de RAG...")
+        pipeline = get_pipeline(recreate=recriar_vectorstore, reindex=atualizar_vectorstore,
+                                status_callback=print)
+        vectorstore, qa_chain = pipeline["vectorstore"], pipeline["qa_chain"]
+        index_version = pipeline["index_version"]
+        print("Vectorstore pronto!")
         
-        # Configurar o retriever para recuperar mais documentos relevantes
-        retriever = vectorstore.as_retriever(
-            search_type="similarity",
-            search_kwargs={"k": 3}  # Recuperar os 3 chunks mais relevantes
-        )
-        
-        print("Conectando ao modelo Ollama (llama3)...")
-        llm = OllamaLLM(
-            model="llama3",
-            temperature=0.1,
-            stop=["\n\n"],
-            top_p=0.9
-        )
-        
-        # Criar um template de prompt personalizado para instruir o modelo a responder em português
-        prompt_template = """
-        Você é um assistente especializado no Regulamento Pedagógico da ESTG (Escola Superior de Tecnologia e Gestão).
-        Responda à pergunta em PORTUGUÊS com base nas informações fornecidas abaixo.
-        Se a informação não estiver presente nos documentos fornecidos, diga que não tem informações suficientes para responder.
-        
-        Contexto:
-        {context}
-        
-        Pergunta: {question}
-        
-        Resposta em português:
-        """
-        
-        PROMPT = PromptTemplate(
-            template=prompt_template,
-            input_variables=["context", "question"]
-        )
-        
-        print("Criando a cadeia de QA...")
-        qa_chain = RetrievalQA.from_chain_type(
-            llm=llm,
-            chain_type="stuff",
-            retriever=retriever,
-            return_source_documents=True,
-            chain_type_kwargs={"prompt": PROMPT}
-        )
+        # Carregar os modelos antes da primeira pergunta e mantê-los em memória
+        for modelo, tempos in (warm_up_and_keep_alive() or {}).items():
+            if "erro" not in tempos:
+                print(f"{modelo}: primeiro pedido {tempos['primeiro_pedido']:.2f}s "
+                      f"({'frio' if tempos['frio'] else 'já carregado'})")
         print("Pipeline de RAG configurado com sucesso!")
+        
+        # === Modo em lote ===
+        if args.lote:
+            perguntas = ler_perguntas(args.lote)
+            if args.saida == "-":
+                falhas = executar_lote(perguntas, qa_chain, vectorstore, index_version,
+                                       sys.__stdout__, args.concorrencia)
+            else:
+                resultados_path = args.saida or os.path.join(root_dir, "resultados_lote.jsonl")
+                with open(resultados_path, "w", encoding="utf-8") as f:
+                    falhas = executar_lote(perguntas, qa_chain, vectorstore, index_version,
+                                           f, args.concorrencia)
+                print(f"Respostas salvas em: {resultados_path}")
+            if falhas:
+                sys.exit(1)
+            return
 
         # === 5. Testar as perguntas específicas da Tarefa 6 ===
         print("\n===== Testando as perguntas da Tarefa 6 =====\n")
@@ -137,33 +300,11 @@ def main():
             print("Gerando resposta... (pode demorar alguns segundos)")
             sys.stdout.flush()  # Forçar a saída imediata
             
-            start_time = time.time()
             try:
-                # Recuperar documentos relevantes
-                docs = retriever.get_relevant_documents(pergunta)
-                print(f"Recuperados {len(docs)} documentos relevantes")
-                
-                # Mostrar os documentos recuperados
-                print("\nDocumentos fonte recuperados:")
-                for j, doc in enumerate(docs, 1):
-                    print(f"Documento {j}: {doc.page_content[:150]}...")
-                
-                # Executar a pergunta
-                resposta = qa_chain.invoke({"query": pergunta})
-                tempo = time.time() - start_time
+                # Recuperar documentos e gerar a resposta em streaming
+                resultado = imprimir_resposta_stream(pergunta, qa_chain, index_version, vectorstore.embeddings)
                 
-                # Extrair a resposta e os documentos fonte
-                if isinstance(resposta, dict) and "result" in resposta:
-                    resposta_texto = resposta["result"]
-                    documentos_fonte = resposta.get("source_documents", [])
-                else:
-                    resposta_texto = str(resposta)
-                    documentos_fonte = []
-                
-                print(f"Tempo de resposta: {tempo:.2f} segundos")
-                print(f"\n🧠 Resposta:\n{resposta_texto}")
-                
-                respostas.append((pergunta, resposta_texto, tempo, docs))
+                respostas.append((pergunta, resultado["resposta"], resultado["tempo_total"], resultado["documentos"]))
             except Exception as e:
                 print(f"Erro ao processar pergunta: {str(e)}")
                 import traceback
@@ -199,29 +340,10 @@ def main():
             print("Gerando resposta... (pode demorar alguns segundos)")
             sys.stdout.flush()  # Forçar a saída imediata
             
-            start_time = time.time()
             try:
-                # Recuperar documentos relevantes
-                docs = retriever.get_relevant_documents(query)
-                print(f"Recuperados {len(docs)} documentos relevantes")
-                
-                # Mostrar os documentos recuperados
-                print("\nDocumentos fonte recuperados:")
-                for j, doc in enumerate(docs[:2], 1):
-                    print(f"Documento {j}: {doc.page_content[:100]}...")
-                
-                # Executar a pergunta
-                resposta = qa_chain.invoke({"query": query})
-                tempo = time.time() - start_time
-                
-                # Extrair a resposta
-                if isinstance(resposta, dict) and "result" in resposta:
-                    resposta_texto = resposta["result"]
-                else:
-                    resposta_texto = str(resposta)
-                
-                print(f"Tempo de resposta: {tempo:.2f} segundos")
-                print(f"\n🧠 Resposta:\n{resposta_texto}")
+                # Recuperar documentos e gerar a resposta em streaming
+                imprimir_resposta_stream(query, qa_chain, index_version, vectorstore.embeddings,
+                                         max_docs=2, max_chars=100)
                 
             except Exception as e:
                 print(f"Erro ao processar pergunta: {str(e)}")